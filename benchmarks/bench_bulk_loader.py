@@ -0,0 +1,72 @@
+"""
+Benchmark dos modos de persistência de asset_history (COPY + merge vs INSERT multi-VALUES).
+
+Usa uma tabela descartável com o mesmo schema de asset_history no banco configurado
+(.env ou BENCH_DB_URL) e mede linhas/segundo para cada modo.
+
+    python -m benchmarks.bench_bulk_loader --assets 200 --days 2500
+"""
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import os
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import MetaData, text
+
+from src.infra.bulk_loader import PERSIST_MODES, bulk_load
+from src.infra.config import get_settings
+from src.infra.db import get_session, init_engine
+from src.models.tables import asset_history
+
+def _synthetic_frame(n_assets: int, n_days: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=dt.date.today(), periods=n_days).date
+    ids = [uuid.UUID(int=int(rng.integers(1, 2**62))) for _ in range(n_assets)]
+    n = n_assets * n_days
+    close = np.exp(np.cumsum(rng.normal(0, 0.02, size=n))) * 20.0
+    return pd.DataFrame({
+        "asset": np.repeat(np.array(ids, dtype=object), n_days),
+        "price_date": np.tile(dates, n_assets),
+        "close_price": close,
+        "open_price": close * (1 + rng.normal(0, 0.005, size=n)),
+        "high_price": close * 1.01,
+        "low_price": close * 0.99,
+        "volume": pd.array(rng.integers(0, 10_000_000, size=n), dtype="Int64"),
+        "dividends": 0.0,
+        "splits": 0.0,
+    })
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--assets", type=int, default=100)
+    ap.add_argument("--days", type=int, default=2500)
+    ap.add_argument("--batch-size", type=int, default=5000)
+    args = ap.parse_args()
+
+    settings = get_settings()
+    engine = init_engine(os.getenv("BENCH_DB_URL", settings.db_url))
+    table = asset_history.to_metadata(MetaData(), name="bench_asset_history")
+    table.create(engine, checkfirst=True)
+
+    df = _synthetic_frame(args.assets, args.days)
+    print(f"{len(df):,} linhas sintéticas ({args.assets} ativos x {args.days} dias)")
+    try:
+        for mode in PERSIST_MODES:
+            with engine.begin() as conn:
+                conn.execute(text(f"TRUNCATE {table.name}"))
+            with get_session() as s:
+                t0 = time.perf_counter()
+                res = bulk_load(s, table, df, key_columns=("asset", "price_date"), mode=mode, batch_size=args.batch_size)
+                s.commit()
+                elapsed = time.perf_counter() - t0
+            print(f"{mode:>6}: {res.inserted:,} linhas em {elapsed:.2f}s -> {res.inserted / elapsed:,.0f} linhas/s")
+    finally:
+        table.drop(engine, checkfirst=True)
+
+if __name__ == "__main__":
+    main()
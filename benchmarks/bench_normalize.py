@@ -0,0 +1,154 @@
+"""
+Benchmark da normalização largo -> longo do frame do yfinance: implementação anterior
+(cópia do frame largo + stack por campo) vs. normalização em lotes por ticker.
+
+Cada variante roda em um processo próprio para medir o pico de memória isolado:
+pico de alocações (tracemalloc, inclui buffers NumPy) e pico de RSS do processo.
+Não precisa de banco nem de rede.
+
+    python -m benchmarks.bench_normalize --tickers 50 --days 5000
+"""
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import multiprocessing as mp
+import resource
+import sys
+import time
+import tracemalloc
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from src.services.download_service import base_ticker
+from src.services.fetcher_service import _normalize_prices
+
+_FIELDS = ["Open", "High", "Low", "Close", "Volume", "Dividends", "Stock Splits"]
+
+def _legacy_normalize_prices(df: pd.DataFrame, tickers_base: List[str]) -> pd.DataFrame:
+    """Implementação anterior de fetcher_service._normalize_prices (linha de base)."""
+    if isinstance(df.columns, pd.MultiIndex):
+        wide = df.copy()
+    else:
+        fields = df.columns.tolist()
+        arrays = [[f for f in fields], [tickers_base[0] for _ in fields]]
+        wide = df.copy()
+        wide.columns = pd.MultiIndex.from_arrays(arrays)
+
+    parts = []
+    mapping = [
+        ("Open", "open_price"),
+        ("High", "high_price"),
+        ("Low", "low_price"),
+        ("Close", "close_price"),
+        ("Volume", "volume"),
+        ("Dividends", "dividends"),
+        ("Stock Splits", "splits"),
+    ]
+    for field, out_col in mapping:
+        cols = [c for c in wide.columns if c[0] == field]
+        if cols:
+            tmp = wide[cols].copy()
+            tmp.columns = [base_ticker(c[1]) for c in cols]
+            tmp = tmp.stack().rename(out_col)
+            parts.append(tmp)
+        else:
+            idx = pd.MultiIndex.from_product([wide.index, tickers_base], names=[wide.index.name or "Date", "Ticker"])
+            parts.append(pd.Series(index=idx, name=out_col, dtype="float64"))
+
+    df_long = pd.concat(parts, axis=1).reset_index()
+    df_long.rename(columns={df_long.columns[0]: "price_date", df_long.columns[1]: "ticker"}, inplace=True)
+    df_long["price_date"] = pd.to_datetime(df_long["price_date"]).dt.date
+    if "volume" in df_long.columns:
+        df_long["volume"] = df_long["volume"].astype("Int64").astype("float").astype("Int64")
+    for c in ["dividends", "splits"]:
+        if c in df_long.columns:
+            df_long[c] = df_long[c].fillna(0.0)
+    return df_long
+
+VARIANTS = {
+    "legacy": _legacy_normalize_prices,
+    "streaming": _normalize_prices,
+}
+
+def _wide_frame(n_tickers: int, n_days: int, seed: int = 42) -> pd.DataFrame:
+    """Frame no formato do yf.download(group_by="column"), com histórico mais curto em parte dos tickers."""
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range(end=dt.date.today(), periods=n_days, name="Date")
+    symbols = [f"T{i:04d}.SA" for i in range(n_tickers)]
+    close = 20.0 * np.exp(np.cumsum(rng.normal(0, 0.02, size=(n_days, n_tickers)), axis=0))
+    # ativos listados depois do início da janela: NaN antes da listagem, como no yfinance
+    listed = rng.integers(0, n_days // 2, size=n_tickers)
+    close[np.arange(n_days)[:, None] < listed[None, :]] = np.nan
+    data = {
+        "Open": close * (1 + rng.normal(0, 0.005, size=close.shape)),
+        "High": close * 1.01,
+        "Low": close * 0.99,
+        "Close": close,
+        "Volume": np.where(np.isnan(close), np.nan, rng.integers(0, 10_000_000, size=close.shape)),
+        "Dividends": np.where(np.isnan(close), np.nan, 0.0),
+        "Stock Splits": np.where(np.isnan(close), np.nan, 0.0),
+    }
+    return pd.concat({f: pd.DataFrame(data[f], index=idx, columns=symbols) for f in _FIELDS}, axis=1)
+
+def _max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KiB; macOS, bytes
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def _run_variant(name: str, n_tickers: int, n_days: int, repeat: int, out: "mp.Queue") -> None:
+    df = _wide_frame(n_tickers, n_days)
+    tickers = [base_ticker(c) for c in dict.fromkeys(df.columns.get_level_values(1))]
+    fn = VARIANTS[name]
+    fn(df.iloc[:10], tickers)  # aquece imports/caches do pandas fora da medição
+    rss_before = _max_rss_mb()
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn(df, tickers)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_peak = _max_rss_mb()
+
+    times = [elapsed]
+    for _ in range(repeat - 1):
+        t0 = time.perf_counter()
+        fn(df, tickers)
+        times.append(time.perf_counter() - t0)
+    out.put({
+        "variant": name,
+        "rows": len(result),
+        "input_mb": df.memory_usage(deep=True).sum() / 2**20,
+        "output_mb": result.memory_usage(deep=True).sum() / 2**20,
+        "peak_alloc_mb": peak / 2**20,
+        "rss_growth_mb": rss_peak - rss_before,
+        "best_seconds": min(times),
+    })
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tickers", type=int, default=50)
+    ap.add_argument("--days", type=int, default=5000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    ctx = mp.get_context("spawn")
+    print(f"Frame largo sintético: {args.tickers} tickers x {args.days} dias")
+    for name in VARIANTS:
+        out = ctx.Queue()
+        proc = ctx.Process(target=_run_variant, args=(name, args.tickers, args.days, args.repeat, out))
+        proc.start()
+        r = out.get()
+        proc.join()
+        print(
+            f"{r['variant']:>9}: {r['rows']:,} linhas em {r['best_seconds']:.3f}s "
+            f"({r['rows'] / r['best_seconds']:,.0f} linhas/s) | entrada {r['input_mb']:.1f} MiB, "
+            f"saída {r['output_mb']:.1f} MiB, pico de alocação {r['peak_alloc_mb']:.1f} MiB, "
+            f"crescimento de RSS {r['rss_growth_mb']:.1f} MiB"
+        )
+
+if __name__ == "__main__":
+    main()
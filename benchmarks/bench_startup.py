@@ -0,0 +1,102 @@
+"""
+Benchmark do tempo de partida da API: sobe `uvicorn src.main:app` em um processo novo e mede
+o tempo até a primeira resposta 200 de GET /health (liveness) e de GET /ready (readiness,
+que depende do banco configurado). Mede também, em outro interpretador, quanto leva só o
+`import src.main` e se ele carregou pandas/NumPy/yfinance (deveriam ficar para o primeiro job).
+
+    python -m benchmarks.bench_startup --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import List, Optional
+
+HEAVY_MODULES = ("pandas", "numpy", "yfinance", "pyarrow")
+
+_IMPORT_PROBE = f"""
+import json, sys, time
+t0 = time.perf_counter()
+import src.main
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _status(url: str) -> Optional[int]:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as r:
+            return r.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+def _measure_import() -> dict:
+    out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def _measure_server(ready_timeout: float, poll_seconds: float) -> dict:
+    """Segundos desde o spawn até /health e /ready responderem 200 (None se /ready não ficar pronto)."""
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    health = ready = None
+    try:
+        deadline = t0 + ready_timeout
+        while time.perf_counter() < deadline and proc.poll() is None:
+            if health is None and _status(f"{base}/health") == 200:
+                health = time.perf_counter() - t0
+            if health is not None and _status(f"{base}/ready") == 200:
+                ready = time.perf_counter() - t0
+                break
+            time.sleep(poll_seconds)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return {"health_seconds": health, "ready_seconds": ready}
+
+def _summary(values: List[Optional[float]]) -> str:
+    ok = [v for v in values if v is not None]
+    if not ok:
+        return "sem resposta"
+    miss = len(values) - len(ok)
+    return f"mediana {statistics.median(ok):.3f}s, mín {min(ok):.3f}s" + (f" ({miss} sem resposta)" if miss else "")
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--ready-timeout", type=float, default=30.0, help="espera máxima por /ready em cada partida")
+    ap.add_argument("--poll-ms", type=float, default=10.0)
+    args = ap.parse_args()
+
+    imports = [_measure_import() for _ in range(args.repeat)]
+    print(f"import src.main: {_summary([r['seconds'] for r in imports])}")
+    loaded = sorted({m for r in imports for m in r["loaded"]})
+    print(f"  módulos pesados carregados na importação: {', '.join(loaded) if loaded else 'nenhum'}")
+
+    runs = [_measure_server(args.ready_timeout, args.poll_ms / 1000.0) for _ in range(args.repeat)]
+    print(f"primeiro 200 em /health: {_summary([r['health_seconds'] for r in runs])}")
+    print(f"primeiro 200 em /ready:  {_summary([r['ready_seconds'] for r in runs])}")
+
+if __name__ == "__main__":
+    main()
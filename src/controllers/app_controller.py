@@ -2,10 +2,27 @@
 
 # controllers/api.py
 from __future__ import annotations
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
+
+from src.infra.instrumentation import CONTENT_TYPE, render_latest
+from src.services.startup_service import readiness
 
 router = APIRouter()
 
 @router.get("/health")
 def health():
-    return {"status": "ok"}
\ No newline at end of file
+    """Liveness: o processo está de pé (não depende do banco nem da inicialização)."""
+    return {"status": "ok"}
+
+@router.get("/ready")
+def ready(response: Response):
+    """Readiness: 200 só depois de preparar banco, schema e scheduler; 503 até lá."""
+    state = readiness()
+    if not state["ready"]:
+        response.status_code = 503
+    return state
+
+@router.get("/metrics")
+def metrics():
+    """Métricas do processo no formato de exposição do Prometheus."""
+    return Response(content=render_latest(), media_type=CONTENT_TYPE)
\ No newline at end of file
@@ -0,0 +1,58 @@
+from __future__ import annotations
+import datetime as dt
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+
+from src.services.history_service import (
+    FORMATS, FORMAT_ARROW, MEDIA_TYPES, VALUE_COLUMNS, HistoryQuery,
+    arrow_available, history_etag, stream_history,
+)
+
+router = APIRouter(prefix="/history", tags=["history"])
+
+MAX_TICKERS_PER_REQUEST = 500
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [t.strip() for t in header.split(",")]
+
+@router.get("")
+def get_history(
+    request: Request,
+    tickers: str = Query(..., description="Tickers separados por vírgula (ex.: PETR4,VALE3)"),
+    start: Optional[dt.date] = Query(None, description="Data inicial (inclusiva)"),
+    end: Optional[dt.date] = Query(None, description="Data final (inclusiva)"),
+    columns: Optional[str] = Query(None, description=f"Subconjunto de: {','.join(VALUE_COLUMNS)}"),
+    format: str = Query("ndjson", description=f"Um de: {', '.join(FORMATS)}"),
+):
+    """
+    Histórico de preços em streaming (NDJSON, CSV ou Arrow IPC), lido por cursor do lado
+    do servidor. Suporta If-None-Match: responde 304 se nenhum ativo recebeu dados novos.
+    """
+    wanted = list(dict.fromkeys(t.strip().upper() for t in tickers.split(",") if t.strip()))
+    if not wanted:
+        raise HTTPException(status_code=400, detail="Informe ao menos um ticker.")
+    if len(wanted) > MAX_TICKERS_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_TICKERS_PER_REQUEST} tickers por requisição.")
+    fmt = format.lower()
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato inválido: {format}. Use um de {', '.join(FORMATS)}.")
+    if fmt == FORMAT_ARROW and not arrow_available():
+        raise HTTPException(status_code=406, detail="Formato arrow indisponível (pyarrow não instalado).")
+    cols = list(VALUE_COLUMNS)
+    if columns:
+        cols = [c.strip().lower() for c in columns.split(",") if c.strip()]
+        invalid = [c for c in cols if c not in VALUE_COLUMNS]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Colunas inválidas: {', '.join(invalid)}.")
+
+    q = HistoryQuery(tickers=wanted, start=start, end=end, columns=tuple(cols), fmt=fmt)
+    etag = history_etag(q)
+    if etag is None:
+        raise HTTPException(status_code=404, detail="Nenhum dos tickers informados foi encontrado.")
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return StreamingResponse(stream_history(q), media_type=MEDIA_TYPES[fmt], headers={"ETag": etag})
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, HTTPException, Query
+
+from src.infra.config import get_settings
+from src.services.scheduler_service import intraday_maintenance_now, intraday_now
+
+router = APIRouter(prefix="/intraday", tags=["intraday"])
+settings = get_settings()
+
+def _require_enabled() -> None:
+    if not settings.intraday.enabled:
+        raise HTTPException(status_code=503, detail="Modo intradiário desabilitado (intraday.enabled).")
+
+@router.get("/{ticker}/bars")
+def get_bars(ticker: str, n: int = Query(100, ge=1, description="Quantidade de barras mais recentes")):
+    """Últimas `n` barras intradiárias do ticker (buffer em memória, até intraday.ring_size)."""
+    _require_enabled()
+    # importado na primeira leitura: intraday_service carrega o caminho de fetch (pandas/NumPy)
+    from src.services.intraday_service import recent_bars
+
+    result = recent_bars(ticker, min(n, settings.intraday.ring_size))
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Ticker {ticker.upper()} não está em intraday.tickers.")
+    return result
+
+@router.post("/run", status_code=202)
+def run_intraday():
+    """Enfileira uma ingestão intradiária imediata."""
+    _require_enabled()
+    return {"message": "accepted", **intraday_now()}
+
+@router.post("/maintenance", status_code=202)
+def run_intraday_maintenance():
+    """Enfileira a criação/agregação/descarte das partições intradiárias."""
+    _require_enabled()
+    return {"message": "accepted", **intraday_maintenance_now()}
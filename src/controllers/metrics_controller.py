@@ -0,0 +1,35 @@
+from __future__ import annotations
+import datetime as dt
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+router = APIRouter(prefix="/assets", tags=["metrics"])
+
+@router.get("/{ticker}/metrics")
+def get_metrics(
+    ticker: str,
+    start: Optional[dt.date] = Query(None, description="Data inicial (inclusiva)"),
+    end: Optional[dt.date] = Query(None, description="Data final (inclusiva)"),
+):
+    """
+    Séries derivadas do ativo (retorno diário simples e log, médias móveis de 20 e 50 pregões,
+    volatilidade anualizada de 20 pregões e índice de retorno total), mantidas a cada ingestão.
+    """
+    # importado na primeira requisição: metrics_service carrega pandas/NumPy
+    from src.services.metrics_service import metrics_for_ticker
+
+    rows = metrics_for_ticker(ticker, start, end)
+    if rows is None:
+        raise HTTPException(status_code=404, detail=f"Ticker {ticker.upper()} não encontrado.")
+    return {"ticker": ticker.upper(), "metrics": rows}
+
+@router.post("/{ticker}/metrics/rebuild")
+def post_rebuild_metrics(ticker: str):
+    """Recalcula do zero as séries derivadas do ativo a partir de asset_history."""
+    from src.services.metrics_service import rebuild_metrics
+
+    rows = rebuild_metrics(ticker)
+    if rows is None:
+        raise HTTPException(status_code=404, detail=f"Ticker {ticker.upper()} não encontrado.")
+    return {"ticker": ticker.upper(), "rows": rows}
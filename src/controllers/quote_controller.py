@@ -0,0 +1,30 @@
+from __future__ import annotations
+from fastapi import APIRouter, HTTPException, Query
+
+from src.services.quote_service import get_quote_service
+
+router = APIRouter(prefix="/quotes", tags=["quotes"])
+
+MAX_TICKERS_PER_REQUEST = 500
+
+@router.get("")
+def get_quotes(tickers: str = Query(..., description="Tickers separados por vírgula (ex.: PETR4,VALE3)")):
+    """Última cotação de vários tickers, servida do cache (com fallback para o banco)."""
+    wanted = [t.strip().upper() for t in tickers.split(",") if t.strip()]
+    if not wanted:
+        raise HTTPException(status_code=400, detail="Informe ao menos um ticker.")
+    if len(wanted) > MAX_TICKERS_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_TICKERS_PER_REQUEST} tickers por requisição.")
+    quotes = get_quote_service().get_many(wanted)
+    return {
+        "quotes": [quotes[t] for t in wanted if t in quotes],
+        "missing": [t for t in wanted if t not in quotes],
+    }
+
+@router.get("/{ticker}")
+def get_quote(ticker: str):
+    """Última cotação de um ticker."""
+    quote = get_quote_service().get(ticker)
+    if quote is None:
+        raise HTTPException(status_code=404, detail=f"Cotação não encontrada para {ticker}.")
+    return quote
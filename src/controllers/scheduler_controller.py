@@ -1,12 +1,56 @@
 from __future__ import annotations
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 
-from src.services.scheduler_service import run_once_now
+from src.services.scheduler_service import (
+    run_once_now, backfill_now, rebuild_watermarks_now, get_job, get_job_profile, list_jobs, cancel_job,
+)
 
 router = APIRouter(prefix="/scheduler", tags=["scheduler"])
 
-@router.post("/run-once")
-def run_once():
-    """Dispara a execução imediata do fetch (sem esperar o agendamento)."""
-    result = run_once_now()
-    return {"message": "ok", **result}
\ No newline at end of file
+@router.post("/run-once", status_code=202)
+def run_once(profile: bool = Query(False, description="Liga o profiler por amostragem só nesta execução")):
+    """Enfileira a execução imediata do fetch e retorna o job (acompanhe em /scheduler/jobs/{id})."""
+    result = run_once_now(profile=profile)
+    return {"message": "accepted", **result}
+
+@router.post("/backfill", status_code=202)
+def backfill():
+    """Enfileira o reparo de pregões faltantes no histórico (baixa prioridade, com orçamento por execução)."""
+    result = backfill_now()
+    return {"message": "accepted", **result}
+
+@router.get("/jobs")
+def jobs():
+    """Execuções recentes (mais novas primeiro)."""
+    return {"jobs": list_jobs()}
+
+@router.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """Status e progresso de uma execução."""
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} não encontrado.")
+    return job
+
+@router.get("/jobs/{job_id}/profile", response_class=PlainTextResponse)
+def job_profile(job_id: str):
+    """Pilhas amostradas da execução (formato collapsed, para flamegraph.pl/speedscope)."""
+    profile = get_job_profile(job_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} não encontrado ou sem profile concluído.")
+    return profile
+
+@router.post("/jobs/{job_id}/cancel", status_code=202)
+def job_cancel(job_id: str):
+    """Solicita o cancelamento; a execução para no próximo chunk e o shard é devolvido."""
+    job = cancel_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} não encontrado.")
+    return job
+
+@router.post("/watermarks/rebuild")
+def rebuild_watermarks():
+    """Recalcula as marcas d'água (última data por ativo) a partir de asset_history."""
+    result = rebuild_watermarks_now()
+    return {"message": "ok", **result}
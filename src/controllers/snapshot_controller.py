@@ -0,0 +1,65 @@
+from __future__ import annotations
+import datetime as dt
+import io
+from typing import Iterator, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from src.services.history_service import MEDIA_TYPES, FORMAT_ARROW
+from src.services.scheduler_service import snapshot_maintenance_now
+
+router = APIRouter(prefix="/snapshots", tags=["snapshots"])
+
+MAX_TICKERS_PER_REQUEST = 2000
+
+def _ipc_chunks(table) -> Iterator[bytes]:
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, table.schema)
+    for batch in table.to_batches():
+        writer.write_batch(batch)
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    writer.close()
+    yield sink.getvalue()
+
+@router.get("/history")
+def get_snapshot_history(
+    tickers: str = Query(..., description="Tickers separados por vírgula (ex.: PETR4,VALE3)"),
+    start: Optional[dt.date] = Query(None, description="Data inicial (inclusiva)"),
+    end: Optional[dt.date] = Query(None, description="Data final (inclusiva)"),
+):
+    """
+    Histórico lido do snapshot colunar local (Arrow IPC em memory-map), sem consultar o
+    Postgres. Pode estar atrás do banco até a próxima manutenção; tickers sem snapshot
+    vêm no cabeçalho X-Snapshot-Missing.
+    """
+    # importado na primeira leitura: snapshot_service carrega pandas/NumPy
+    from src.services.snapshot_service import read_history, snapshot_available
+
+    if not snapshot_available():
+        raise HTTPException(status_code=503, detail="Snapshot desabilitado ou pyarrow não instalado.")
+    wanted = list(dict.fromkeys(t.strip().upper() for t in tickers.split(",") if t.strip()))
+    if not wanted:
+        raise HTTPException(status_code=400, detail="Informe ao menos um ticker.")
+    if len(wanted) > MAX_TICKERS_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_TICKERS_PER_REQUEST} tickers por requisição.")
+    table = read_history(wanted, start, end)
+    if table is None:
+        raise HTTPException(status_code=404, detail="Nenhum dos tickers informados tem snapshot.")
+    found = set(table.column("ticker").unique().to_pylist())
+    missing = [t for t in wanted if t not in found]
+    return StreamingResponse(
+        _ipc_chunks(table),
+        media_type=MEDIA_TYPES[FORMAT_ARROW],
+        headers={"X-Snapshot-Missing": ",".join(missing)} if missing else None,
+    )
+
+@router.post("/maintenance", status_code=202)
+def run_maintenance():
+    """Enfileira a verificação contra as marcas d'água do banco e a compactação do snapshot."""
+    result = snapshot_maintenance_now()
+    return {"message": "accepted", **result}
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import io
+import logging
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+import pandas as pd
+from sqlalchemy import Table, literal_column, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from src.infra.instrumentation import counter, histogram
+
+log = logging.getLogger(__name__)
+
+_LOAD_SECONDS = histogram("yf_bulk_load_seconds", "Duração de uma carga (staging + merge) por tabela.", ("table", "mode"))
+# outcome: inserted / updated / unchanged (chave já existente mantida: conflito ignorado ou valores iguais)
+_ROWS = counter("yf_bulk_load_rows_total", "Linhas enviadas ao banco por tabela e resultado.", ("table", "outcome"))
+
+PERSIST_MODE_COPY = "copy"
+PERSIST_MODE_INSERT = "insert"
+PERSIST_MODES = (PERSIST_MODE_COPY, PERSIST_MODE_INSERT)
+
+# Política para linhas cuja chave já existe na tabela
+CONFLICT_IGNORE = "ignore"
+CONFLICT_UPDATE = "update"
+CONFLICT_UPDATE_IF_CHANGED = "update_if_changed"
+CONFLICT_POLICIES = (CONFLICT_IGNORE, CONFLICT_UPDATE, CONFLICT_UPDATE_IF_CHANGED)
+
+@dataclass
+class LoadResult:
+    staged: int = 0
+    inserted: int = 0
+    updated: int = 0
+
+    @property
+    def unchanged(self) -> int:
+        return max(0, self.staged - self.inserted - self.updated)
+
+def _to_copy_buffer(df: pd.DataFrame, columns: Sequence[str]) -> io.StringIO:
+    """
+    Serializa as colunas do frame em CSV (formato aceito pelo COPY) sem iterar linhas
+    em Python: o writer do pandas percorre os arrays de cada coluna. Nulos viram campo
+    vazio não citado, que o COPY interpreta como NULL.
+    """
+    buf = io.StringIO()
+    df.to_csv(buf, columns=list(columns), header=False, index=False, na_rep="")
+    buf.seek(0)
+    return buf
+
+def _to_records(df: pd.DataFrame, columns: Sequence[str]) -> List[dict]:
+    """Converte o frame em lista de dicts (tipos Python, nulos como None) para o INSERT multi-VALUES."""
+    sub = df[list(columns)].astype(object)
+    return sub.where(sub.notna(), None).to_dict("records")
+
+def _staging_name(table: Table) -> str:
+    return f"_stg_{table.name}"
+
+def _copy_into_staging(session: Session, table: Table, df: pd.DataFrame, columns: Sequence[str]) -> int:
+    """Cria (uma vez por conexão) a tabela temporária de staging e carrega o frame via COPY."""
+    stg = _staging_name(table)
+    cols_sql = ", ".join(columns)
+    conn = session.connection()
+    with conn.connection.cursor() as cur:
+        # ON COMMIT DELETE ROWS: a tabela sobrevive na conexão do pool e é esvaziada a cada commit
+        cur.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {stg} "
+            f"(LIKE {table.name} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        )
+        # várias cargas na mesma transação não podem reaproveitar linhas da anterior
+        cur.execute(f"TRUNCATE {stg}")
+        cur.copy_expert(f"COPY {stg} ({cols_sql}) FROM STDIN WITH (FORMAT csv)", _to_copy_buffer(df, columns))
+        return cur.rowcount if cur.rowcount is not None else len(df)
+
+def _merge_from_staging(
+    session: Session,
+    table: Table,
+    columns: Sequence[str],
+    key_columns: Sequence[str],
+    on_conflict: str,
+) -> Tuple[int, int]:
+    """
+    Move as linhas do staging para a tabela final com um único INSERT ... SELECT.
+    Retorna (inseridas, atualizadas).
+    """
+    stg = _staging_name(table)
+    cols_sql = ", ".join(columns)
+    keys_sql = ", ".join(key_columns)
+    conn = session.connection()
+    with conn.connection.cursor() as cur:
+        if on_conflict == CONFLICT_IGNORE:
+            cur.execute(
+                f"INSERT INTO {table.name} ({cols_sql}) "
+                f"SELECT {cols_sql} FROM {stg} "
+                f"ON CONFLICT ({keys_sql}) DO NOTHING"
+            )
+            return (cur.rowcount if cur.rowcount is not None else 0), 0
+
+        values = [c for c in columns if c not in key_columns]
+        set_sql = ", ".join(f"{c} = EXCLUDED.{c}" for c in values)
+        where_sql = ""
+        if on_conflict == CONFLICT_UPDATE_IF_CHANGED:
+            old_sql = ", ".join(f"{table.name}.{c}" for c in values)
+            new_sql = ", ".join(f"EXCLUDED.{c}" for c in values)
+            where_sql = f" WHERE ({old_sql}) IS DISTINCT FROM ({new_sql})"
+        # xmax = 0 identifica a linha recém-inserida (sem versão anterior) no RETURNING
+        cur.execute(
+            f"WITH merged AS ("
+            f"INSERT INTO {table.name} ({cols_sql}) "
+            f"SELECT {cols_sql} FROM {stg} "
+            f"ON CONFLICT ({keys_sql}) DO UPDATE SET {set_sql}{where_sql} "
+            f"RETURNING (xmax = 0) AS ins) "
+            f"SELECT count(*) FILTER (WHERE ins), count(*) FILTER (WHERE NOT ins) FROM merged"
+        )
+        inserted, updated = cur.fetchone()
+        return int(inserted or 0), int(updated or 0)
+
+def _insert_statement(table: Table, rows: List[dict], key_columns: Sequence[str], on_conflict: str):
+    stmt = pg_insert(table).values(rows)
+    if on_conflict == CONFLICT_IGNORE:
+        return stmt.on_conflict_do_nothing(index_elements=list(key_columns))
+
+    values = [c for c in rows[0] if c not in key_columns]
+    where = None
+    if on_conflict == CONFLICT_UPDATE_IF_CHANGED:
+        where = tuple_(*[table.c[c] for c in values]).is_distinct_from(tuple_(*[stmt.excluded[c] for c in values]))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_={c: stmt.excluded[c] for c in values},
+        where=where,
+    )
+    return stmt.returning(literal_column("(xmax = 0)").label("ins"))
+
+def _supports_copy(session: Session) -> bool:
+    return session.get_bind().dialect.driver == "psycopg2"
+
+def bulk_load(
+    session: Session,
+    table: Table,
+    df: pd.DataFrame,
+    key_columns: Sequence[str],
+    mode: str = PERSIST_MODE_COPY,
+    batch_size: int = 5000,
+    on_conflict: str = CONFLICT_IGNORE,
+) -> LoadResult:
+    """
+    Grava `df` em `table`. Não faz commit.
+
+    Modos:
+      - "copy":   COPY para uma tabela temporária + merge set-based na tabela final.
+      - "insert": INSERT multi-VALUES em lotes de `batch_size` linhas (fallback).
+
+    Conflitos de chave (`on_conflict`):
+      - "ignore":            mantém a linha existente.
+      - "update":            sobrescreve as colunas de valor.
+      - "update_if_changed": sobrescreve só quando algum valor difere (evita reescritas inúteis).
+    """
+    result = LoadResult()
+    if df is None or len(df) == 0:
+        return result
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"Política de conflito inválida: {on_conflict!r} (use uma de {CONFLICT_POLICIES})")
+
+    columns = [c.name for c in table.columns if c.name in df.columns]
+    if on_conflict != CONFLICT_IGNORE:
+        # um mesmo comando não pode atualizar a mesma chave duas vezes
+        df = df.drop_duplicates(subset=list(key_columns), keep="last")
+
+    if mode == PERSIST_MODE_COPY and not _supports_copy(session):
+        log.warning(f"Driver sem suporte a COPY; usando modo '{PERSIST_MODE_INSERT}' para {table.name}.")
+        mode = PERSIST_MODE_INSERT
+    if mode not in PERSIST_MODES:
+        raise ValueError(f"Modo de persistência inválido: {mode!r} (use um de {PERSIST_MODES})")
+
+    with _LOAD_SECONDS.time(table=table.name, mode=mode):
+        _load(session, table, df, columns, key_columns, mode, batch_size, on_conflict, result)
+    _ROWS.inc(result.inserted, table=table.name, outcome="inserted")
+    _ROWS.inc(result.updated, table=table.name, outcome="updated")
+    _ROWS.inc(result.unchanged, table=table.name, outcome="unchanged")
+    return result
+
+def _load(
+    session: Session,
+    table: Table,
+    df: pd.DataFrame,
+    columns: List[str],
+    key_columns: Sequence[str],
+    mode: str,
+    batch_size: int,
+    on_conflict: str,
+    result: LoadResult,
+) -> None:
+    if mode == PERSIST_MODE_COPY:
+        result.staged = _copy_into_staging(session, table, df, columns)
+        result.inserted, result.updated = _merge_from_staging(session, table, columns, key_columns, on_conflict)
+        return
+
+    for i in range(0, len(df), batch_size):
+        rows = _to_records(df.iloc[i:i + batch_size], columns)
+        res = session.execute(_insert_statement(table, rows, key_columns, on_conflict))
+        result.staged += len(rows)
+        if on_conflict == CONFLICT_IGNORE:
+            result.inserted += res.rowcount if res.rowcount is not None else 0
+        else:
+            flags = res.scalars().all()
+            ins = sum(1 for f in flags if f)
+            result.inserted += ins
+            result.updated += len(flags) - ins
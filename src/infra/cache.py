@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Protocol
+
+_MISSING = object()
+
+# ----------------- Camada local (in-process) -----------------
+
+class TTLCache:
+    """Cache LRU em memória com expiração por entrada. Thread-safe."""
+
+    def __init__(self, max_entries: int = 5000, ttl_seconds: float = 60.0):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self._data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING or item[0] < now:
+                if item is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        expires = time.monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+# ----------------- Camada compartilhada (plugável) -----------------
+
+class CacheBackend(Protocol):
+    """Backend compartilhado entre processos/réplicas. Valores são dicts serializáveis em JSON."""
+
+    def get_many(self, keys: List[str]) -> Dict[str, dict]: ...
+
+    def set_many(self, items: Dict[str, dict], ttl_seconds: int) -> None: ...
+
+    def delete_many(self, keys: List[str]) -> None: ...
+
+class InMemoryBackend:
+    """Substituto local do backend compartilhado (testes / instância única)."""
+
+    def __init__(self):
+        self._cache = TTLCache(max_entries=1_000_000, ttl_seconds=3600)
+
+    def get_many(self, keys: List[str]) -> Dict[str, dict]:
+        out = {}
+        for k in keys:
+            raw = self._cache.get(k)
+            if raw is not None:
+                out[k] = json.loads(raw)
+        return out
+
+    def set_many(self, items: Dict[str, dict], ttl_seconds: int) -> None:
+        for k, v in items.items():
+            self._cache.set(k, json.dumps(v, default=str), ttl_seconds=ttl_seconds)
+
+    def delete_many(self, keys: List[str]) -> None:
+        for k in keys:
+            self._cache.delete(k)
+
+class RedisBackend:
+    """Backend Redis (requer o pacote `redis`)."""
+
+    def __init__(self, url: str, prefix: str = ""):
+        try:
+            import redis
+        except ImportError as e:  # pragma: no cover - dependência opcional
+            raise RuntimeError("Backend 'redis' configurado, mas o pacote 'redis' não está instalado.") from e
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get_many(self, keys: List[str]) -> Dict[str, dict]:
+        if not keys:
+            return {}
+        raws = self._client.mget([self._prefix + k for k in keys])
+        return {k: json.loads(r) for k, r in zip(keys, raws) if r is not None}
+
+    def set_many(self, items: Dict[str, dict], ttl_seconds: int) -> None:
+        if not items:
+            return
+        pipe = self._client.pipeline(transaction=False)
+        for k, v in items.items():
+            pipe.set(self._prefix + k, json.dumps(v, default=str), ex=ttl_seconds)
+        pipe.execute()
+
+    def delete_many(self, keys: List[str]) -> None:
+        if keys:
+            self._client.delete(*[self._prefix + k for k in keys])
+
+# ----------------- Coalescência de requisições -----------------
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """
+    Garante uma única execução concorrente por chave: chamadas simultâneas para a
+    mesma chave esperam o resultado da primeira em vez de repetirem a consulta.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do_many(self, keys: Iterable[str], fn: Callable[[List[str]], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        As chaves já em voo são aguardadas; as demais são resolvidas por uma única
+        chamada `fn(chaves)` que devolve {chave: valor}.
+        """
+        waiting: Dict[str, _Call] = {}
+        mine: Dict[str, _Call] = {}
+        with self._lock:
+            for k in dict.fromkeys(keys):
+                call = self._calls.get(k)
+                if call is None:
+                    call = _Call()
+                    self._calls[k] = call
+                    mine[k] = call
+                else:
+                    waiting[k] = call
+
+        out: Dict[str, Any] = {}
+        if mine:
+            try:
+                res = fn(list(mine.keys())) or {}
+                for k, call in mine.items():
+                    call.result = res.get(k)
+                    out[k] = call.result
+            except BaseException as e:
+                for call in mine.values():
+                    call.error = e
+                raise
+            finally:
+                with self._lock:
+                    for k in mine:
+                        self._calls.pop(k, None)
+                for call in mine.values():
+                    call.event.set()
+
+        for k, call in waiting.items():
+            call.event.wait()
+            if call.error is None:
+                out[k] = call.result
+        return out
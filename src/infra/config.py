@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 import os
+import threading
 import yaml
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -21,11 +22,137 @@ class AppConfig:
     actions: bool
     timezone: str
 
+@dataclass(frozen=True)
+class PipelineConfig:
+    queue_depth: int
+
+@dataclass(frozen=True)
+class PersistConfig:
+    mode: str
+    insert_batch_size: int
+    on_conflict: str
+
+@dataclass(frozen=True)
+class QuotesConfig:
+    ttl_seconds: float
+    max_entries: int
+    backend: str
+    redis_url: str | None
+    shared_ttl_seconds: int
+    negative_ttl_seconds: float
+
+@dataclass(frozen=True)
+class FetchConfig:
+    provider: str
+    max_concurrency: int
+    rate_per_second: float
+    burst: float
+    max_retries: int
+    backoff_base_seconds: float
+    backoff_max_seconds: float
+    breaker_failure_threshold: int
+    breaker_cooldown_seconds: float
+    breaker_max_cooldown_seconds: float
+    fake_latency_ms: float
+    fake_error_rate: float
+    fake_throttle_rate: float
+    fake_latency_per_symbol_ms: float
+    fake_seed: int | None
+
+@dataclass(frozen=True)
+class QuarantineConfig:
+    threshold: int
+    base_minutes: float
+    max_hours: float
+
+@dataclass(frozen=True)
+class CoordinationConfig:
+    mode: str
+    shards: int
+    lease_seconds: int
+
+@dataclass(frozen=True)
+class CalendarConfig:
+    enabled: bool
+    exchange: str
+    session_open: str
+    session_close: str
+    settle_delay_minutes: int
+    extra_holidays: tuple
+    extra_sessions: tuple
+
+@dataclass(frozen=True)
+class GapsConfig:
+    enabled: bool
+    interval_minutes: int
+    off_hours_only: bool
+    calendar_start: str
+    rescan_hours: float
+    max_scan_assets: int
+    max_requests_per_run: int
+    max_attempts: int
+    retry_hours: float
+
+@dataclass(frozen=True)
+class CorporateActionsConfig:
+    enabled: bool
+    max_assets_per_run: int
+
+@dataclass(frozen=True)
+class SnapshotConfig:
+    enabled: bool
+    root: str
+    maintenance_minutes: int
+    compact_min_parts: int
+    max_rebuilds_per_run: int
+
+@dataclass(frozen=True)
+class MetricsConfig:
+    enabled: bool
+
+@dataclass(frozen=True)
+class ObservabilityConfig:
+    profile_interval_ms: float
+    profile_max_stacks: int
+
+@dataclass(frozen=True)
+class StartupConfig:
+    background_init: bool
+    retry_seconds: float
+
+@dataclass(frozen=True)
+class IntradayConfig:
+    enabled: bool
+    interval: str
+    tickers: tuple
+    schedule_minutes: int
+    lookback_days: int
+    ring_size: int
+    retention_days: int
+    downsample_interval: str
+    downsample_retention_days: int
+    partitions_ahead_days: int
+    maintenance_minutes: int
+
 @dataclass(frozen=True)
 class Settings:
     db_url: str
     log_level: str
     app: AppConfig
+    pipeline: PipelineConfig
+    persist: PersistConfig
+    quotes: QuotesConfig
+    fetch: FetchConfig
+    quarantine: QuarantineConfig
+    coordination: CoordinationConfig
+    calendar: CalendarConfig
+    gaps: GapsConfig
+    corporate_actions: CorporateActionsConfig
+    snapshot: SnapshotConfig
+    metrics: MetricsConfig
+    intraday: IntradayConfig
+    observability: ObservabilityConfig
+    startup: StartupConfig
     logging_sql: bool = False
     create_log_file: bool = False
 
@@ -47,6 +174,20 @@ def load_settings() -> Settings:
     """
     y = _load_yaml_config()
     app = y.get("app", {})
+    pipeline = y.get("pipeline", {}) or {}
+    persist = y.get("persist", {}) or {}
+    quotes = y.get("quotes", {}) or {}
+    fetch = y.get("fetch", {}) or {}
+    quarantine = y.get("quarantine", {}) or {}
+    coordination = y.get("coordination", {}) or {}
+    calendar = y.get("calendar", {}) or {}
+    gaps = y.get("gaps", {}) or {}
+    corporate_actions = y.get("corporate_actions", {}) or {}
+    snapshot = y.get("snapshot", {}) or {}
+    metrics = y.get("metrics", {}) or {}
+    intraday = y.get("intraday", {}) or {}
+    observability = y.get("observability", {}) or {}
+    startup = y.get("startup", {}) or {}
     db_host = os.getenv("DB_HOST", "localhost")
     db_port = os.getenv("DB_PORT", "5432")
     db_name = os.getenv("DB_NAME", "postgres")
@@ -71,4 +212,151 @@ def load_settings() -> Settings:
             actions=bool(app.get("actions", True)),
             timezone=str(app.get("timezone", "America/Sao_Paulo")),
         ),
+        pipeline=PipelineConfig(
+            queue_depth=int(pipeline.get("queue_depth", 2)),
+        ),
+        persist=PersistConfig(
+            mode=str(persist.get("mode", "copy")).lower(),
+            insert_batch_size=int(persist.get("insert_batch_size", 5000)),
+            on_conflict=str(persist.get("on_conflict", "update_if_changed")).lower(),
+        ),
+        quotes=QuotesConfig(
+            ttl_seconds=float(quotes.get("ttl_seconds", 30)),
+            max_entries=int(quotes.get("max_entries", 5000)),
+            backend=str(quotes.get("backend", "memory")).lower(),
+            redis_url=os.getenv("REDIS_URL", quotes.get("redis_url")),
+            shared_ttl_seconds=int(quotes.get("shared_ttl_seconds", 900)),
+            negative_ttl_seconds=float(quotes.get("negative_ttl_seconds", 10)),
+        ),
+        fetch=FetchConfig(
+            provider=str(fetch.get("provider", "yahoo")).lower(),
+            max_concurrency=int(fetch.get("max_concurrency", 1)),
+            rate_per_second=float(fetch.get("rate_per_second", 10)),
+            burst=float(fetch.get("burst", 100)),
+            max_retries=int(fetch.get("max_retries", 3)),
+            backoff_base_seconds=float(fetch.get("backoff_base_seconds", 2.0)),
+            backoff_max_seconds=float(fetch.get("backoff_max_seconds", 60.0)),
+            breaker_failure_threshold=int(fetch.get("breaker_failure_threshold", 5)),
+            breaker_cooldown_seconds=float(fetch.get("breaker_cooldown_seconds", 60.0)),
+            breaker_max_cooldown_seconds=float(fetch.get("breaker_max_cooldown_seconds", 900.0)),
+            fake_latency_ms=float(fetch.get("fake_latency_ms", 0)),
+            fake_error_rate=float(fetch.get("fake_error_rate", 0)),
+            fake_throttle_rate=float(fetch.get("fake_throttle_rate", 0)),
+            fake_latency_per_symbol_ms=float(fetch.get("fake_latency_per_symbol_ms", 0)),
+            fake_seed=int(fetch["fake_seed"]) if fetch.get("fake_seed") is not None else None,
+        ),
+        quarantine=QuarantineConfig(
+            threshold=int(quarantine.get("threshold", 3)),
+            base_minutes=float(quarantine.get("base_minutes", 15)),
+            max_hours=float(quarantine.get("max_hours", 168)),
+        ),
+        coordination=CoordinationConfig(
+            mode=str(coordination.get("mode", "none")).lower(),
+            shards=int(coordination.get("shards", 4)),
+            lease_seconds=int(coordination.get("lease_seconds", 300)),
+        ),
+        calendar=CalendarConfig(
+            enabled=bool(calendar.get("enabled", True)),
+            exchange=str(calendar.get("exchange", "B3")).upper(),
+            session_open=str(calendar.get("session_open", "10:00")),
+            session_close=str(calendar.get("session_close", "18:00")),
+            settle_delay_minutes=int(calendar.get("settle_delay_minutes", 30)),
+            extra_holidays=tuple(str(d) for d in (calendar.get("extra_holidays") or [])),
+            extra_sessions=tuple(str(d) for d in (calendar.get("extra_sessions") or [])),
+        ),
+        gaps=GapsConfig(
+            enabled=bool(gaps.get("enabled", False)),
+            interval_minutes=int(gaps.get("interval_minutes", 60)),
+            off_hours_only=bool(gaps.get("off_hours_only", True)),
+            calendar_start=str(gaps.get("calendar_start", "2000-01-01")),
+            rescan_hours=float(gaps.get("rescan_hours", 24)),
+            max_scan_assets=int(gaps.get("max_scan_assets", 500)),
+            max_requests_per_run=int(gaps.get("max_requests_per_run", 20)),
+            max_attempts=int(gaps.get("max_attempts", 3)),
+            retry_hours=float(gaps.get("retry_hours", 24)),
+        ),
+        corporate_actions=CorporateActionsConfig(
+            enabled=bool(corporate_actions.get("enabled", False)),
+            max_assets_per_run=int(corporate_actions.get("max_assets_per_run", 50)),
+        ),
+        snapshot=SnapshotConfig(
+            enabled=bool(snapshot.get("enabled", False)),
+            root=os.getenv("SNAPSHOT_ROOT", str(snapshot.get("root", "data/snapshots"))),
+            maintenance_minutes=int(snapshot.get("maintenance_minutes", 60)),
+            compact_min_parts=int(snapshot.get("compact_min_parts", 8)),
+            max_rebuilds_per_run=int(snapshot.get("max_rebuilds_per_run", 200)),
+        ),
+        metrics=MetricsConfig(
+            enabled=bool(metrics.get("enabled", False)),
+        ),
+        intraday=IntradayConfig(
+            enabled=bool(intraday.get("enabled", False)),
+            interval=str(intraday.get("interval", "5m")),
+            tickers=tuple(str(t).strip().upper() for t in (intraday.get("tickers") or [])),
+            schedule_minutes=int(intraday.get("schedule_minutes", 5)),
+            lookback_days=int(intraday.get("lookback_days", 5)),
+            ring_size=int(intraday.get("ring_size", 500)),
+            retention_days=int(intraday.get("retention_days", 30)),
+            downsample_interval=str(intraday.get("downsample_interval", "60m") or ""),
+            downsample_retention_days=int(intraday.get("downsample_retention_days", 730)),
+            partitions_ahead_days=int(intraday.get("partitions_ahead_days", 3)),
+            maintenance_minutes=int(intraday.get("maintenance_minutes", 60)),
+        ),
+        observability=ObservabilityConfig(
+            profile_interval_ms=float(observability.get("profile_interval_ms", 10)),
+            profile_max_stacks=int(observability.get("profile_max_stacks", 5000)),
+        ),
+        startup=StartupConfig(
+            background_init=bool(startup.get("background_init", True)),
+            retry_seconds=float(startup.get("retry_seconds", 5.0)),
+        ),
     )
+
+COORDINATION_MODES = ("none", "leader", "sharded")
+MIN_LEASE_SECONDS = 30
+
+def _validate(s: Settings) -> Settings:
+    """Rejeita combinações que só falhariam em produção (ValueError com o campo em questão)."""
+    c = s.coordination
+    if c.mode not in COORDINATION_MODES:
+        raise ValueError(f"coordination.mode inválido: {c.mode!r} (use {', '.join(COORDINATION_MODES)}).")
+    if c.mode == "sharded":
+        if c.shards < 1:
+            raise ValueError("coordination.shards deve ser >= 1.")
+        # renovado a cada lease_seconds/3: com prazo curto, uma renovação atrasada (banco lento) já perde o shard
+        if c.lease_seconds < MIN_LEASE_SECONDS:
+            raise ValueError(f"coordination.lease_seconds deve ser >= {MIN_LEASE_SECONDS} (renovação a cada 1/3 do prazo).")
+    return s
+
+_settings: Settings | None = None
+_settings_lock = threading.Lock()
+
+def get_settings() -> Settings:
+    """
+    Configurações do processo: carregadas uma única vez (load_settings) e compartilhadas por
+    todos os módulos. É o que os módulos devem usar; load_settings() relê tudo a cada chamada.
+    """
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _settings = _validate(load_settings())
+    return _settings
+
+def reload_settings() -> Settings:
+    """
+    Relê config.yml e o ambiente e atualiza no lugar o objeto devolvido por get_settings(), de
+    modo que os módulos que o guardaram em `settings` passam a ver os valores novos. Componentes
+    já montados a partir dele (engine do banco, agendamentos, FetchEngine) mantêm a configuração
+    com que foram criados até serem recriados.
+    """
+    fresh = _validate(load_settings())
+    with _settings_lock:
+        global _settings
+        if _settings is None:
+            _settings = fresh
+        else:
+            for f in fields(Settings):
+                # Settings é imutável para o resto do código; só o recarregamento troca os campos
+                object.__setattr__(_settings, f.name, getattr(fresh, f.name))
+    return _settings
@@ -1,21 +1,42 @@
 from __future__ import annotations
 
 import logging as log
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool
 
+from src.infra.instrumentation import gauge, histogram
+from src.models.tables import metadata, service_tables, service_indexes
+
 _engine: Engine | None = None
 _Session = None
 
+_CHECKOUT_SECONDS = histogram(
+    "yf_db_pool_checkout_seconds", "Espera para obter uma conexão do pool (inclui abrir conexão nova).",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0),
+)
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool que mede o tempo de checkout (espera por vaga no pool) em yf_db_pool_checkout_seconds."""
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            _CHECKOUT_SECONDS.observe(time.perf_counter() - t0)
+
+gauge("yf_db_pool_checked_out", "Conexões do pool em uso.", fn=lambda: _engine.pool.checkedout() if _engine else 0)
+
 def init_engine(db_url: str,  logging_sql: bool = False) -> Engine:
     global _engine, _Session
     log.info("Inicializando engine com URL: %s", db_url)
     if _engine is None:
         _engine = create_engine(
             db_url,
-            poolclass=QueuePool,
+            poolclass=InstrumentedQueuePool,
             pool_size=5,
             max_overflow=5,
             pool_timeout=30,
@@ -26,7 +47,37 @@ def init_engine(db_url: str,  logging_sql: bool = False) -> Engine:
         _Session = sessionmaker(bind=_engine, autoflush=False, autocommit=False, future=True)
     return _engine
 
+def get_engine() -> Engine:
+    if _engine is None:
+        raise RuntimeError("Engine not initialized. Call init_engine first.")
+    return _engine
+
 def get_session():
     if _Session is None:
         raise RuntimeError("Engine not initialized. Call init_engine first.")
     return _Session()
+
+def _add_missing_columns(engine: Engine, table) -> None:
+    """Adiciona colunas novas (definidas em tables.py) a uma tabela já existente."""
+    existing = {c["name"] for c in inspect(engine).get_columns(table.name)}
+    with engine.begin() as conn:
+        for col in table.columns:
+            if col.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS {col.name} {col.type.compile(dialect=engine.dialect)}"
+            if col.server_default is not None:
+                default = col.server_default.arg
+                default_sql = f"'{default}'" if isinstance(default, str) else str(default.compile(dialect=engine.dialect))
+                ddl += f" DEFAULT {default_sql}"
+            if not col.nullable and col.server_default is not None:
+                ddl += " NOT NULL"
+            log.info("Adicionando coluna %s.%s", table.name, col.name)
+            conn.execute(text(ddl))
+
+def ensure_schema(engine: Engine) -> None:
+    """Cria, se ainda não existirem, as tabelas mantidas por este serviço (e colunas novas delas)."""
+    metadata.create_all(engine, tables=service_tables, checkfirst=True)
+    for table in service_tables:
+        _add_missing_columns(engine, table)
+    for index in service_indexes:
+        index.create(engine, checkfirst=True)
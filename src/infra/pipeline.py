@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, List, Optional
+
+from src.infra.instrumentation import histogram
+
+log = logging.getLogger(__name__)
+
+_STAGE_SECONDS = histogram(
+    "yf_pipeline_stage_seconds", "Tempo de processamento de um item (chunk) por estágio do pipeline.",
+    ("pipeline", "stage"),
+)
+
+# Sentinela de fim de fluxo entre estágios
+_END = object()
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    Estágio do pipeline.
+
+    `fn` recebe um item e devolve o item a repassar ao próximo estágio
+    (ou None para descartá-lo). `workers` define quantas threads consomem a fila do estágio.
+    """
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+
+
+@dataclass
+class StageStats:
+    name: str
+    items: int = 0
+    busy_seconds: float = 0.0      # tempo executando a função do estágio
+    idle_seconds: float = 0.0      # tempo esperando item do estágio anterior
+    blocked_seconds: float = 0.0   # tempo bloqueado na fila de saída (backpressure)
+    # os workers de um mesmo estágio compartilham a instância; `+=` não é atômico entre threads
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, items: int = 0, busy: float = 0.0, idle: float = 0.0, blocked: float = 0.0) -> None:
+        with self._lock:
+            self.items += items
+            self.busy_seconds += busy
+            self.idle_seconds += idle
+            self.blocked_seconds += blocked
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "items": self.items,
+                "busy_seconds": round(self.busy_seconds, 3),
+                "idle_seconds": round(self.idle_seconds, 3),
+                "blocked_seconds": round(self.blocked_seconds, 3),
+            }
+
+
+class Pipeline:
+    """
+    Pipeline em estágios ligados por filas limitadas.
+
+    Cada estágio roda em thread(s) próprias; a fila entre dois estágios comporta no
+    máximo `depth` itens, então um estágio rápido bloqueia (backpressure) quando o
+    seguinte não acompanha. O tempo total passa a ser dominado pelo estágio mais lento,
+    e não pela soma de todos.
+    """
+
+    def __init__(self, stages: List[Stage], depth: int = 2, name: str = "pipeline"):
+        if not stages:
+            raise ValueError("Pipeline precisa de ao menos um estágio.")
+        if any(s.workers < 1 for s in stages):
+            raise ValueError("Cada estágio precisa de ao menos um worker.")
+        self.stages = stages
+        self.depth = max(1, int(depth))
+        self.name = name
+        self._abort = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+
+    def _fail(self, exc: BaseException) -> None:
+        with self._lock:
+            if self._error is None:
+                self._error = exc
+        self._abort.set()
+
+    @staticmethod
+    def _put(q: "queue.Queue", item: Any, stats: StageStats) -> None:
+        t0 = time.perf_counter()
+        q.put(item)
+        stats.add(blocked=time.perf_counter() - t0)
+
+    def run(self, source: Iterable[Any]) -> List[StageStats]:
+        """
+        Alimenta o pipeline com os itens de `source` (na thread chamadora) e aguarda
+        todos os estágios terminarem. Relança a primeira exceção não tratada de um estágio.
+
+        Retorna as estatísticas por estágio; a primeira entrada ("source") mede o tempo
+        em que o produtor ficou bloqueado pela backpressure.
+        """
+        queues = [queue.Queue(maxsize=self.depth) for _ in self.stages]
+        source_stats = StageStats(name="source")
+        stats = [StageStats(name=s.name) for s in self.stages]
+        remaining = [s.workers for s in self.stages]
+        threads: List[threading.Thread] = []
+
+        def worker(idx: int) -> None:
+            stage = self.stages[idx]
+            st = stats[idx]
+            in_q = queues[idx]
+            out_q = queues[idx + 1] if idx + 1 < len(queues) else None
+            while True:
+                t0 = time.perf_counter()
+                item = in_q.get()
+                t1 = time.perf_counter()
+                if item is _END:
+                    break
+                st.add(idle=t1 - t0)
+                if self._abort.is_set():
+                    # após falha só drena a fila para não travar quem produz
+                    continue
+                try:
+                    result = stage.fn(item)
+                except BaseException as e:  # noqa: BLE001 - propagado ao chamador em run()
+                    log.exception(f"[{self.name}] Falha no estágio '{stage.name}': {e}")
+                    self._fail(e)
+                    continue
+                finally:
+                    busy = time.perf_counter() - t1
+                    st.add(busy=busy)
+                    _STAGE_SECONDS.observe(busy, pipeline=self.name, stage=stage.name)
+                st.add(items=1)
+                if out_q is not None and result is not None:
+                    self._put(out_q, result, st)
+
+            with self._lock:
+                remaining[idx] -= 1
+                last = remaining[idx] == 0
+            if last and out_q is not None:
+                for _ in range(self.stages[idx + 1].workers):
+                    out_q.put(_END)
+
+        for idx, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                t = threading.Thread(target=worker, args=(idx,), name=f"{self.name}-{stage.name}-{n}", daemon=True)
+                t.start()
+                threads.append(t)
+
+        try:
+            for item in source:
+                if self._abort.is_set():
+                    break
+                self._put(queues[0], item, source_stats)
+                source_stats.add(items=1)
+        except BaseException as e:  # noqa: BLE001
+            self._fail(e)
+        finally:
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_END)
+            for t in threads:
+                t.join()
+
+        if self._error is not None:
+            raise self._error
+        return [source_stats, *stats]
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+# sufixo numérico das threads de um mesmo estágio ("fetch-download-3" -> "fetch-download")
+_THREAD_SUFFIX = re.compile(r"-\d+$")
+
+@dataclass
+class ProfileReport:
+    interval_seconds: float
+    duration_seconds: float = 0.0
+    samples: int = 0
+    stacks: Counter = field(default_factory=Counter)
+
+    def collapsed(self, limit: Optional[int] = None) -> str:
+        """Pilhas no formato "collapsed" (thread;arquivo:função;... contagem), aceito por flamegraph.pl/speedscope."""
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common(limit))
+
+    def as_dict(self, top: int = 20) -> dict:
+        return {
+            "interval_seconds": self.interval_seconds,
+            "duration_seconds": round(self.duration_seconds, 3),
+            "samples": self.samples,
+            "top": [{"stack": s, "samples": n} for s, n in self.stacks.most_common(top)],
+        }
+
+class SamplingProfiler:
+    """
+    Profiler por amostragem: uma thread lê `sys._current_frames()` a cada `interval_seconds`
+    e conta as pilhas da thread que chamou `start()` e das threads criadas depois dela (ex.: os
+    workers do pipeline da execução), agrupadas pelo nome sem o sufixo do worker. Threads que já
+    existiam (servidor HTTP, scheduler) ficam de fora. Não instrumenta o código: o custo é
+    proporcional à frequência de amostragem, não às chamadas.
+    """
+
+    def __init__(self, interval_seconds: float = 0.01, max_depth: int = 64, max_stacks: int = 5000):
+        self.interval_seconds = max(0.001, float(interval_seconds))
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ignored: set = set()
+        self.report = ProfileReport(interval_seconds=self.interval_seconds)
+
+    def _stack(self, frame) -> List[str]:
+        out = []
+        while frame is not None and len(out) < self.max_depth:
+            code = frame.f_code
+            out.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+            frame = frame.f_back
+        out.reverse()
+        return out
+
+    def _sample(self) -> None:
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks = self.report.stacks
+        for ident, frame in sys._current_frames().items():
+            if ident == me or ident in self._ignored:
+                continue
+            thread = _THREAD_SUFFIX.sub("", names.get(ident, str(ident)))
+            key = ";".join([thread, *self._stack(frame)])
+            if key in stacks or len(stacks) < self.max_stacks:
+                stacks[key] += 1
+            else:
+                stacks["(outras)"] += 1
+        self.report.samples += 1
+
+    def _run(self) -> None:
+        t0 = time.perf_counter()
+        while not self._stop.wait(self.interval_seconds):
+            self._sample()
+        self.report.duration_seconds = time.perf_counter() - t0
+
+    def start(self) -> "SamplingProfiler":
+        caller = threading.get_ident()
+        self._ignored = {t.ident for t in threading.enumerate() if t.ident != caller}
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> ProfileReport:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.report
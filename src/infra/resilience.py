@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+class ThrottledError(Exception):
+    """O provedor sinalizou limite de requisições (HTTP 429 / rate limit)."""
+
+class CircuitOpenError(Exception):
+    """O circuito está aberto: chamadas ao provedor estão suspensas."""
+
+# ----------------- Rate limit -----------------
+
+class TokenBucket:
+    """
+    Token bucket thread-safe: `rate` tokens/s repostos até `capacity`.
+    `acquire(n)` bloqueia até haver `n` tokens (n acima da capacidade é limitado a ela).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, n: float = 1.0) -> float:
+        """Consome `n` tokens; retorna o tempo total esperado (s)."""
+        if self.rate <= 0:
+            return 0.0
+        n = min(float(n), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return waited
+                wait = (n - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+# ----------------- Circuit breaker -----------------
+
+class CircuitBreaker:
+    """
+    Abre após `failure_threshold` falhas consecutivas (ou imediatamente em throttling) e
+    suspende chamadas por `cooldown_seconds`. Depois libera uma chamada de teste
+    (meio-aberto): sucesso fecha o circuito, falha reabre com cooldown dobrado até `max_cooldown_seconds`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, cooldown_seconds: float = 60.0, max_cooldown_seconds: float = 900.0):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.base_cooldown = float(cooldown_seconds)
+        self.max_cooldown = max(float(max_cooldown_seconds), self.base_cooldown)
+        self._cooldown = self.base_cooldown
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def remaining_open_seconds(self) -> float:
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self._cooldown - time.monotonic())
+
+    def allow(self) -> bool:
+        """True se a chamada pode seguir agora."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() < self._opened_at + self._cooldown:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probing = False
+            # meio-aberto: só uma chamada de teste por vez
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                log.info("Circuito fechado: provedor respondeu normalmente.")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+            self._cooldown = self.base_cooldown
+
+    def record_failure(self, throttled: bool = False) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN:
+                self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+                self._open()
+            elif throttled or self._failures >= self.failure_threshold:
+                self._open()
+
+    def release(self) -> None:
+        """
+        Encerra uma chamada sem sinal sobre a saúde do provedor (ex.: erro do próprio pedido):
+        não mexe no estado nem na contagem de falhas, só libera a vaga de teste do meio-aberto.
+        """
+        with self._lock:
+            self._probing = False
+
+    def _open(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probing = False
+        log.warning(f"Circuito aberto por {self._cooldown:.0f}s após {self._failures} falha(s) consecutiva(s).")
+
+    def wait_until_allowed(self, timeout: Optional[float] = None) -> None:
+        """Bloqueia enquanto o circuito estiver aberto; lança CircuitOpenError após `timeout`."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.allow():
+            remaining = self.remaining_open_seconds() or 0.05
+            if deadline is not None:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    raise CircuitOpenError("Circuito aberto: provedor indisponível ou limitando requisições.")
+                remaining = min(remaining, left)
+            time.sleep(remaining)
+
+# ----------------- Retry -----------------
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_retries: int = 3
+    base_seconds: float = 1.0
+    max_seconds: float = 30.0
+
+    def backoff(self, attempt: int) -> float:
+        """Backoff exponencial com full jitter: U(0, min(max, base * 2^attempt))."""
+        return random.uniform(0, min(self.max_seconds, self.base_seconds * (2 ** attempt)))
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Colunas de valor de cada barra, na ordem das colunas de `values`
+BAR_FIELDS = ("open", "high", "low", "close", "volume")
+
+class BarRing:
+    """
+    Buffer circular de tamanho fixo com as últimas `capacity` barras de um ticker.
+
+    Os dados ficam em dois arrays pré-alocados (timestamps em ns UTC e uma matriz float64
+    com BAR_FIELDS), sem objetos por barra: escrever é copiar fatias, e ler as últimas N
+    barras é no máximo duas fatias contíguas. Thread-safe.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self._ts = np.zeros(self.capacity, dtype=np.int64)
+        self._values = np.full((self.capacity, len(BAR_FIELDS)), np.nan)
+        self._head = 0  # próxima posição de escrita
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def latest_ts(self) -> Optional[int]:
+        with self._lock:
+            return int(self._ts[(self._head - 1) % self.capacity]) if self._size else None
+
+    def _order(self) -> np.ndarray:
+        """Posições físicas em ordem cronológica (mais antiga primeiro)."""
+        start = (self._head - self._size) % self.capacity
+        return (start + np.arange(self._size)) % self.capacity
+
+    def extend(self, ts: np.ndarray, values: np.ndarray) -> int:
+        """
+        Acrescenta barras ordenadas por `ts` (ns UTC); `values` tem uma coluna por BAR_FIELDS.
+        Barras com timestamp já presente substituem a existente (a barra corrente é revisada a
+        cada consulta); barras mais antigas que a última e ausentes do buffer são ignoradas.
+        Retorna quantas barras novas entraram.
+        """
+        ts = np.asarray(ts, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64).reshape(len(ts), len(BAR_FIELDS))
+        with self._lock:
+            if self._size:
+                last = self._ts[(self._head - 1) % self.capacity]
+                old = ts <= last
+                if old.any():
+                    pos = self._order()
+                    held = self._ts[pos]
+                    i = np.searchsorted(held, ts[old])
+                    i_ok = np.minimum(i, len(held) - 1)
+                    hit = (i < len(held)) & (held[i_ok] == ts[old])
+                    self._values[pos[i_ok[hit]]] = values[old][hit]
+                    ts, values = ts[~old], values[~old]
+            m = len(ts)
+            if not m:
+                return 0
+            if m > self.capacity:
+                ts, values = ts[-self.capacity:], values[-self.capacity:]
+            n = len(ts)
+            first = min(n, self.capacity - self._head)
+            self._ts[self._head:self._head + first] = ts[:first]
+            self._values[self._head:self._head + first] = values[:first]
+            rest = n - first
+            if rest:
+                self._ts[:rest] = ts[first:]
+                self._values[:rest] = values[first:]
+            self._head = (self._head + n) % self.capacity
+            self._size = min(self.capacity, self._size + n)
+            return m
+
+    def last(self, n: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Cópia das últimas `n` barras (todas se None), em ordem cronológica: (ts, values)."""
+        with self._lock:
+            k = self._size if n is None else max(0, min(int(n), self._size))
+            start = (self._head - k) % self.capacity
+            if start + k <= self.capacity:
+                return self._ts[start:start + k].copy(), self._values[start:start + k].copy()
+            pos = (start + np.arange(k)) % self.capacity
+            return self._ts[pos], self._values[pos]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._head = 0
+            self._size = 0
+
+class RingBufferStore:
+    """Um BarRing por chave (ticker), todos com a mesma capacidade. Thread-safe."""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self._rings: Dict[str, BarRing] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, create: bool = False) -> Optional[BarRing]:
+        with self._lock:
+            ring = self._rings.get(key)
+            if ring is None and create:
+                ring = self._rings[key] = BarRing(self.capacity)
+            return ring
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._rings)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._rings.pop(key, None)
+
+    def nbytes(self) -> int:
+        """Memória ocupada pelos arrays de todos os buffers."""
+        with self._lock:
+            return sum(r._ts.nbytes + r._values.nbytes for r in self._rings.values())
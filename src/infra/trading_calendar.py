@@ -0,0 +1,160 @@
+from __future__ import annotations
+import datetime as dt
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from src.infra.config import get_settings
+
+def _easter(year: int) -> dt.date:
+    """Domingo de Páscoa (algoritmo de Meeus/Jones/Butcher, calendário gregoriano)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return dt.date(year, month, day)
+
+@lru_cache(maxsize=None)
+def b3_holidays(year: int) -> FrozenSet[dt.date]:
+    """
+    Dias sem pregão na B3 (renda variável). Inclui feriados nacionais, móveis (Carnaval,
+    Sexta-feira Santa, Corpus Christi), os municipais de São Paulo que fechavam a bolsa
+    até 2021 e os dias sem pregão de fim de ano (24 e 31/12).
+    """
+    easter = _easter(year)
+    days = {
+        dt.date(year, 1, 1),    # Confraternização Universal
+        easter - dt.timedelta(days=48),  # Carnaval (segunda)
+        easter - dt.timedelta(days=47),  # Carnaval (terça)
+        easter - dt.timedelta(days=2),   # Sexta-feira Santa
+        dt.date(year, 4, 21),   # Tiradentes
+        dt.date(year, 5, 1),    # Dia do Trabalho
+        easter + dt.timedelta(days=60),  # Corpus Christi
+        dt.date(year, 9, 7),    # Independência
+        dt.date(year, 10, 12),  # Nossa Senhora Aparecida
+        dt.date(year, 11, 2),   # Finados
+        dt.date(year, 11, 15),  # Proclamação da República
+        dt.date(year, 12, 24),  # sem pregão
+        dt.date(year, 12, 25),  # Natal
+        dt.date(year, 12, 31),  # sem pregão
+    }
+    if year <= 2021:
+        days.add(dt.date(year, 1, 25))  # aniversário de São Paulo
+        days.add(dt.date(year, 7, 9))   # Revolução Constitucionalista
+    if 2007 <= year <= 2021 or year >= 2024:
+        days.add(dt.date(year, 11, 20))  # Consciência Negra (municipal até 2021, nacional desde 2024)
+    return frozenset(days)
+
+HOLIDAY_TABLES: Dict[str, Callable[[int], FrozenSet[dt.date]]] = {
+    "B3": b3_holidays,
+}
+
+def _parse_time(value: str) -> dt.time:
+    h, m = str(value).split(":")[:2]
+    return dt.time(int(h), int(m))
+
+class ExchangeCalendar:
+    """
+    Calendário de pregões de uma bolsa: dias úteis menos a tabela de feriados, com ajustes
+    (feriados extras / pregões extraordinários) vindos da configuração. Horários são locais
+    no fuso `timezone`.
+    """
+
+    def __init__(
+        self,
+        exchange: str = "B3",
+        session_open: str = "10:00",
+        session_close: str = "18:00",
+        timezone: str = "America/Sao_Paulo",
+        extra_holidays: Iterable[str] = (),
+        extra_sessions: Iterable[str] = (),
+    ):
+        if exchange not in HOLIDAY_TABLES:
+            raise ValueError(f"Bolsa sem calendário embutido: {exchange!r} (conhecidas: {sorted(HOLIDAY_TABLES)})")
+        self.exchange = exchange
+        self._holidays = HOLIDAY_TABLES[exchange]
+        self.open_time = _parse_time(session_open)
+        self.close_time = _parse_time(session_close)
+        self.tz = ZoneInfo(timezone)
+        self.extra_holidays = frozenset(dt.date.fromisoformat(d) for d in extra_holidays)
+        self.extra_sessions = frozenset(dt.date.fromisoformat(d) for d in extra_sessions)
+
+    def now(self) -> dt.datetime:
+        return dt.datetime.now(self.tz)
+
+    def today(self) -> dt.date:
+        return self.now().date()
+
+    def is_session(self, d: dt.date) -> bool:
+        if d in self.extra_sessions:
+            return True
+        if d.weekday() >= 5 or d in self.extra_holidays:
+            return False
+        return d not in self._holidays(d.year)
+
+    def next_session(self, d: dt.date) -> dt.date:
+        """Primeiro pregão estritamente depois de `d`."""
+        d += dt.timedelta(days=1)
+        while not self.is_session(d):
+            d += dt.timedelta(days=1)
+        return d
+
+    def previous_session(self, d: dt.date) -> dt.date:
+        """Último pregão estritamente antes de `d`."""
+        d -= dt.timedelta(days=1)
+        while not self.is_session(d):
+            d -= dt.timedelta(days=1)
+        return d
+
+    def sessions_between(self, start: dt.date, end: dt.date) -> List[dt.date]:
+        """Pregões em [start, end]."""
+        out, d = [], start
+        while d <= end:
+            if self.is_session(d):
+                out.append(d)
+            d += dt.timedelta(days=1)
+        return out
+
+    def session_bounds(self, d: dt.date) -> Tuple[dt.datetime, dt.datetime]:
+        return (
+            dt.datetime.combine(d, self.open_time, tzinfo=self.tz),
+            dt.datetime.combine(d, self.close_time, tzinfo=self.tz),
+        )
+
+    def is_open(self, now: Optional[dt.datetime] = None) -> bool:
+        now = (now or self.now()).astimezone(self.tz)
+        if not self.is_session(now.date()):
+            return False
+        open_dt, close_dt = self.session_bounds(now.date())
+        return open_dt <= now <= close_dt
+
+    def last_available_session(self, now: Optional[dt.datetime] = None) -> dt.date:
+        """Pregão mais recente que já pode ter barra: hoje após a abertura, senão o anterior."""
+        now = (now or self.now()).astimezone(self.tz)
+        today = now.date()
+        if self.is_session(today) and now >= self.session_bounds(today)[0]:
+            return today
+        return self.previous_session(today)
+
+_calendar: Optional[ExchangeCalendar] = None
+
+def get_calendar() -> ExchangeCalendar:
+    global _calendar
+    if _calendar is None:
+        s = get_settings()
+        cfg = s.calendar
+        _calendar = ExchangeCalendar(
+            exchange=cfg.exchange,
+            session_open=cfg.session_open,
+            session_close=cfg.session_close,
+            timezone=s.app.timezone,
+            extra_holidays=cfg.extra_holidays,
+            extra_sessions=cfg.extra_sessions,
+        )
+    return _calendar
@@ -4,23 +4,32 @@ import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
-from src.infra.config import load_settings
-from src.infra.db import init_engine
+from src.infra.config import get_settings
 from src.infra.logging import configure_logging
 from src.controllers.app_controller import router as app_router
 from src.controllers.scheduler_controller import router as scheduler_router
-from src.services.scheduler_service import start_scheduler, shutdown_scheduler
+from src.controllers.quote_controller import router as quote_router
+from src.controllers.history_controller import router as history_router
+from src.controllers.snapshot_controller import router as snapshot_router
+from src.controllers.metrics_controller import router as metrics_router
+from src.controllers.intraday_controller import router as intraday_router
+from src.services.scheduler_service import shutdown_scheduler
+from src.services import startup_service
 
-settings = load_settings()
+settings = get_settings()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     try:
         configure_logging(settings.log_level, service_name=settings.app.service_name, create_log_file=settings.create_log_file)
-        init_engine(settings.db_url, logging_sql=settings.logging_sql)
-        start_scheduler()
+        # /health responde assim que a aplicação sobe; /ready só depois da inicialização
+        if settings.startup.background_init:
+            startup_service.start_background()
+        else:
+            startup_service.initialize()
         yield
     finally:
+        startup_service.stop()
         try:
             shutdown_scheduler()
         except Exception as e:
@@ -29,6 +38,11 @@ async def lifespan(app: FastAPI):
 app = FastAPI(title="YF Price Fetcher API", version="1.0.0", lifespan=lifespan)
 app.include_router(app_router)
 app.include_router(scheduler_router)
+app.include_router(quote_router)
+app.include_router(history_router)
+app.include_router(snapshot_router)
+app.include_router(metrics_router)
+app.include_router(intraday_router)
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from sqlalchemy import Table, Column, MetaData, String, Date, BigInteger, Numeric, TIMESTAMP, text
+from sqlalchemy import Table, Column, Index, MetaData, String, Date, BigInteger, Integer, Numeric, Float, REAL, TIMESTAMP, ForeignKey, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 
@@ -48,3 +48,161 @@ asset_log = Table(
     Column("created_by", UUID(as_uuid=True)),
     Column("updated_by", UUID(as_uuid=True)),
 )
+
+# ----------------- Tabelas mantidas por este serviço -----------------
+
+# Deduplicação das linhas de asset_log gravadas por este serviço (asset_log pertence ao sistema
+# principal e não é alterada): ocorrências acumuladas e resolução, por linha de asset_log.
+# created_at/updated_at da própria asset_log guardam a primeira e a última ocorrência.
+asset_log_state = Table(
+    "asset_log_state",
+    metadata,
+    Column("asset_log", UUID(as_uuid=True), ForeignKey("asset_log.id", ondelete="CASCADE"), primary_key=True, nullable=False),
+    Column("service", String(255), nullable=False),
+    Column("ticker", String(255)),
+    Column("title", String(255), nullable=False),
+    Column("occurrences", Integer, nullable=False, server_default=text("1")),
+    Column("resolved_at", TIMESTAMP(timezone=False)),
+)
+
+# busca das ocorrências em aberto por (service, ticker, title)
+asset_log_state_open_idx = Index(
+    "ix_asset_log_state_open",
+    asset_log_state.c.service, asset_log_state.c.ticker, asset_log_state.c.title,
+    postgresql_where=asset_log_state.c.resolved_at.is_(None),
+)
+
+# Marca d'água por ativo: evita o GROUP BY MAX(price_date) sobre todo o histórico a cada execução.
+asset_fetch_state = Table(
+    "asset_fetch_state",
+    metadata,
+    Column("asset", UUID(as_uuid=True), ForeignKey("asset.id", ondelete="CASCADE"), primary_key=True, nullable=False),
+    Column("last_date", Date),
+    Column("last_success_at", TIMESTAMP(timezone=False)),
+    Column("last_error", String),
+    Column("last_error_at", TIMESTAMP(timezone=False)),
+    Column("updated_at", TIMESTAMP(timezone=False), nullable=False, server_default=func.now()),
+    # quarentena de tickers que falham repetidamente (re-teste com intervalo exponencial)
+    Column("consecutive_failures", Integer, nullable=False, server_default=text("0")),
+    Column("quarantined_until", TIMESTAMP(timezone=False)),
+    # última varredura de buracos no histórico (ver gap_service)
+    Column("gaps_scanned_at", TIMESTAMP(timezone=False)),
+    # incrementado a cada reescrita do histórico por evento corporativo (invalida caches de leitura)
+    Column("adjustment_version", Integer, nullable=False, server_default=text("0")),
+    Column("adjusted_at", TIMESTAMP(timezone=False)),
+    # incrementado, na mesma transação, sempre que barras do ativo são inseridas ou alteradas (ETag de leitura)
+    Column("data_version", BigInteger, nullable=False, server_default=text("0")),
+)
+
+# Eventos corporativos (dividendos/desdobramentos) vistos na ingestão. applied_at nulo = histórico
+# anterior ainda sem o ajuste retroativo do Yahoo (auto_adjust), a ser reescrito.
+asset_corporate_action = Table(
+    "asset_corporate_action",
+    metadata,
+    Column("asset", UUID(as_uuid=True), ForeignKey("asset.id", ondelete="CASCADE"), primary_key=True, nullable=False),
+    Column("action_date", Date, primary_key=True, nullable=False),
+    Column("dividends", Numeric(18, 6), nullable=False, server_default=text("0")),
+    Column("splits", Numeric(18, 6), nullable=False, server_default=text("0")),
+    Column("detected_at", TIMESTAMP(timezone=False), nullable=False, server_default=func.now()),
+    Column("applied_at", TIMESTAMP(timezone=False)),
+)
+
+asset_corporate_action_pending_idx = Index(
+    "ix_asset_corporate_action_pending",
+    asset_corporate_action.c.asset,
+    postgresql_where=asset_corporate_action.c.applied_at.is_(None),
+)
+
+# Pregões do calendário da bolsa com número sequencial: seq(d2) - seq(d1) - 1 = pregões faltando entre d1 e d2
+trading_session = Table(
+    "trading_session",
+    metadata,
+    Column("session_date", Date, primary_key=True, nullable=False),
+    Column("seq", Integer, nullable=False, unique=True),
+)
+
+# Índice de buracos (pregões sem barra) no meio do histórico de cada ativo
+asset_history_gap = Table(
+    "asset_history_gap",
+    metadata,
+    Column("asset", UUID(as_uuid=True), ForeignKey("asset.id", ondelete="CASCADE"), primary_key=True, nullable=False),
+    Column("gap_start", Date, primary_key=True, nullable=False),
+    Column("gap_end", Date, nullable=False),
+    Column("missing_sessions", Integer, nullable=False),
+    Column("detected_at", TIMESTAMP(timezone=False), nullable=False, server_default=func.now()),
+    Column("attempts", Integer, nullable=False, server_default=text("0")),
+    Column("last_attempt_at", TIMESTAMP(timezone=False)),
+    Column("last_error", String),
+)
+
+# fila de reparo: buracos em aberto, menos tentados primeiro
+asset_history_gap_queue_idx = Index(
+    "ix_asset_history_gap_queue",
+    asset_history_gap.c.attempts, asset_history_gap.c.gap_start, asset_history_gap.c.gap_end,
+)
+
+# Leases de shards do universo de tickers: cada réplica reivindica shards com prazo de expiração
+job_lease = Table(
+    "job_lease",
+    metadata,
+    Column("job", String(255), primary_key=True, nullable=False),
+    Column("shard", Integer, primary_key=True, nullable=False),
+    Column("owner", String(255)),
+    Column("cycle", String(64)),
+    Column("expires_at", TIMESTAMP(timezone=False)),
+    Column("completed_cycle", String(64)),
+    Column("completed_at", TIMESTAMP(timezone=False)),
+    Column("updated_at", TIMESTAMP(timezone=False), nullable=False, server_default=func.now()),
+)
+
+# Séries derivadas por (ativo, pregão), atualizadas incrementalmente na ingestão (ver metrics_service).
+# Retornos/volatilidade em REAL (4 bytes); médias e índice de retorno total em double.
+asset_metrics = Table(
+    "asset_metrics",
+    metadata,
+    Column("asset", UUID(as_uuid=True), ForeignKey("asset.id", ondelete="CASCADE"), primary_key=True, nullable=False),
+    Column("price_date", Date, primary_key=True, nullable=False),
+    Column("ret_1d", REAL),
+    Column("log_ret_1d", REAL),
+    Column("sma_20", Float(precision=53)),
+    Column("sma_50", Float(precision=53)),
+    Column("vol_20", REAL),  # desvio-padrão de 20 pregões dos log-retornos, anualizado (252)
+    Column("tr_index", Float(precision=53)),  # índice de retorno total, 1.0 no primeiro pregão
+)
+
+# Barras intradiárias (app.intraday), chaveadas por timestamp. Particionada por faixa de ts (uma
+# partição por dia, criadas/descartadas por intraday_service): a retenção vira DROP de partição.
+# Preços em REAL (4 bytes, sobra para 2 casas decimais da B3).
+asset_intraday = Table(
+    "asset_intraday",
+    metadata,
+    Column("asset", UUID(as_uuid=True), ForeignKey("asset.id", ondelete="CASCADE"), primary_key=True, nullable=False),
+    Column("ts", TIMESTAMP(timezone=True), primary_key=True, nullable=False),
+    Column("open_price", REAL),
+    Column("high_price", REAL),
+    Column("low_price", REAL),
+    Column("close_price", REAL, nullable=False),
+    Column("volume", BigInteger),
+    postgresql_partition_by="RANGE (ts)",
+)
+
+# Barras intradiárias antigas agregadas (intraday.downsample_interval), uma partição por mês
+asset_intraday_rollup = Table(
+    "asset_intraday_rollup",
+    metadata,
+    Column("asset", UUID(as_uuid=True), ForeignKey("asset.id", ondelete="CASCADE"), primary_key=True, nullable=False),
+    Column("ts", TIMESTAMP(timezone=True), primary_key=True, nullable=False),
+    Column("open_price", REAL),
+    Column("high_price", REAL),
+    Column("low_price", REAL),
+    Column("close_price", REAL, nullable=False),
+    Column("volume", BigInteger),
+    postgresql_partition_by="RANGE (ts)",
+)
+
+# Criadas pelo próprio serviço na inicialização (as demais pertencem ao schema do sistema principal)
+service_tables = [
+    asset_log_state, asset_fetch_state, job_lease, trading_session, asset_history_gap, asset_corporate_action, asset_metrics,
+    asset_intraday, asset_intraday_rollup,
+]
+service_indexes = [asset_log_state_open_idx, asset_history_gap_queue_idx, asset_corporate_action_pending_idx]
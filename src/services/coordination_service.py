@@ -0,0 +1,250 @@
+from __future__ import annotations
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from sqlalchemy import select, update, func, or_, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from src.infra.config import get_settings
+from src.infra.db import get_engine, get_session
+from src.models.tables import job_lease
+from src.services.run_state import RunProgress, RunStats
+
+log = logging.getLogger(__name__)
+settings = get_settings()
+
+MODE_NONE = "none"
+MODE_LEADER = "leader"
+MODE_SHARDED = "sharded"
+
+JOB_NAME = "yf_fetch_job"
+BACKFILL_JOB_NAME = "gap_backfill_job"
+
+# Identidade desta réplica/processo nos leases
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class LeaseLostError(RuntimeError):
+    """O lease do shard expirou e foi assumido por outra réplica."""
+
+def scheduled_cycle_key(now: Optional[float] = None) -> str:
+    """Chave do ciclo agendado: todas as réplicas calculam a mesma para a mesma janela."""
+    period = max(1, settings.app.schedule_minutes) * 60
+    return f"tick-{int((now or time.time()) // period)}"
+
+def manual_cycle_key() -> str:
+    return f"manual-{uuid.uuid4().hex[:12]}"
+
+def shard_of(asset_id: uuid.UUID, shards: int) -> int:
+    return asset_id.int % shards
+
+# ----------------- Leases -----------------
+
+class LeaseCoordinator:
+    """
+    Divide o universo de tickers em `shards` fixos. Cada réplica reivindica um shard por
+    vez (SELECT ... FOR UPDATE SKIP LOCKED), processa, renova o lease durante o trabalho
+    e marca o shard como concluído no ciclo. Leases expirados (réplica morta) são
+    reivindicados por qualquer outra réplica no mesmo ciclo.
+    """
+
+    def __init__(self, job: str, shards: int, lease_seconds: int, owner: str = OWNER_ID):
+        self.job = job
+        self.shards = max(1, int(shards))
+        self.lease_seconds = max(10, int(lease_seconds))
+        self.owner = owner
+        self._last_renew = 0.0
+
+    def _expiry(self):
+        return func.now() + func.make_interval(0, 0, 0, 0, 0, 0, self.lease_seconds)
+
+    def ensure_shards(self, session: Session) -> None:
+        rows = [{"job": self.job, "shard": i} for i in range(self.shards)]
+        session.execute(pg_insert(job_lease).values(rows).on_conflict_do_nothing(index_elements=["job", "shard"]))
+        session.commit()
+
+    def claim_next(self, session: Session, cycle: str) -> Optional[int]:
+        """Reivindica o próximo shard livre e ainda não concluído neste ciclo (ou None)."""
+        shard = session.execute(
+            select(job_lease.c.shard)
+            .where(
+                job_lease.c.job == self.job,
+                job_lease.c.shard < self.shards,
+                job_lease.c.completed_cycle.is_distinct_from(cycle),
+                or_(job_lease.c.owner.is_(None), job_lease.c.expires_at < func.now()),
+            )
+            .order_by(job_lease.c.shard)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).scalar()
+        if shard is None:
+            session.commit()
+            return None
+        session.execute(
+            update(job_lease)
+            .where(job_lease.c.job == self.job, job_lease.c.shard == shard)
+            .values(owner=self.owner, cycle=cycle, expires_at=self._expiry(), updated_at=func.now())
+        )
+        session.commit()
+        self._last_renew = time.monotonic()
+        log.info(f"Shard {shard}/{self.shards} reivindicado por {self.owner} (ciclo {cycle}).")
+        return shard
+
+    def renew(self, session: Session, shard: int, force: bool = False) -> None:
+        """Estende o lease (no máximo a cada 1/3 do prazo). Lança LeaseLostError se outro dono assumiu."""
+        if not force and time.monotonic() - self._last_renew < self.lease_seconds / 3:
+            return
+        res = session.execute(
+            update(job_lease)
+            .where(job_lease.c.job == self.job, job_lease.c.shard == shard, job_lease.c.owner == self.owner)
+            .values(expires_at=self._expiry(), updated_at=func.now())
+        )
+        session.commit()
+        if not res.rowcount:
+            raise LeaseLostError(f"Lease do shard {shard} perdido por {self.owner}.")
+        self._last_renew = time.monotonic()
+
+    def complete(self, session: Session, shard: int, cycle: str) -> None:
+        session.execute(
+            update(job_lease)
+            .where(job_lease.c.job == self.job, job_lease.c.shard == shard, job_lease.c.owner == self.owner)
+            .values(owner=None, expires_at=None, completed_cycle=cycle, completed_at=func.now(), updated_at=func.now())
+        )
+        session.commit()
+
+    def release(self, session: Session, shard: int) -> None:
+        """Devolve o shard sem concluí-lo (outra réplica pode assumi-lo no mesmo ciclo)."""
+        session.execute(
+            update(job_lease)
+            .where(job_lease.c.job == self.job, job_lease.c.shard == shard, job_lease.c.owner == self.owner)
+            .values(owner=None, expires_at=None, updated_at=func.now())
+        )
+        session.commit()
+
+class LeaseKeeper:
+    """
+    Renova o lease de um shard em thread própria (com sessão própria), a cada 1/3 do prazo,
+    independente do andamento do trabalho: um download parado no circuit breaker ou em
+    backoff não deixa o lease expirar. `check()` é o heartbeat do trabalho: lança
+    LeaseLostError se outra réplica assumiu o shard.
+    """
+
+    def __init__(self, coord: LeaseCoordinator, shard: int):
+        self.coord = coord
+        self.shard = shard
+        self.interval = coord.lease_seconds / 3
+        self._lost: Optional[LeaseLostError] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name=f"lease-{coord.job}-{shard}", daemon=True)
+
+    def __enter__(self) -> "LeaseKeeper":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _loop(self) -> None:
+        with get_session() as s:
+            while not self._stop.wait(self.interval):
+                try:
+                    self.coord.renew(s, self.shard, force=True)
+                except LeaseLostError as e:
+                    self._lost = e
+                    return
+                except Exception as e:
+                    # falha pontual do banco: tenta de novo no próximo intervalo, ainda dentro do prazo
+                    s.rollback()
+                    log.warning(f"Falha ao renovar o lease do shard {self.shard} ({type(e).__name__}: {e}).")
+
+    def check(self) -> None:
+        if self._lost is not None:
+            raise self._lost
+
+# ----------------- Líder único -----------------
+
+@contextmanager
+def leader_lock(job: str = JOB_NAME) -> Iterator[bool]:
+    """
+    Advisory lock de sessão em conexão dedicada (fora do pool da Session, que devolveria
+    a conexão a cada commit). Produz True se esta réplica é a líder do ciclo.
+    """
+    with get_engine().connect() as conn:
+        acquired = bool(conn.execute(text("SELECT pg_try_advisory_lock(hashtext(:k))"), {"k": job}).scalar())
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(hashtext(:k))"), {"k": job})
+            conn.rollback()
+
+# ----------------- Execução coordenada -----------------
+
+def run_coordinated(cycle: str, progress: Optional[RunProgress] = None) -> RunStats:
+    """Executa um ciclo de fetch conforme `coordination.mode`. Lança RunCancelled se `progress` for cancelado."""
+    # importado no primeiro job: o caminho de fetch carrega pandas/NumPy/yfinance
+    from src.services.fetcher_service import fetch_and_persist
+
+    cfg = settings.coordination
+
+    if cfg.mode == MODE_LEADER:
+        with leader_lock() as leader:
+            if not leader:
+                log.info("Outra réplica detém o lock do ciclo; execução ignorada.")
+                return RunStats()
+            with get_session() as s:
+                return fetch_and_persist(s, progress=progress)
+
+    if cfg.mode != MODE_SHARDED:
+        with get_session() as s:
+            return fetch_and_persist(s, progress=progress)
+
+    coord = LeaseCoordinator(JOB_NAME, cfg.shards, cfg.lease_seconds)
+    total = RunStats()
+    t0 = time.perf_counter()
+    with get_session() as s:
+        coord.ensure_shards(s)
+        while (shard := coord.claim_next(s, cycle)) is not None:
+            if progress is not None:
+                progress.set(shard=f"{shard}/{coord.shards}")
+            try:
+                with LeaseKeeper(coord, shard) as keeper:
+                    stats = fetch_and_persist(
+                        s,
+                        shard=(shard, coord.shards),
+                        heartbeat=keeper.check,
+                        progress=progress,
+                    )
+            except LeaseLostError as e:
+                log.warning(str(e))
+                s.rollback()
+                continue
+            except Exception:
+                s.rollback()
+                coord.release(s, shard)
+                raise
+            coord.complete(s, shard, cycle)
+            total.merge(stats)
+    total.elapsed_seconds = time.perf_counter() - t0
+    return total
+
+def run_backfill(cycle: str, progress: Optional[RunProgress] = None) -> RunStats:
+    """Reparo de buracos: com coordenação, só a réplica que obtém o lock do job executa."""
+    from src.services.fetcher_service import backfill_gaps
+
+    if settings.coordination.mode == MODE_NONE:
+        with get_session() as s:
+            return backfill_gaps(s, progress=progress)
+    with leader_lock(BACKFILL_JOB_NAME) as leader:
+        if not leader:
+            log.info(f"Outra réplica está reparando buracos; ciclo {cycle} ignorado.")
+            return RunStats()
+        with get_session() as s:
+            return backfill_gaps(s, progress=progress)
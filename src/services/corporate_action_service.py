@@ -0,0 +1,88 @@
+from __future__ import annotations
+import logging
+import uuid
+from typing import Iterable, List, Set
+
+import pandas as pd
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from src.models.tables import asset_corporate_action, asset_fetch_state
+
+log = logging.getLogger(__name__)
+
+def extract_actions(df: pd.DataFrame) -> pd.DataFrame:
+    """Linhas do frame longo com dividendo ou desdobramento não nulos: (asset, price_date, dividends, splits)."""
+    if not {"dividends", "splits"}.issubset(df.columns):
+        return df.iloc[0:0]
+    mask = (df["dividends"].fillna(0) != 0) | (df["splits"].fillna(0) != 0)
+    return df.loc[mask, ["asset", "price_date", "dividends", "splits"]]
+
+def record_actions(session: Session, df: pd.DataFrame, applied: bool) -> Set[uuid.UUID]:
+    """
+    Registra os eventos corporativos do lote (ON CONFLICT DO NOTHING: cada evento conta uma vez).
+    `applied=True` quando o histórico gravado já reflete o ajuste (download completo ou sem
+    auto_adjust). Retorna os ativos com evento novo ainda não aplicado. Não faz commit.
+    """
+    if df is None or not len(df):
+        return set()
+    actions = extract_actions(df)
+    if not len(actions):
+        return set()
+    rows = [
+        {
+            "asset": a_id,
+            "action_date": d,
+            "dividends": 0.0 if pd.isna(div) else float(div),
+            "splits": 0.0 if pd.isna(spl) else float(spl),
+            "applied_at": func.now() if applied else None,
+        }
+        for a_id, d, div, spl in actions.itertuples(index=False, name=None)
+    ]
+    stmt = (
+        pg_insert(asset_corporate_action)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["asset", "action_date"])
+        .returning(asset_corporate_action.c.asset)
+    )
+    new = set(session.execute(stmt).scalars().all())
+    if new and not applied:
+        log.info(f"{len(new)} ativo(s) com evento corporativo novo; histórico será reajustado.")
+    return new if not applied else set()
+
+def pending_adjustments(session: Session, asset_ids: Iterable[uuid.UUID], limit: int) -> List[uuid.UUID]:
+    """Ativos (dentre `asset_ids`) com evento corporativo ainda não aplicado ao histórico."""
+    ids = list(asset_ids)
+    if not ids:
+        return []
+    return session.execute(
+        select(asset_corporate_action.c.asset)
+        .where(asset_corporate_action.c.applied_at.is_(None), asset_corporate_action.c.asset.in_(ids))
+        .group_by(asset_corporate_action.c.asset)
+        .order_by(func.min(asset_corporate_action.c.detected_at))
+        .limit(limit)
+    ).scalars().all()
+
+def mark_adjusted(session: Session, asset_ids: Iterable[uuid.UUID]) -> None:
+    """
+    Fecha os eventos pendentes dos ativos reescritos e incrementa adjustment_version
+    (usado nos ETags de leitura). Deve rodar na transação da reescrita. Não faz commit.
+    """
+    ids = list(asset_ids)
+    if not ids:
+        return
+    session.execute(
+        update(asset_corporate_action)
+        .where(asset_corporate_action.c.asset.in_(ids), asset_corporate_action.c.applied_at.is_(None))
+        .values(applied_at=func.now())
+    )
+    session.execute(
+        update(asset_fetch_state)
+        .where(asset_fetch_state.c.asset.in_(ids))
+        .values(
+            adjustment_version=asset_fetch_state.c.adjustment_version + 1,
+            adjusted_at=func.now(),
+            updated_at=func.now(),
+        )
+    )
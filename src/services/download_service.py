@@ -0,0 +1,116 @@
+from __future__ import annotations
+import logging
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from src.infra.config import get_settings
+from src.infra.resilience import CircuitOpenError
+from src.services.fetch_engine import get_fetch_engine
+from src.services.price_providers import is_transient_error
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+log = logging.getLogger(__name__)
+settings = get_settings()
+
+# ----------------- Helpers -----------------
+
+def chunked(it: Iterable, size: int):
+    it = list(it)
+    for i in range(0, len(it), size):
+        yield it[i:i + size]
+
+def yahoo_symbol(ticker: str) -> str:
+    """Adiciona .SA ao ticker caso ainda não tenha."""
+    t = (ticker or "").strip().upper()
+    return t if t.endswith(".SA") else f"{t}.SA"
+
+def base_ticker(symbol: str) -> str:
+    """Remove o sufixo .SA, mantendo o ticker base (como salvo no banco)."""
+    s = (symbol or "").strip().upper()
+    return s[:-3] if s.endswith(".SA") else s
+
+# ----------------- Download em chunks -----------------
+
+@dataclass
+class ChunkJob:
+    """Unidade de trabalho que atravessa os estágios download -> normalize -> persist (diário ou intradiário)."""
+    tickers: List[str]
+    start: Optional[object]
+    end: Optional[object]
+    period: Optional[str]
+    probe: bool = False  # re-teste isolado de ticker em quarentena
+    full: bool = False  # janela completa (ativo sem histórico): dados já vêm ajustados
+    readjust: bool = False  # reescrita do histórico após evento corporativo
+    interval: Optional[str] = None  # intervalo das barras (None = app.interval)
+    frames: List[Tuple[List[str], "pd.DataFrame"]] = field(default_factory=list)
+    df_long: Optional["pd.DataFrame"] = None
+    failed: Dict[str, str] = field(default_factory=dict)  # ticker -> erro
+
+def _is_bisectable(e: BaseException) -> bool:
+    """Falhas do provedor (rede, 5xx, throttling) e circuito aberto não são culpa de um ticker: dividir só pioraria."""
+    return not (is_transient_error(e) or isinstance(e, CircuitOpenError))
+
+def _download_bisect(symbols: List[str], kwargs: dict, job: ChunkJob, first: bool = True) -> None:
+    """
+    Baixa `symbols`; em caso de falha divide ao meio e tenta cada metade, até isolar
+    o(s) ticker(s) problemático(s). As partes saudáveis vão para `job.frames`.
+    """
+    engine = get_fetch_engine()
+    try:
+        # sub-chunks da bisseção usam no máximo 1 retry (o chunk original já esgotou as tentativas)
+        # e não contam no circuit breaker: a falha que isolam é de um símbolo, não do provedor
+        df = engine.download(
+            symbols,
+            max_retries=None if first else min(1, engine.retry.max_retries),
+            record_failures=first,
+            **kwargs,
+        )
+    except Exception as e:
+        if len(symbols) == 1 or not _is_bisectable(e):
+            for sym in symbols:
+                job.failed[base_ticker(sym)] = str(e)
+            return
+        mid = len(symbols) // 2
+        log.warning(f"Falha em chunk de {len(symbols)} símbolos ({e}); dividindo em {mid} + {len(symbols) - mid}.")
+        _download_bisect(symbols[:mid], kwargs, job, first=False)
+        _download_bisect(symbols[mid:], kwargs, job, first=False)
+        return
+
+    if df is None:
+        return
+    # erros por símbolo reportados pelo provedor (ex.: ticker deslistado) sem falhar o chunk
+    for sym, msg in (df.attrs.get("errors") or {}).items():
+        job.failed[base_ticker(sym)] = str(msg)
+    if len(df):
+        job.frames.append(([base_ticker(sym) for sym in symbols], df))
+
+def download_stage(job: ChunkJob) -> ChunkJob:
+    """
+    Estágio 1: baixa o chunk via FetchEngine (rate limit, retry, circuit breaker),
+    bisectando-o em caso de falha. Não toca no banco; falhas seguem no job até o persist.
+    """
+    cfg = settings.app
+    yahoo_tickers = [yahoo_symbol(tk) for tk in job.tickers]
+    log.info(f"Baixando chunk com {len(job.tickers)} tickers: {job.tickers}")
+    kwargs = dict(
+        period=job.period,
+        interval=job.interval or cfg.interval,
+        start=job.start,
+        end=job.end,
+        auto_adjust=cfg.auto_adjust,
+        actions=cfg.actions,
+    )
+    try:
+        _download_bisect(yahoo_tickers, kwargs, job)
+    except Exception as e:
+        log.exception(f"Falha ao baixar chunk {job.tickers}: {e}")
+        for tk in job.tickers:
+            job.failed.setdefault(tk, str(e))
+    if job.probe and not job.frames and not job.failed:
+        # re-teste sem dados conta como nova falha (mantém o ticker em quarentena)
+        job.failed[job.tickers[0]] = "Nenhum dado retornado no re-teste de quarentena."
+    if job.failed:
+        log.warning(f"{len(job.failed)} ticker(s) com falha no chunk: {sorted(job.failed)}")
+    return job
@@ -0,0 +1,168 @@
+from __future__ import annotations
+import logging
+import threading
+import time
+from typing import List, Optional
+
+import pandas as pd
+
+from src.infra.config import get_settings
+from src.infra.instrumentation import counter, histogram
+from src.infra.resilience import CircuitBreaker, RetryPolicy, TokenBucket
+from src.services.run_state import EngineStats
+from src.services.price_providers import FakeProvider, PriceProvider, SyntheticProvider, YahooProvider, is_throttle_error, is_transient_error
+
+log = logging.getLogger(__name__)
+settings = get_settings()
+
+# contadores do processo espelhando EngineStats (que mede por execução)
+_ENGINE_COUNTERS = {
+    "requests": counter("yf_fetch_requests_total", "Chamadas ao provedor de preços (inclui novas tentativas)."),
+    "retries": counter("yf_fetch_retries_total", "Novas tentativas após falha no provedor."),
+    "throttled": counter("yf_fetch_throttled_total", "Falhas por limitação de requisições (429/rate limit)."),
+    "failures": counter("yf_fetch_failures_total", "Downloads que falharam após esgotar as tentativas."),
+    "rate_wait_seconds": counter("yf_fetch_rate_wait_seconds_total", "Tempo de espera no token bucket."),
+}
+_REQUEST_SECONDS = histogram("yf_fetch_request_seconds", "Duração de uma chamada ao provedor.", ("outcome",))
+# o yfinance não expõe os bytes trafegados: mede o tamanho do frame decodificado
+_FRAME_BYTES = counter("yf_fetch_frame_bytes_total", "Bytes dos DataFrames baixados (decodificados, sem índice).")
+_SYMBOLS = counter("yf_fetch_symbols_total", "Símbolos pedidos ao provedor.")
+
+class FetchEngine:
+    """
+    Intermedia as chamadas ao provedor de preços:
+      - limite de concorrência (semáforo com `max_concurrency` vagas);
+      - token bucket (1 token por símbolo pedido, pois o yfinance faz uma requisição por ticker);
+      - retry com backoff exponencial + jitter;
+      - circuit breaker que suspende as chamadas enquanto o provedor estiver limitando.
+    """
+
+    def __init__(
+        self,
+        provider: PriceProvider,
+        max_concurrency: int = 2,
+        bucket: Optional[TokenBucket] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        retry: Optional[RetryPolicy] = None,
+        breaker_wait_seconds: Optional[float] = None,
+    ):
+        self.provider = provider
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.bucket = bucket or TokenBucket(rate=0, capacity=1)
+        self.breaker = breaker or CircuitBreaker()
+        self.retry = retry or RetryPolicy()
+        self.breaker_wait_seconds = breaker_wait_seconds
+        self.stats = EngineStats()
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._stats_lock = threading.Lock()
+
+    def snapshot(self) -> EngineStats:
+        with self._stats_lock:
+            return EngineStats(**vars(self.stats))
+
+    def _count(self, **deltas) -> None:
+        with self._stats_lock:
+            for k, v in deltas.items():
+                setattr(self.stats, k, getattr(self.stats, k) + v)
+        for k, v in deltas.items():
+            if v:
+                _ENGINE_COUNTERS[k].inc(v)
+
+    def download(
+        self, symbols: List[str], max_retries: Optional[int] = None, record_failures: bool = True, **kwargs,
+    ) -> pd.DataFrame:
+        """
+        Baixa `symbols` com as proteções do engine. Só erros transitórios (is_transient_error)
+        são repetidos e contam para o circuit breaker; os demais são do pedido e sobem na hora.
+        Relança o último erro após esgotar as tentativas (`max_retries` sobrescreve a política padrão).
+        `record_failures=False` (sub-chunks da bisseção) não registra falhas no circuit breaker:
+        o chunk original já contou a sua, e isolar um ticker ruim não pode derrubar o processo.
+        """
+        retries = self.retry.max_retries if max_retries is None else max_retries
+        attempt = 0
+        with self._slots:
+            while True:
+                self.breaker.wait_until_allowed(self.breaker_wait_seconds)
+                waited = self.bucket.acquire(len(symbols))
+                self._count(requests=1, rate_wait_seconds=waited)
+                _SYMBOLS.inc(len(symbols))
+                t0 = time.perf_counter()
+                try:
+                    df = self.provider.download(symbols, **kwargs)
+                except Exception as e:
+                    if not is_transient_error(e):
+                        # erro determinístico do pedido: repetir daria o mesmo resultado e o provedor respondeu
+                        _REQUEST_SECONDS.observe(time.perf_counter() - t0, outcome="rejected")
+                        self.breaker.release()
+                        self._count(failures=1)
+                        raise
+                    _REQUEST_SECONDS.observe(time.perf_counter() - t0, outcome="error")
+                    throttled = is_throttle_error(e)
+                    if record_failures:
+                        self.breaker.record_failure(throttled=throttled)
+                    else:
+                        self.breaker.release()
+                    self._count(throttled=int(throttled))
+                    if attempt >= retries:
+                        self._count(failures=1)
+                        raise
+                    delay = self.retry.backoff(attempt)
+                    attempt += 1
+                    self._count(retries=1)
+                    log.warning(
+                        f"Falha ao baixar {len(symbols)} símbolos ({type(e).__name__}: {e}); "
+                        f"tentativa {attempt}/{retries} em {delay:.1f}s."
+                    )
+                    time.sleep(delay)
+                    continue
+                _REQUEST_SECONDS.observe(time.perf_counter() - t0, outcome="ok")
+                if df is not None:
+                    _FRAME_BYTES.inc(int(df.memory_usage(index=False).sum()))
+                self.breaker.record_success()
+                return df
+
+def build_provider() -> PriceProvider:
+    cfg = settings.fetch
+    fake = {"fake": FakeProvider, "synthetic": SyntheticProvider}.get(cfg.provider)
+    if fake is not None:
+        return fake(
+            latency_ms=cfg.fake_latency_ms,
+            error_rate=cfg.fake_error_rate,
+            throttle_rate=cfg.fake_throttle_rate,
+            seed=cfg.fake_seed,
+            latency_per_symbol_ms=cfg.fake_latency_per_symbol_ms,
+        )
+    return YahooProvider()
+
+_engine: Optional[FetchEngine] = None
+
+def set_fetch_engine(engine: Optional[FetchEngine]) -> None:
+    """
+    Substitui o engine do processo (ex.: benchmarks com um provedor próprio e sem rate limit);
+    None volta ao engine montado a partir de `fetch` no próximo get_fetch_engine().
+    """
+    global _engine
+    _engine = engine
+
+def get_fetch_engine() -> FetchEngine:
+    """Engine compartilhado pelo processo: rate limit e circuito valem para todos os jobs."""
+    global _engine
+    if _engine is None:
+        cfg = settings.fetch
+        _engine = FetchEngine(
+            provider=build_provider(),
+            max_concurrency=cfg.max_concurrency,
+            bucket=TokenBucket(rate=cfg.rate_per_second, capacity=cfg.burst),
+            breaker=CircuitBreaker(
+                failure_threshold=cfg.breaker_failure_threshold,
+                cooldown_seconds=cfg.breaker_cooldown_seconds,
+                max_cooldown_seconds=cfg.breaker_max_cooldown_seconds,
+            ),
+            retry=RetryPolicy(
+                max_retries=cfg.max_retries,
+                base_seconds=cfg.backoff_base_seconds,
+                max_seconds=cfg.backoff_max_seconds,
+            ),
+            breaker_wait_seconds=cfg.breaker_max_cooldown_seconds,
+        )
+    return _engine
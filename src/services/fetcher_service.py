@@ -1,263 +1,695 @@
 from __future__ import annotations
 import logging
-from typing import Iterable, Dict, Tuple, List, DefaultDict, Optional
+from typing import Callable, Iterator, Dict, List, DefaultDict, Optional, Tuple
 from collections import defaultdict
+import time
 import uuid
 import datetime as dt
 
+import numpy as np
 import pandas as pd
-import yfinance as yf
-from sqlalchemy import select, func
-from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
-from src.infra.config import load_settings
-from src.models.tables import asset, asset_history, asset_log
-from src.constants.common import SERVICE_NAME_ASSET_FETCHER, LOG_LEVEL_ERROR, LOG_LEVEL_WARNING
+from src.infra.bulk_loader import CONFLICT_UPDATE_IF_CHANGED, bulk_load
+from src.infra.config import get_settings
+from src.infra.db import get_session
+from src.infra.instrumentation import counter, gauge, histogram
+from src.infra.pipeline import Pipeline, Stage, StageStats
+from src.infra.trading_calendar import get_calendar
+from src.models.tables import asset_history
+from src.services.issue_service import IssueBuffer
+from src.services.download_service import ChunkJob, base_ticker, chunked, download_stage
+from src.services.fetch_engine import get_fetch_engine
+from src.services.corporate_action_service import mark_adjusted, pending_adjustments, record_actions
+from src.services.snapshot_service import append_from_frame, invalidate_assets
+from src.services.gap_service import plan_backfill, record_attempt, refresh_gap_index, sync_sessions
+from src.services.metrics_service import MetricsWork, update_metrics
+from src.services.quote_service import publish_from_frame
+from src.services.run_state import RunProgress, RunStats
+from src.services.watermark_service import (
+    ensure_watermarks, load_watermarks, advance_watermarks, bump_data_version, record_fetch_errors,
+)
+from src.constants.common import LOG_LEVEL_WARNING
 
 log = logging.getLogger(__name__)
-settings = load_settings()
-
-# ----------------- Helpers -----------------
-
-def _chunk(it: Iterable, size: int):
-    it = list(it)
-    for i in range(0, len(it), size):
-        yield it[i:i + size]
-
-def _yahoo_symbol(ticker: str) -> str:
-    """Adiciona .SA ao ticker caso ainda não tenha."""
-    t = (ticker or "").strip().upper()
-    return t if t.endswith(".SA") else f"{t}.SA"
+settings = get_settings()
+
+_PHASE_SECONDS = histogram(
+    "yf_fetch_phase_seconds", "Duração das fases de uma execução de fetch_and_persist.", ("phase",),
+)
+_ROWS_PROCESSED = counter("yf_fetch_rows_processed_total", "Linhas normalizadas entregues ao persist.")
+_ROWS_PER_SECOND = gauge("yf_fetch_rows_per_second", "Linhas processadas por segundo na última execução (fetch).")
+
+# ----------------- Normalização -----------------
+
+_FIELD_COLUMNS = [
+    ("Open", "open_price"),
+    ("High", "high_price"),
+    ("Low", "low_price"),
+    ("Close", "close_price"),
+    ("Volume", "volume"),
+    ("Dividends", "dividends"),
+    ("Stock Splits", "splits"),
+]
+_LONG_COLUMNS = ["price_date", "ticker"] + [out for _, out in _FIELD_COLUMNS]
+
+def _iter_normalized(df: pd.DataFrame, tickers_base: List[str]) -> Iterator[pd.DataFrame]:
+    """
+    Converte o DataFrame largo do yfinance para formato longo, um lote por ticker.
 
-def _base_ticker(symbol: str) -> str:
-    """Remove o sufixo .SA, mantendo o ticker base (como salvo no banco)."""
-    s = (symbol or "").strip().upper()
-    return s[:-3] if s.endswith(".SA") else s
+    Lê cada coluna (campo, símbolo) como array NumPy sem copiar o frame largo e monta o
+    lote só com as datas que têm algum valor. Preços ficam em float64 (asset_history usa
+    Numeric(18,6), além da precisão do float32), volume em int64 (Int64 só se houver nulos)
+    e a coluna 'ticker' (sem .SA) referencia uma única string por lote.
+    """
+    if isinstance(df.columns, pd.MultiIndex):
+        symbols = list(dict.fromkeys(df.columns.get_level_values(1)))
+        key = lambda f, sym: (f, sym)
+    else:
+        # yfinance retornou colunas simples (caso de 1 ticker)
+        symbols = [tickers_base[0]]
+        key = lambda f, sym: f
+    present = set(df.columns)
+    n = len(df)
+    if not n:
+        return
+    # um objeto date por linha do índice, compartilhado por todos os lotes
+    dates = pd.to_datetime(df.index).date
+
+    for sym in symbols:
+        arrays: Dict[str, np.ndarray] = {}
+        has_value = np.zeros(n, dtype=bool)
+        for f, out_col in _FIELD_COLUMNS:
+            col = key(f, sym)
+            if col in present:
+                arr = df[col].to_numpy(dtype="float64", copy=False)
+                has_value |= ~np.isnan(arr)
+            else:
+                arr = None
+            arrays[out_col] = arr
+        rows = np.flatnonzero(has_value)
+        if not len(rows):
+            continue
+        m = len(rows)
+
+        def take(out_col: str) -> np.ndarray:
+            arr = arrays[out_col]
+            return np.full(m, np.nan) if arr is None else arr[rows]
+
+        volume = take("volume")
+        vol_nan = np.isnan(volume)
+        batch = {
+            "price_date": dates[rows],
+            "ticker": np.full(m, base_ticker(sym), dtype=object),  # <-- remove .SA aqui
+            "open_price": take("open_price"),
+            "high_price": take("high_price"),
+            "low_price": take("low_price"),
+            "close_price": take("close_price"),
+            # preserva inteiros nulos de forma segura
+            "volume": pd.arrays.IntegerArray(np.where(vol_nan, 0, volume).astype(np.int64), vol_nan)
+            if vol_nan.any() else volume.astype(np.int64),
+            "dividends": np.nan_to_num(take("dividends"), nan=0.0, copy=False),
+            "splits": np.nan_to_num(take("splits"), nan=0.0, copy=False),
+        }
+        yield pd.DataFrame(batch, columns=_LONG_COLUMNS, copy=False)
 
 def _normalize_prices(df: pd.DataFrame, tickers_base: List[str]) -> pd.DataFrame:
     """
     Converte o DataFrame do yfinance para formato longo.
     Garante que a coluna 'ticker' fique sem .SA para casar com o banco.
     """
-    if isinstance(df.columns, pd.MultiIndex):
-        wide = df.copy()
+    batches = list(_iter_normalized(df, tickers_base))
+    if not batches:
+        return pd.DataFrame(columns=_LONG_COLUMNS)
+    return batches[0] if len(batches) == 1 else pd.concat(batches, ignore_index=True)
+
+# ----------------- Núcleo -----------------
+
+def _group_window(last_date: Optional[dt.date], today: dt.date) -> Tuple[Optional[object], Optional[object], Optional[str]]:
+    """
+    Determina (start, end, period) de um grupo de tickers com a mesma 'last_date'.
+    Regra:
+      - None         -> baixar tudo conforme cfg (start_date/period)
+      - < hoje       -> start = próximo pregão após last_date (incremental; calendar.enabled)
+                        ou last_date + 1 dia (sem calendário)
+      - == hoje      -> start = hoje (força atualizar os de hoje)
+    """
+    cfg = settings.app
+    if last_date is None:
+        start_for_group = cfg.start_date if getattr(cfg, "use_start_end", False) else None
+        end_for_group = cfg.end_date if getattr(cfg, "use_start_end", False) else None
+        period_for_group = None if getattr(cfg, "use_start_end", False) else cfg.period
     else:
-        # yfinance retornou colunas simples (caso de 1 ticker)
-        fields = df.columns.tolist()
-        arrays = [[f for f in fields], [tickers_base[0] for _ in fields]]
-        wide = df.copy()
-        wide.columns = pd.MultiIndex.from_arrays(arrays)
-
-    parts = []
-    mapping = [
-        ("Open", "open_price"),
-        ("High", "high_price"),
-        ("Low", "low_price"),
-        ("Close", "close_price"),
-        ("Volume", "volume"),
-        ("Dividends", "dividends"),
-        ("Stock Splits", "splits"),
-    ]
-    for field, out_col in mapping:
-        cols = [c for c in wide.columns if c[0] == field]
-        if cols:
-            tmp = wide[cols].copy()
-            # colunas são o 2º nível do MultiIndex (tickers com sufixo do yahoo)
-            tmp.columns = [_base_ticker(c[1]) for c in cols]  # <-- remove .SA aqui
-            tmp = tmp.stack().rename(out_col)
-            parts.append(tmp)
+        if last_date >= today:
+            # já tem hoje -> força atualizar hoje
+            start_for_group = today
+        elif settings.calendar.enabled:
+            start_for_group = min(get_calendar().next_session(last_date), today)
         else:
-            idx = pd.MultiIndex.from_product([wide.index, tickers_base], names=[wide.index.name or "Date", "Ticker"])
-            parts.append(pd.Series(index=idx, name=out_col, dtype="float64"))
+            start_for_group = last_date + dt.timedelta(days=1)
+        end_for_group = None  # deixa em aberto para pegar até o último disponível
+        period_for_group = None  # quando usar start/end, não usar period
+    return start_for_group, end_for_group, period_for_group
 
-    df_long = pd.concat(parts, axis=1).reset_index()
-    df_long.rename(columns={df_long.columns[0]: "price_date", df_long.columns[1]: "ticker"}, inplace=True)
-    df_long["price_date"] = pd.to_datetime(df_long["price_date"]).dt.date
+def _is_up_to_date(last_date: Optional[dt.date], now: dt.datetime) -> bool:
+    """
+    Com calendário: o grupo já tem o último pregão disponível e não há barra em formação
+    (fora do pregão e da janela de fechamento), então não há nada novo para pedir ao provedor.
+    """
+    if last_date is None or not settings.calendar.enabled:
+        return False
+    cal = get_calendar()
+    if last_date < cal.last_available_session(now):
+        return False
+    today = now.date()
+    if not cal.is_session(today):
+        return True
+    open_dt, close_dt = cal.session_bounds(today)
+    settle = close_dt + dt.timedelta(minutes=settings.calendar.settle_delay_minutes)
+    return not (open_dt <= now <= settle)
+
+def _plan_chunks(
+    grouped: Dict[Optional[dt.date], List[str]],
+    today: dt.date,
+    probes: Optional[Dict[str, Optional[dt.date]]] = None,
+    progress: Optional[RunProgress] = None,
+) -> Iterator[ChunkJob]:
+    """
+    Gera os chunks a baixar, grupo a grupo (cada grupo compartilha a mesma 'last_date').
+    Tickers em quarentena cujo re-teste venceu (`probes`) vão sozinhos, um por chunk,
+    para não derrubar tickers saudáveis. Interrompe com RunCancelled se o job for cancelado.
+    """
+    cfg = settings.app
+    progress = progress or RunProgress()
+    progress.add(
+        groups_total=len(grouped),
+        chunks_total=sum(-(-len(g) // cfg.chunk_size) for g in grouped.values()) + len(probes or {}),
+    )
+    for last_date, tickers_in_group in grouped.items():
+        start_for_group, end_for_group, period_for_group = _group_window(last_date, today)
+        log.info(
+            f"Processando grupo com last_date={last_date} "
+            f"({len(tickers_in_group)} tickers) | start={start_for_group}, end={end_for_group}, period={period_for_group}"
+        )
 
-    if "volume" in df_long.columns:
-        # preserva inteiros nulos de forma segura
-        df_long["volume"] = df_long["volume"].astype("Int64").astype("float").astype("Int64")
-    for c in ["dividends", "splits"]:
-        if c in df_long.columns:
-            df_long[c] = df_long[c].fillna(0.0)
-    return df_long
+        for tick_chunk in chunked(tickers_in_group, cfg.chunk_size):
+            progress.check_cancelled()
+            yield ChunkJob(
+                tickers=tick_chunk, start=start_for_group, end=end_for_group, period=period_for_group,
+                full=last_date is None,
+            )
+        progress.add(groups_done=1)
+
+    for tk, last_date in (probes or {}).items():
+        progress.check_cancelled()
+        start, end, period = _group_window(last_date, today)
+        log.info(f"Re-testando ticker em quarentena: {tk}")
+        yield ChunkJob(tickers=[tk], start=start, end=end, period=period, probe=True, full=last_date is None)
+
+def _normalize_stage(job: ChunkJob) -> ChunkJob:
+    """
+    Estágio 2: converte os DataFrames largos do yfinance para formato longo, em lotes por
+    ticker; cada frame largo é liberado assim que consumido, e os lotes viram um único frame
+    longo por chunk (uma carga só no persist).
+    """
+    if not job.frames:
+        return job
+    try:
+        batches: List[pd.DataFrame] = []
+        while job.frames:
+            tickers, df = job.frames.pop(0)
+            # Normaliza SEM sufixo (.SA) para casar com o banco
+            batches.extend(_iter_normalized(df, tickers))
+            del df
+        if batches:
+            job.df_long = batches[0] if len(batches) == 1 else pd.concat(batches, ignore_index=True)
+    except Exception as e:
+        log.exception(f"Falha ao normalizar chunk {job.tickers}: {e}")
+        job.df_long = None
+        for tk in job.tickers:
+            job.failed.setdefault(tk, str(e))
+    finally:
+        job.frames = []  # libera os frames largos antes de seguir na fila
+    return job
+
+def _metrics_stage(work: MetricsWork) -> None:
+    """
+    Estágio 4 (com metrics.enabled): recalcula as séries derivadas (asset_metrics) dos ativos
+    gravados pelo persist, a partir da primeira barra nova. Usa sessão própria para não
+    disputar a do persist; uma falha aqui só é registrada (o ativo é recalculado por inteiro
+    na próxima vez que a métrica anterior estiver faltando).
+    """
+    with get_session() as s:
+        try:
+            rows = update_metrics(s, work)
+            s.commit()
+            log.info(f"Métricas derivadas: {rows} linha(s) de {len(work.since)} ativo(s).")
+        except Exception as e:
+            s.rollback()
+            log.exception(f"Falha ao calcular métricas de {len(work.since)} ativo(s): {e}")
+    return None
+
+def _with_metrics(stages: List[Stage]) -> List[Stage]:
+    if settings.metrics.enabled:
+        stages.append(Stage("metrics", _metrics_stage))
+    return stages
+
+def _make_persist_stage(
+    session: Session,
+    id_by_ticker: Dict[str, uuid.UUID],
+    stats: RunStats,
+    issues: IssueBuffer,
+    heartbeat: Optional[Callable[[], None]] = None,
+    progress: Optional[RunProgress] = None,
+    on_conflict: Optional[str] = None,
+):
+    """
+    Estágio 3: grava o chunk em asset_history (ou acumula a falha no buffer de asset_log).
+    Roda em um único worker: é o único ponto que usa a `session` durante o pipeline.
+    `heartbeat` (se houver) é chamado antes de cada chunk; uma exceção nele aborta a execução.
+    `on_conflict` sobrepõe persist.on_conflict (a reescrita por evento corporativo precisa atualizar).
+    """
+    q = settings.quarantine
+    progress = progress or RunProgress()
+
+    def record_failures(failed: Dict[str, str]) -> None:
+        by_message: DefaultDict[str, List[str]] = defaultdict(list)
+        for tk, msg in failed.items():
+            issues.add(tk, "Erro no Download", msg)
+            by_message[msg].append(tk)
+        for msg, tickers in by_message.items():
+            progress.add_error(f"{', '.join(tickers)}: {msg}")
+            record_fetch_errors(
+                session, (id_by_ticker.get(tk) for tk in tickers), msg,
+                quarantine_threshold=q.threshold,
+                quarantine_base_seconds=q.base_minutes * 60,
+                quarantine_max_seconds=q.max_hours * 3600,
+            )
+
+    def persist(job: ChunkJob) -> Optional[MetricsWork]:
+        progress.check_cancelled()
+        if heartbeat is not None:
+            heartbeat()
+        try:
+            return _persist_chunk(job)
+        finally:
+            progress.add(chunks_done=1)
+
+    def _persist_chunk(job: ChunkJob) -> Optional[MetricsWork]:
+        tick_chunk = job.tickers
+        work = None
+        try:
+            if job.failed:
+                record_failures(job.failed)
+                session.commit()
 
-# ----------------- Núcleo -----------------
+            if job.df_long is None:
+                no_data = [tk for tk in tick_chunk if tk not in job.failed]
+                if no_data:
+                    log.warning(f"Nenhum dado retornado para chunk: {no_data}")
+                    for tk in no_data:
+                        issues.add(
+                            tk, "Sem Dados",
+                            "Nenhum dado retornado pelo yfinance para o ticker.",
+                            level=LOG_LEVEL_WARNING
+                        )
+                return None
+
+            df_long = job.df_long
+            job.df_long = None
+
+            # Mapear para asset id
+            df_long["asset"] = df_long["ticker"].str.upper().map(id_by_ticker)
+            # Filtra linhas válidas
+            df_long = df_long.dropna(subset=["asset", "price_date", "close_price"])
+
+            stats.processed += len(df_long)
+            progress.add(rows_processed=len(df_long))
+
+            if len(df_long):
+                load = bulk_load(
+                    session, asset_history, df_long,
+                    key_columns=("asset", "price_date"),
+                    mode=settings.persist.mode,
+                    batch_size=settings.persist.insert_batch_size,
+                    on_conflict=on_conflict or settings.persist.on_conflict,
+                )
+                # marca d'água (e versão dos dados, se alguma barra mudou) avança na mesma transação do insert
+                advance_watermarks(session, df_long)
+                if load.inserted or load.updated:
+                    bump_data_version(session, df_long["asset"].unique().tolist())
+                if settings.corporate_actions.enabled:
+                    # download completo (ou sem auto_adjust) já traz o histórico ajustado
+                    already_adjusted = job.full or job.readjust or not settings.app.auto_adjust
+                    record_actions(session, df_long, applied=already_adjusted)
+                    if job.readjust:
+                        mark_adjusted(session, df_long["asset"].unique().tolist())
+                session.commit()
+                publish_from_frame(df_long)
+                if job.readjust:
+                    # histórico reescrito: o snapshot local é reconstruído do banco na manutenção
+                    invalidate_assets(df_long["asset"].unique().tolist())
+                else:
+                    append_from_frame(df_long)
+                # histórico reescrito invalida as séries derivadas inteiras; senão, só a partir da 1ª barra nova
+                work = MetricsWork.from_frame(df_long, full=job.readjust)
+                issues.mark_ok(tk for tk in tick_chunk if tk not in job.failed)
+                stats.inserted += load.inserted
+                stats.updated += load.updated
+                stats.unchanged += load.unchanged
+                progress.add(rows_inserted=load.inserted, rows_updated=load.updated)
+                log.info(
+                    f"Persistidos {load.staged} registros: {load.inserted} novos, "
+                    f"{load.updated} atualizados, {load.unchanged} inalterados."
+                )
+        except Exception as e:
+            msg = str(e)
+            log.exception(f"Falha ao processar chunk {tick_chunk}: {msg}")
+            session.rollback()
+            record_failures({tk: msg for tk in tick_chunk})
+            session.commit()
+        return work
+
+    return persist
+
+def _readjust_history(
+    session: Session,
+    id_by_ticker: Dict[str, uuid.UUID],
+    today: dt.date,
+    stats: RunStats,
+    issues: IssueBuffer,
+    heartbeat: Optional[Callable[[], None]],
+    progress: RunProgress,
+) -> List[StageStats]:
+    """
+    Rebaixa o histórico completo dos ativos com evento corporativo pendente (deste run ou
+    de execuções anteriores que falharam) e o reescreve com update_if_changed: só as linhas
+    cujo ajuste mudou são regravadas. Limitado a corporate_actions.max_assets_per_run.
+    """
+    pending = set(pending_adjustments(session, id_by_ticker.values(), settings.corporate_actions.max_assets_per_run))
+    session.commit()
+    tickers = [tk for tk, a_id in id_by_ticker.items() if a_id in pending]
+    if not tickers:
+        return []
+    log.info(f"Reajustando histórico de {len(tickers)} ativo(s) com evento corporativo: {tickers}")
+    start, end, period = _group_window(None, today)
+    chunk_size = settings.app.chunk_size
+
+    def jobs() -> Iterator[ChunkJob]:
+        progress.add(chunks_total=-(-len(tickers) // chunk_size))
+        for tick_chunk in chunked(tickers, chunk_size):
+            progress.check_cancelled()
+            yield ChunkJob(tickers=tick_chunk, start=start, end=end, period=period, full=True, readjust=True)
+
+    engine = get_fetch_engine()
+    pipeline = Pipeline(
+        _with_metrics([
+            Stage("download", download_stage, workers=engine.max_concurrency),
+            Stage("normalize", _normalize_stage),
+            Stage("persist", _make_persist_stage(
+                session, id_by_ticker, stats, issues, heartbeat, progress, on_conflict=CONFLICT_UPDATE_IF_CHANGED,
+            )),
+        ]),
+        depth=settings.pipeline.queue_depth,
+        name="readjust",
+    )
+    return pipeline.run(jobs())
 
-def fetch_and_persist(session: Session) -> Tuple[int, int]:
+def _flush_issues(session: Session, issues: IssueBuffer) -> None:
+    """
+    Grava o buffer de problemas em uma transação nova (descarta o que uma falha tenha
+    deixado pendente na sessão). Erro aqui é só logado: os chunks já foram commitados e
+    a exceção original, se houver, não pode ser mascarada.
+    """
+    session.rollback()
+    try:
+        with _PHASE_SECONDS.time(phase="logging"):
+            issues.flush(session)
+            session.commit()
+    except Exception as e:
+        session.rollback()
+        log.exception(f"Falha ao gravar problemas da execução em asset_log: {e}")
+
+def fetch_and_persist(
+    session: Session,
+    shard: Optional[Tuple[int, int]] = None,
+    heartbeat: Optional[Callable[[], None]] = None,
+    progress: Optional[RunProgress] = None,
+) -> RunStats:
     """
     Estratégia:
-      1) Carrega (asset.id, asset.ticker) e, via LEFT JOIN, o MAX(asset_history.price_date) por asset.
+      1) Carrega (asset.id, asset.ticker) e, via LEFT JOIN, a marca d'água last_date de asset_fetch_state
+         (O(#ativos), sem varrer asset_history).
       2) Monta um dict: last_date_by_ticker[ticker] = date (ou None).
-      3) Agrupa tickers por essa 'last_date'.
-      4) Para cada grupo:
-           - Determina start_date:
-               * se last_date is None -> usa cfg.start_date (ou None) / cfg.period.
-               * se last_date < hoje -> start = last_date + 1 dia (para pegar apenas o que falta).
-               * se last_date == hoje -> start = hoje (força atualização do dia).
-           - Faz download em chunks, normaliza, e insere ignorando duplicatas (asset, price_date).
+      3) Agrupa tickers por essa 'last_date' e divide cada grupo em chunks (ver _plan_chunks).
+         Tickers em quarentena ficam de fora até o prazo de re-teste, quando vão sozinhos.
+         Com calendar.enabled, grupos que já têm o último pregão ficam de fora fora do horário
+         de negociação, e o start incremental avança por pregões (não dias corridos).
+      4) Os chunks atravessam um pipeline com filas limitadas:
+           download -> normalize -> persist [-> metrics]
+         cada estágio com seu worker, de modo que o chunk N+1 é baixado enquanto o N é gravado.
+         Um chunk que falha é bisectado até isolar o(s) ticker(s) problemático(s).
+         Chaves (asset, price_date) já existentes seguem persist.on_conflict
+         (ignore / update / update_if_changed), o que mantém a barra do dia atualizada.
+      5) Dividendo/desdobramento novo (com auto_adjust) muda todo o histórico anterior no Yahoo:
+         o histórico dos ativos afetados é baixado de novo e reescrito (update_if_changed), e
+         asset_fetch_state.adjustment_version é incrementado para invalidar caches de leitura.
+         Linhas gravadas também são acrescentadas ao snapshot colunar local (snapshot_service).
+      6) Problemas da execução são acumulados e gravados de uma vez, deduplicados, em asset_log.
+
+    `shard=(i, n)` restringe a execução aos ativos com id.int % n == i (ver coordination_service).
+    `progress` recebe o andamento ao vivo e permite cancelar a execução (RunCancelled).
     """
-    cfg = settings.app
+    t0 = time.perf_counter()
+    progress = progress or RunProgress()
+    progress.set(stage="planning")
+    stats = RunStats()
+    issues = IssueBuffer()
 
-    # Hoje (timezone do projeto: America/Sao_Paulo). Se tiver tz no settings, ajuste aqui.
-    today = dt.date.today()
+    # Hoje no fuso do projeto (app.timezone), o mesmo do calendário de pregões
+    now_local = get_calendar().now()
+    today = now_local.date()
 
-    # 1) Buscar assets + max(price_date) (ou None)
-    subq_max = (
-        select(
-            asset_history.c.asset.label("asset_id"),
-            func.max(asset_history.c.price_date).label("last_date")
-        )
-        .group_by(asset_history.c.asset)
-        .subquery()
-    )
-
-    # LEFT JOIN com asset para pegar last_date (pode ser nulo se ainda sem histórico)
-    q = (
-        select(
-            asset.c.id,
-            asset.c.ticker,
-            subq_max.c.last_date
-        )
-        .select_from(
-            asset.outerjoin(subq_max, subq_max.c.asset_id == asset.c.id)
-        )
-        .where(asset.c.ticker.isnot(None))
-    )
-
-    rows = session.execute(q).fetchall()
+    # 1) Buscar assets + marca d'água (last_date, ou None) mantida em asset_fetch_state
+    ensure_watermarks(session)
+    rows = load_watermarks(session)
 
     id_by_ticker: Dict[str, uuid.UUID] = {}
     last_date_by_ticker: Dict[str, Optional[dt.date]] = {}
-    for a_id, t, last_dt in rows:
+    probes: Dict[str, Optional[dt.date]] = {}
+    quarantined = 0
+    now = dt.datetime.now()
+    for a_id, t, last_dt, failures, quarantined_until in rows:
         if not t:
             continue
+        if shard is not None and a_id.int % shard[1] != shard[0]:
+            continue
         tk = t.strip().upper()
         id_by_ticker[tk] = a_id
+        if quarantined_until is not None or (failures or 0) >= settings.quarantine.threshold:
+            # em quarentena: fora dos chunks normais; re-teste isolado quando o prazo vencer
+            if quarantined_until is None or quarantined_until <= now:
+                probes[tk] = last_dt
+            else:
+                quarantined += 1
+            continue
         # last_dt pode ser None
         last_date_by_ticker[tk] = last_dt
 
-    all_tickers = list(id_by_ticker.keys())
-    if not all_tickers:
+    if not id_by_ticker:
         log.warning("Nenhum ticker encontrado em asset.")
-        return (0, 0)
+        return stats
+    if quarantined or probes:
+        log.info(f"Quarentena: {quarantined} ticker(s) ignorados, {len(probes)} para re-teste.")
 
     # 2) Agrupar por última data
     grouped: DefaultDict[Optional[dt.date], List[str]] = defaultdict(list)
-    for tk in all_tickers:
-        grouped[last_date_by_ticker.get(tk)].append(tk)
-
-    total_processed = 0
-    total_inserted = 0
-
-    # 3) Processar grupo a grupo (cada grupo compartilha a mesma 'last_date')
-    for last_date, tickers_in_group in grouped.items():
-        # Determinar start_date/end_date ou period conforme sua config
-        # Regra:
-        #   - None         -> baixar tudo conforme cfg (start_date/period)
-        #   - < hoje       -> start = last_date + 1 dia (incremental)
-        #   - == hoje      -> start = hoje (força atualizar os de hoje)
-        if last_date is None:
-            start_for_group = cfg.start_date if getattr(cfg, "use_start_end", False) else None
-            end_for_group = cfg.end_date if getattr(cfg, "use_start_end", False) else None
-            period_for_group = None if getattr(cfg, "use_start_end", False) else cfg.period
-        else:
-            if last_date >= today:
-                # já tem hoje -> força atualizar hoje
-                start_for_group = today
-            else:
-                start_for_group = last_date + dt.timedelta(days=1)
-            end_for_group = None  # deixa em aberto para pegar até o último disponível
-            period_for_group = None  # quando usar start/end, não usar period
-
-        log.info(
-            f"Processando grupo com last_date={last_date} "
-            f"({len(tickers_in_group)} tickers) | start={start_for_group}, end={end_for_group}, period={period_for_group}"
-        )
-
-        # 4) Download em chunks dentro do grupo
-        for tick_chunk in _chunk(tickers_in_group, cfg.chunk_size):
-            try:
-                yahoo_tickers = [_yahoo_symbol(tk) for tk in tick_chunk]
-                log.info(f"Baixando chunk com {len(tick_chunk)} tickers: {tick_chunk}")
-
-                df = yf.download(
-                    yahoo_tickers,
-                    period=period_for_group,
-                    interval=cfg.interval,
-                    start=start_for_group,
-                    end=end_for_group,
-                    auto_adjust=cfg.auto_adjust,
-                    actions=cfg.actions,
-                    group_by="column",
-                    threads=True,
-                    progress=False,
-                )
-                if df is None or len(df) == 0:
-                    log.warning(f"Nenhum dado retornado para chunk: {tick_chunk}")
-                    for tk in tick_chunk:
-                        _log_asset_issue(
-                            session, tk, "Sem Dados",
-                            "Nenhum dado retornado pelo yfinance para o ticker.",
-                            level=LOG_LEVEL_WARNING
-                        )
-                    session.commit()
-                    continue
+    for tk, last_dt in last_date_by_ticker.items():
+        grouped[last_dt].append(tk)
+    current = [d for d in grouped if _is_up_to_date(d, now_local)]
+    if current:
+        skipped = sum(len(grouped.pop(d)) for d in current)
+        log.info(f"Calendário: {skipped} ticker(s) já com o último pregão e sem sessão aberta; ignorados.")
+
+    _PHASE_SECONDS.observe(time.perf_counter() - t0, phase="planning")
+
+    # 3) Download / normalização / persistência em estágios sobrepostos
+    engine = get_fetch_engine()
+    engine_before = engine.snapshot()
+    pipeline = Pipeline(
+        _with_metrics([
+            Stage("download", download_stage, workers=engine.max_concurrency),
+            Stage("normalize", _normalize_stage),
+            Stage("persist", _make_persist_stage(session, id_by_ticker, stats, issues, heartbeat, progress)),
+        ]),
+        depth=settings.pipeline.queue_depth,
+        name="fetch",
+    )
+    try:
+        progress.set(stage="fetching")
+        with _PHASE_SECONDS.time(phase="fetching"):
+            stats.stages = pipeline.run(_plan_chunks(grouped, today, probes, progress))
+
+        # 4) Eventos corporativos novos: reescreve o histórico dos ativos afetados
+        if settings.corporate_actions.enabled and settings.app.auto_adjust:
+            progress.set(stage="readjusting")
+            with _PHASE_SECONDS.time(phase="readjusting"):
+                stats.stages += _readjust_history(session, id_by_ticker, today, stats, issues, heartbeat, progress)
+    finally:
+        # 5) Problemas acumulados no buffer vão para asset_log em lote, mesmo se a execução
+        #    for cancelada ou abortar (fetch ou reajuste): o que já foi visto não se perde
+        stats.fetch = engine.snapshot().since(engine_before)
+        progress.set(stage="logging")
+        _flush_issues(session, issues)
+    stats.elapsed_seconds = time.perf_counter() - t0
+    _ROWS_PROCESSED.inc(stats.processed)
+    if stats.elapsed_seconds > 0:
+        _ROWS_PER_SECOND.set(stats.processed / stats.elapsed_seconds)
+
+    log.info(
+        "Tempos por estágio: "
+        + ", ".join(f"{st.name}={st.busy_seconds:.2f}s (ocioso {st.idle_seconds:.2f}s, bloqueado {st.blocked_seconds:.2f}s)" for st in stats.stages)
+    )
+    return stats
 
-                # Normaliza SEM sufixo (.SA) para casar com o banco
-                df_long = _normalize_prices(df, tick_chunk)
+# ----------------- Reparo de buracos -----------------
 
-                # Mapear para asset id
+def _make_backfill_persist_stage(
+    session: Session,
+    id_by_ticker: Dict[str, uuid.UUID],
+    stats: RunStats,
+    progress: RunProgress,
+):
+    """
+    Persist do reparo: grava as barras do intervalo, conta a tentativa em asset_history_gap
+    e re-verifica os ativos do chunk (buracos preenchidos saem do índice). Não mexe em marca
+    d'água, quarentena nem asset_log: o buraco em aberto já é o registro do problema. Barras
+    novas incrementam data_version na mesma transação (invalida o ETag de leitura).
+    """
+    cal = get_calendar()
+
+    def persist(job: ChunkJob) -> Optional[MetricsWork]:
+        progress.check_cancelled()
+        try:
+            return _persist_chunk(job)
+        finally:
+            progress.add(chunks_done=1)
+
+    def _persist_chunk(job: ChunkJob) -> Optional[MetricsWork]:
+        ids = {tk: id_by_ticker.get(tk) for tk in job.tickers}
+        filled = None
+        try:
+            for tk, msg in job.failed.items():
+                progress.add_error(f"{tk}: {msg}")
+                record_attempt(session, [ids.get(tk)], job.start, msg)
+            ok = [tk for tk in job.tickers if tk not in job.failed]
+
+            if job.df_long is not None:
+                df_long = job.df_long
+                job.df_long = None
                 df_long["asset"] = df_long["ticker"].str.upper().map(id_by_ticker)
-                # Filtra linhas válidas
                 df_long = df_long.dropna(subset=["asset", "price_date", "close_price"])
-
-                insert_rows = []
-                for _, r in df_long.iterrows():
-                    insert_rows.append({
-                        "asset": r["asset"],
-                        "price_date": r["price_date"],
-                        "close_price": float(r["close_price"]) if pd.notna(r["close_price"]) else None,
-                        "open_price": float(r["open_price"]) if pd.notna(r["open_price"]) else None,
-                        "high_price": float(r["high_price"]) if pd.notna(r["high_price"]) else None,
-                        "low_price": float(r["low_price"]) if pd.notna(r["low_price"]) else None,
-                        "volume": int(r["volume"]) if pd.notna(r["volume"]) else None,
-                        "dividends": float(r["dividends"]) if pd.notna(r["dividends"]) else 0.0,
-                        "splits": float(r["splits"]) if pd.notna(r["splits"]) else 0.0,
-                    })
-
-                total_processed += len(insert_rows)
-
-                if insert_rows:
-                    stmt = pg_insert(asset_history).values(insert_rows)
-                    stmt = stmt.on_conflict_do_nothing(index_elements=["asset", "price_date"])
-                    result = session.execute(stmt)
-                    session.commit()
-                    inserted = result.rowcount if result.rowcount is not None else 0
-                    total_inserted += inserted
-                    log.info(f"Persistidos {inserted} novos registros de {len(insert_rows)} processados.")
-            except Exception as e:
-                msg = str(e)
-                log.exception(f"Falha ao processar chunk {tick_chunk}: {msg}")
-                for tk in tick_chunk:
-                    _log_asset_issue(session, tk, "Erro no Download", msg)
-                session.commit()
-                continue
-
-    return total_processed, total_inserted
-
-# ----------------- Log de Issues -----------------
-
-def _log_asset_issue(session: Session, ticker: str, title: str, message: str, level: str = LOG_LEVEL_ERROR):
-    ins = asset_log.insert().values(
-        id=uuid.uuid4(),
-        ticker=ticker,
-        title=title,
-        message=(message or "")[:10000],
-        service=SERVICE_NAME_ASSET_FETCHER,
-        level=level,
-        created_at=pd.Timestamp.now(),
-        updated_at=pd.Timestamp.now(),
+                stats.processed += len(df_long)
+                progress.add(rows_processed=len(df_long))
+                if len(df_long):
+                    load = bulk_load(
+                        session, asset_history, df_long,
+                        key_columns=("asset", "price_date"),
+                        mode=settings.persist.mode,
+                        batch_size=settings.persist.insert_batch_size,
+                        on_conflict=settings.persist.on_conflict,
+                    )
+                    if load.inserted or load.updated:
+                        bump_data_version(session, df_long["asset"].unique().tolist())
+                    stats.inserted += load.inserted
+                    stats.updated += load.updated
+                    stats.unchanged += load.unchanged
+                    progress.add(rows_inserted=load.inserted, rows_updated=load.updated)
+                    filled = df_long
+
+            record_attempt(session, [ids[tk] for tk in ok], job.start)
+            scan = refresh_gap_index(session, cal, asset_ids=[ids[tk] for tk in ok if ids[tk] is not None])
+            session.commit()
+            if filled is not None:
+                append_from_frame(filled)
+            log.info(
+                f"Reparo {job.start}..{job.end}: {len(ok)} ativo(s), {scan.filled} buraco(s) fechado(s), "
+                f"{scan.gaps} ainda aberto(s)."
+            )
+        except Exception as e:
+            msg = str(e)
+            log.exception(f"Falha ao reparar chunk {job.tickers}: {msg}")
+            session.rollback()
+            record_attempt(session, ids.values(), job.start, msg)
+            session.commit()
+            return None
+        return MetricsWork.from_frame(filled) if filled is not None else None
+
+    return persist
+
+def backfill_gaps(session: Session, progress: Optional[RunProgress] = None) -> RunStats:
+    """
+    Job de reparo (baixa prioridade) dos pregões faltantes no meio do histórico:
+      1) sincroniza trading_session com o calendário e atualiza o índice asset_history_gap
+         para os ativos com varredura vencida (gaps.rescan_hours / gaps.max_scan_assets);
+      2) agrupa os ativos com o mesmo buraco (gap_start, gap_end) e baixa cada faixa com
+         uma requisição de intervalo por chunk, dentro do orçamento gaps.max_requests_per_run;
+      3) grava pelo mesmo pipeline do fetch e re-verifica os ativos reparados.
+    """
+    t0 = time.perf_counter()
+    progress = progress or RunProgress()
+    progress.set(stage="scanning")
+    stats = RunStats()
+    g = settings.gaps
+    cal = get_calendar()
+
+    sync_sessions(session, cal, dt.date.fromisoformat(g.calendar_start), cal.today())
+    scan = refresh_gap_index(session, cal, rescan_hours=g.rescan_hours, max_assets=g.max_scan_assets)
+    session.commit()
+    log.info(f"Varredura de buracos: {scan.assets} ativo(s), {scan.gaps} buraco(s) em aberto, {scan.filled} fechado(s).")
+
+    progress.set(stage="planning")
+    plan = plan_backfill(
+        session,
+        max_requests=g.max_requests_per_run,
+        chunk_size=settings.app.chunk_size,
+        max_attempts=g.max_attempts,
+        retry_hours=g.retry_hours,
+    )
+    if not plan:
+        stats.elapsed_seconds = time.perf_counter() - t0
+        return stats
+    id_by_ticker = {
+        (t or "").strip().upper(): a_id for a_id, t, *_ in load_watermarks(session) if t
+    }
+
+    def jobs() -> Iterator[ChunkJob]:
+        progress.add(groups_total=len(plan), chunks_total=sum(-(-len(gr.tickers) // settings.app.chunk_size) for gr in plan))
+        for gr in plan:
+            log.info(f"Reparando {gr.gap_start}..{gr.gap_end} para {len(gr.tickers)} ticker(s).")
+            for tick_chunk in chunked(gr.tickers, settings.app.chunk_size):
+                progress.check_cancelled()
+                # `end` do provedor é exclusivo
+                yield ChunkJob(tickers=tick_chunk, start=gr.gap_start, end=gr.gap_end + dt.timedelta(days=1), period=None)
+            progress.add(groups_done=1)
+
+    engine = get_fetch_engine()
+    engine_before = engine.snapshot()
+    pipeline = Pipeline(
+        _with_metrics([
+            Stage("download", download_stage, workers=engine.max_concurrency),
+            Stage("normalize", _normalize_stage),
+            Stage("persist", _make_backfill_persist_stage(session, id_by_ticker, stats, progress)),
+        ]),
+        depth=settings.pipeline.queue_depth,
+        name="backfill",
+    )
+    progress.set(stage="fetching")
+    stats.stages = pipeline.run(jobs())
+    stats.fetch = engine.snapshot().since(engine_before)
+    stats.elapsed_seconds = time.perf_counter() - t0
+    log.info(
+        f"Reparo finalizado: {stats.inserted} barra(s) inserida(s), {stats.updated} atualizada(s) "
+        f"em {stats.elapsed_seconds:.1f}s."
     )
-    session.execute(ins)
+    return stats
@@ -0,0 +1,187 @@
+from __future__ import annotations
+import logging
+import uuid
+import datetime as dt
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, update, delete, func, or_, tuple_, not_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from src.infra.trading_calendar import ExchangeCalendar
+from src.models.tables import asset, asset_history, asset_fetch_state, asset_history_gap, trading_session
+
+log = logging.getLogger(__name__)
+
+@dataclass
+class ScanResult:
+    assets: int = 0
+    gaps: int = 0
+    filled: int = 0
+
+@dataclass
+class BackfillGroup:
+    """Buraco comum a vários ativos: baixado com uma única requisição de intervalo por chunk."""
+    gap_start: dt.date
+    gap_end: dt.date
+    tickers: List[str] = field(default_factory=list)
+
+# ----------------- Calendário no banco -----------------
+
+def sync_sessions(session: Session, calendar: ExchangeCalendar, start: dt.date, end: dt.date) -> int:
+    """
+    Regrava trading_session com os pregões de [start, end] numerados em sequência.
+    Poucos milhares de linhas; regravar tudo mantém o seq coerente se o calendário mudar
+    (feriados extras na configuração). Não faz commit.
+    """
+    days = calendar.sessions_between(start, end)
+    session.execute(delete(trading_session))
+    if days:
+        session.execute(trading_session.insert(), [{"session_date": d, "seq": i} for i, d in enumerate(days)])
+    return len(days)
+
+# ----------------- Detecção -----------------
+
+def detect_gaps(
+    session: Session, calendar: ExchangeCalendar, asset_ids: List[uuid.UUID]
+) -> List[Tuple[uuid.UUID, dt.date, dt.date, int]]:
+    """
+    Retorna (asset, gap_start, gap_end, missing_sessions) dos buracos entre a primeira e a
+    última barra de cada ativo: pares consecutivos de barras cuja distância em pregões
+    (trading_session.seq) é maior que 1. Barras em dias que não são pregão são ignoradas.
+    """
+    if not asset_ids:
+        return []
+    w = dict(partition_by=asset_history.c.asset, order_by=asset_history.c.price_date)
+    inner = (
+        select(
+            asset_history.c.asset,
+            asset_history.c.price_date,
+            trading_session.c.seq,
+            func.lag(asset_history.c.price_date).over(**w).label("prev_date"),
+            func.lag(trading_session.c.seq).over(**w).label("prev_seq"),
+        )
+        .select_from(
+            asset_history.join(trading_session, trading_session.c.session_date == asset_history.c.price_date)
+        )
+        .where(asset_history.c.asset.in_(asset_ids))
+        .subquery()
+    )
+    rows = session.execute(
+        select(inner.c.asset, inner.c.prev_date, inner.c.price_date, inner.c.seq - inner.c.prev_seq - 1)
+        .where(inner.c.seq - inner.c.prev_seq > 1)
+    ).fetchall()
+    return [
+        (a_id, calendar.next_session(prev_date), calendar.previous_session(price_date), int(missing))
+        for a_id, prev_date, price_date, missing in rows
+    ]
+
+def refresh_gap_index(
+    session: Session,
+    calendar: ExchangeCalendar,
+    asset_ids: Optional[Iterable[uuid.UUID]] = None,
+    rescan_hours: float = 24,
+    max_assets: int = 500,
+) -> ScanResult:
+    """
+    Re-verifica os ativos `asset_ids` (ou, se None, até `max_assets` ativos com varredura mais
+    antiga que `rescan_hours`) e sincroniza asset_history_gap: buracos novos entram (mantendo
+    as tentativas dos já conhecidos) e os que deixaram de existir saem. Não faz commit.
+    """
+    if asset_ids is None:
+        stale = dt.datetime.now() - dt.timedelta(hours=rescan_hours)
+        asset_ids = session.execute(
+            select(asset_fetch_state.c.asset)
+            .where(
+                asset_fetch_state.c.last_date.isnot(None),
+                or_(asset_fetch_state.c.gaps_scanned_at.is_(None), asset_fetch_state.c.gaps_scanned_at < stale),
+            )
+            .order_by(asset_fetch_state.c.gaps_scanned_at.asc().nullsfirst())
+            .limit(max_assets)
+        ).scalars().all()
+    asset_ids = list(asset_ids)
+    result = ScanResult(assets=len(asset_ids))
+    if not asset_ids:
+        return result
+
+    gaps = detect_gaps(session, calendar, asset_ids)
+    result.gaps = len(gaps)
+    if gaps:
+        stmt = pg_insert(asset_history_gap).values([
+            {"asset": a_id, "gap_start": start, "gap_end": end, "missing_sessions": missing}
+            for a_id, start, end, missing in gaps
+        ])
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=["asset", "gap_start"],
+            set_={"gap_end": stmt.excluded.gap_end, "missing_sessions": stmt.excluded.missing_sessions},
+        ))
+    purge = delete(asset_history_gap).where(asset_history_gap.c.asset.in_(asset_ids))
+    if gaps:
+        purge = purge.where(not_(
+            tuple_(asset_history_gap.c.asset, asset_history_gap.c.gap_start).in_([(g[0], g[1]) for g in gaps])
+        ))
+    result.filled = session.execute(purge).rowcount or 0
+    session.execute(
+        update(asset_fetch_state)
+        .where(asset_fetch_state.c.asset.in_(asset_ids))
+        .values(gaps_scanned_at=func.now())
+    )
+    return result
+
+# ----------------- Plano de reparo -----------------
+
+def plan_backfill(
+    session: Session, max_requests: int, chunk_size: int, max_attempts: int, retry_hours: float
+) -> List[BackfillGroup]:
+    """
+    Seleciona buracos elegíveis (menos tentados e mais antigos primeiro) e agrupa os ativos
+    que compartilham a mesma faixa (gap_start, gap_end). Cada grupo custa ceil(n / chunk_size)
+    requisições; para quando o orçamento `max_requests` se esgota.
+    """
+    retry_before = dt.datetime.now() - dt.timedelta(hours=retry_hours)
+    rows = session.execute(
+        select(asset_history_gap.c.gap_start, asset_history_gap.c.gap_end, asset.c.ticker)
+        .select_from(asset_history_gap.join(asset, asset.c.id == asset_history_gap.c.asset))
+        .where(
+            asset.c.ticker.isnot(None),
+            asset_history_gap.c.attempts < max_attempts,
+            or_(asset_history_gap.c.last_attempt_at.is_(None), asset_history_gap.c.last_attempt_at < retry_before),
+        )
+        .order_by(asset_history_gap.c.attempts, asset_history_gap.c.gap_start, asset_history_gap.c.gap_end)
+        .limit(max_requests * chunk_size)
+    ).fetchall()
+
+    by_range: Dict[Tuple[dt.date, dt.date], BackfillGroup] = {}
+    for start, end, ticker in rows:
+        key = (start, end)
+        if key not in by_range:
+            by_range[key] = BackfillGroup(start, end)
+        by_range[key].tickers.append(ticker.strip().upper())
+
+    plan, budget = [], max_requests
+    # faixas compartilhadas por mais ativos rendem mais barras por requisição
+    for group in sorted(by_range.values(), key=lambda g: -len(g.tickers)):
+        if budget <= 0:
+            break
+        take = min(len(group.tickers), budget * chunk_size)
+        plan.append(BackfillGroup(group.gap_start, group.gap_end, group.tickers[:take]))
+        budget -= -(-take // chunk_size)
+    return plan
+
+def record_attempt(
+    session: Session, asset_ids: Iterable[uuid.UUID], gap_start: dt.date, error: Optional[str] = None
+) -> None:
+    """Conta uma tentativa de reparo do buraco (asset, gap_start). Não faz commit."""
+    ids = [a for a in asset_ids if a is not None]
+    if not ids:
+        return
+    session.execute(
+        update(asset_history_gap)
+        .where(asset_history_gap.c.asset.in_(ids), asset_history_gap.c.gap_start == gap_start)
+        .values(
+            attempts=asset_history_gap.c.attempts + 1,
+            last_attempt_at=func.now(),
+            last_error=error[:10000] if error else None,
+        )
+    )
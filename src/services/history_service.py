@@ -0,0 +1,171 @@
+from __future__ import annotations
+import csv
+import datetime as dt
+import hashlib
+import importlib.util
+import io
+import json
+import logging
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Iterator, List, Optional, Sequence
+
+from sqlalchemy import select
+
+from src.infra.db import get_session
+from src.models.tables import asset, asset_history, asset_fetch_state
+
+log = logging.getLogger(__name__)
+
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+FORMAT_ARROW = "arrow"
+FORMATS = (FORMAT_NDJSON, FORMAT_CSV, FORMAT_ARROW)
+
+MEDIA_TYPES = {
+    FORMAT_NDJSON: "application/x-ndjson",
+    FORMAT_CSV: "text/csv",
+    FORMAT_ARROW: "application/vnd.apache.arrow.stream",
+}
+
+# Colunas expostas (nome público -> coluna de asset_history)
+VALUE_COLUMNS = {
+    "open": "open_price",
+    "high": "high_price",
+    "low": "low_price",
+    "close": "close_price",
+    "volume": "volume",
+    "dividends": "dividends",
+    "splits": "splits",
+}
+
+@dataclass(frozen=True)
+class HistoryQuery:
+    tickers: List[str]
+    start: Optional[dt.date] = None
+    end: Optional[dt.date] = None
+    columns: Sequence[str] = tuple(VALUE_COLUMNS)
+    fmt: str = FORMAT_NDJSON
+    batch_rows: int = 5000
+
+def arrow_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+# ----------------- ETag -----------------
+
+def compute_etag(session, q: HistoryQuery) -> Optional[str]:
+    """
+    ETag fraco derivado do estado (asset_fetch_state) dos ativos pedidos e dos parâmetros da
+    consulta: last_date, data_version (barras inseridas/alteradas) e adjustment_version
+    (histórico reescrito por evento corporativo). Execuções que não mudam nenhuma barra
+    mantêm o ETag.
+    Retorna None se nenhum ticker existir.
+    """
+    rows = session.execute(
+        select(
+            asset.c.ticker,
+            asset_fetch_state.c.last_date,
+            asset_fetch_state.c.data_version,
+            asset_fetch_state.c.adjustment_version,
+        )
+        .select_from(asset.outerjoin(asset_fetch_state, asset_fetch_state.c.asset == asset.c.id))
+        .where(asset.c.ticker.in_(q.tickers))
+        .order_by(asset.c.ticker)
+    ).fetchall()
+    if not rows:
+        return None
+    h = hashlib.sha1()
+    h.update(repr((q.start, q.end, tuple(q.columns), q.fmt)).encode())
+    for r in rows:
+        h.update(repr(tuple(r)).encode())
+    return f'W/"{h.hexdigest()}"'
+
+# ----------------- Streaming -----------------
+
+def _build_select(q: HistoryQuery):
+    cols = [asset.c.ticker.label("ticker"), asset_history.c.price_date.label("date")]
+    cols += [asset_history.c[VALUE_COLUMNS[c]].label(c) for c in q.columns]
+    stmt = (
+        select(*cols)
+        .select_from(asset_history.join(asset, asset.c.id == asset_history.c.asset))
+        .where(asset.c.ticker.in_(q.tickers))
+        .order_by(asset.c.ticker, asset_history.c.price_date)
+    )
+    if q.start is not None:
+        stmt = stmt.where(asset_history.c.price_date >= q.start)
+    if q.end is not None:
+        stmt = stmt.where(asset_history.c.price_date <= q.end)
+    return stmt
+
+def _iter_batches(q: HistoryQuery) -> Iterator[list]:
+    """
+    Lê via cursor do lado do servidor (stream_results + yield_per): o processo mantém
+    no máximo `batch_rows` linhas em memória, independentemente do tamanho do resultado.
+    """
+    with get_session() as s:
+        result = s.execute(_build_select(q).execution_options(stream_results=True, yield_per=q.batch_rows))
+        for part in result.partitions():
+            yield part
+
+def _jsonable(v):
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, dt.date):
+        return v.isoformat()
+    return v
+
+def _ndjson_chunks(q: HistoryQuery) -> Iterator[bytes]:
+    keys = ["ticker", "date", *q.columns]
+    for part in _iter_batches(q):
+        lines = [json.dumps(dict(zip(keys, map(_jsonable, row))), separators=(",", ":")) for row in part]
+        yield ("\n".join(lines) + "\n").encode()
+
+def _csv_chunks(q: HistoryQuery) -> Iterator[bytes]:
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    w.writerow(["ticker", "date", *q.columns])
+    for part in _iter_batches(q):
+        w.writerows(part)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+def _arrow_chunks(q: HistoryQuery) -> Iterator[bytes]:
+    import pyarrow as pa
+
+    types = {c: (pa.int64() if c == "volume" else pa.float64()) for c in q.columns}
+    schema = pa.schema([("ticker", pa.string()), ("date", pa.date32()), *[(c, types[c]) for c in q.columns]])
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+
+    def drain() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    yield drain()  # schema
+    for part in _iter_batches(q):
+        cols = list(zip(*part))
+        arrays = [pa.array(cols[0], pa.string()), pa.array(cols[1], pa.date32())]
+        for i, c in enumerate(q.columns, start=2):
+            vals = cols[i] if c == "volume" else [float(v) if v is not None else None for v in cols[i]]
+            arrays.append(pa.array(vals, types[c]))
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        yield drain()
+    writer.close()
+    yield drain()
+
+def stream_history(q: HistoryQuery) -> Iterator[bytes]:
+    """Gera o corpo da resposta em blocos, no formato pedido."""
+    if q.fmt == FORMAT_CSV:
+        return _csv_chunks(q)
+    if q.fmt == FORMAT_ARROW:
+        return _arrow_chunks(q)
+    return _ndjson_chunks(q)
+
+def history_etag(q: HistoryQuery) -> Optional[str]:
+    with get_session() as s:
+        return compute_etag(s, q)
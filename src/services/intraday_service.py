@@ -0,0 +1,509 @@
+from __future__ import annotations
+import logging
+import threading
+import time
+import uuid
+import datetime as dt
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import DefaultDict, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Table, select, func, text
+from sqlalchemy.orm import Session
+
+from src.infra.bulk_loader import CONFLICT_UPDATE_IF_CHANGED, bulk_load
+from src.infra.config import get_settings
+from src.infra.db import get_engine, get_session
+from src.infra.pipeline import Pipeline, Stage
+from src.infra.ring_buffer import RingBufferStore
+from src.infra.trading_calendar import get_calendar
+from src.models.tables import asset, asset_intraday, asset_intraday_rollup
+from src.services.coordination_service import MODE_NONE, leader_lock
+from src.services.fetch_engine import get_fetch_engine
+from src.services.run_state import RunProgress, RunStats
+from src.services.download_service import ChunkJob, base_ticker, chunked, download_stage
+
+log = logging.getLogger(__name__)
+settings = get_settings()
+
+INTRADAY_JOB_NAME = "intraday_job"
+INTRADAY_MAINTENANCE_JOB_NAME = "intraday_maintenance_job"
+
+_INTRADAY_FIELDS = [
+    ("Open", "open_price"),
+    ("High", "high_price"),
+    ("Low", "low_price"),
+    ("Close", "close_price"),
+    ("Volume", "volume"),
+]
+_BAR_COLUMNS = [out for _, out in _INTRADAY_FIELDS]
+_INTRADAY_COLUMNS = ["ts", "ticker"] + _BAR_COLUMNS
+
+_UNIT_SECONDS = {"m": 60, "h": 3600}
+
+def interval_seconds(interval: str) -> int:
+    """Duração de um intervalo intradiário do yfinance (1m, 5m, 60m, 1h...) em segundos."""
+    unit, n = interval[-1:], interval[:-1]
+    if unit not in _UNIT_SECONDS or not n.isdigit() or int(n) <= 0:
+        raise ValueError(f"Intervalo intradiário inválido: {interval!r} (ex.: 1m, 5m, 60m, 1h)")
+    return int(n) * _UNIT_SECONDS[unit]
+
+# ----------------- Normalização -----------------
+
+def _normalize_intraday(df: pd.DataFrame, tickers_base: List[str]) -> pd.DataFrame:
+    """
+    Frame largo do yfinance -> formato longo (ts, ticker, OHLCV), com ts em UTC.
+    Índice sem fuso (provedores locais) é interpretado no fuso do calendário.
+    """
+    if not len(df):
+        return pd.DataFrame(columns=_INTRADAY_COLUMNS)
+    idx = pd.DatetimeIndex(df.index)
+    if idx.tz is None:
+        idx = idx.tz_localize(get_calendar().tz)
+    ts = idx.tz_convert("UTC")
+
+    if isinstance(df.columns, pd.MultiIndex):
+        symbols = list(dict.fromkeys(df.columns.get_level_values(1)))
+        key = lambda f, sym: (f, sym)
+    else:
+        symbols = [tickers_base[0]]
+        key = lambda f, sym: f
+    present = set(df.columns)
+
+    batches = []
+    for sym in symbols:
+        col = key("Close", sym)
+        if col not in present:
+            continue
+        close = df[col].to_numpy(dtype="float64", copy=False)
+        rows = np.flatnonzero(~np.isnan(close))
+        if not len(rows):
+            continue
+        m = len(rows)
+        batch = {"ts": ts[rows], "ticker": np.full(m, base_ticker(sym), dtype=object)}
+        for f, out_col in _INTRADAY_FIELDS:
+            c = key(f, sym)
+            batch[out_col] = df[c].to_numpy(dtype="float64", copy=False)[rows] if c in present else np.full(m, np.nan)
+        vol = batch["volume"]
+        vol_nan = np.isnan(vol)
+        batch["volume"] = (
+            pd.arrays.IntegerArray(np.where(vol_nan, 0, vol).astype(np.int64), vol_nan)
+            if vol_nan.any() else vol.astype(np.int64)
+        )
+        batches.append(pd.DataFrame(batch, columns=_INTRADAY_COLUMNS, copy=False))
+    if not batches:
+        return pd.DataFrame(columns=_INTRADAY_COLUMNS)
+    return batches[0] if len(batches) == 1 else pd.concat(batches, ignore_index=True)
+
+# ----------------- Partições -----------------
+
+_known_partitions: set = set()
+_partition_lock = threading.Lock()
+
+def _partition_for(table: Table, day: dt.date) -> Tuple[str, dt.date, dt.date]:
+    """(nome, início, fim) da partição de `table` que contém `day`: diária na bruta, mensal no rollup."""
+    if table is asset_intraday_rollup:
+        start = day.replace(day=1)
+        end = (start + dt.timedelta(days=32)).replace(day=1)
+        return f"{table.name}_p{start:%Y%m}", start, end
+    return f"{table.name}_p{day:%Y%m%d}", day, day + dt.timedelta(days=1)
+
+def _list_partitions(conn, table: Table) -> Dict[str, dt.date]:
+    """Partições existentes de `table` -> data inicial (a partir do sufixo do nome)."""
+    names = conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :parent"
+        ),
+        {"parent": table.name},
+    ).scalars().all()
+    out = {}
+    prefix = f"{table.name}_p"
+    for name in names:
+        suffix = name[len(prefix):] if name.startswith(prefix) else ""
+        try:
+            if len(suffix) == 8:
+                out[name] = dt.datetime.strptime(suffix, "%Y%m%d").date()
+            elif len(suffix) == 6:
+                out[name] = dt.datetime.strptime(suffix + "01", "%Y%m%d").date()
+        except ValueError:
+            continue
+    return out
+
+def ensure_partitions(table: Table, first: dt.date, last: dt.date) -> int:
+    """
+    Cria (em transação própria) as partições de `table` que cobrem [first, last], limites em UTC.
+    As já vistas por este processo não voltam ao banco. Retorna quantas foram criadas.
+    """
+    wanted: Dict[str, Tuple[dt.date, dt.date]] = {}
+    day = first
+    while day <= last:
+        name, start, end = _partition_for(table, day)
+        wanted[name] = (start, end)
+        day = end
+    with _partition_lock:
+        missing = [n for n in wanted if n not in _known_partitions]
+        if not missing:
+            return 0
+        created = 0
+        with get_engine().begin() as conn:
+            existing = _list_partitions(conn, table)
+            for name in missing:
+                if name in existing:
+                    continue
+                start, end = wanted[name]
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table.name} "
+                    f"FOR VALUES FROM ('{start.isoformat()} 00:00:00+00') TO ('{end.isoformat()} 00:00:00+00')"
+                ))
+                created += 1
+        _known_partitions.update(missing)
+    if created:
+        log.info(f"{created} partição(ões) criada(s) em {table.name}.")
+    return created
+
+def _drop_partition(conn, name: str) -> None:
+    conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+    with _partition_lock:
+        _known_partitions.discard(name)
+
+# ----------------- Buffer em memória -----------------
+
+_store: Optional[RingBufferStore] = None
+_store_lock = threading.Lock()
+_synced: Dict[str, float] = {}  # ticker -> instante (monotonic) da última sincronização com o banco
+_sync_locks: Dict[str, threading.Lock] = {}  # um por ticker: a consulta ao banco não trava os demais
+_sync_lock = threading.Lock()  # só para criar os locks por ticker
+
+def get_ring_store() -> RingBufferStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RingBufferStore(settings.intraday.ring_size)
+        return _store
+
+def _ticker_lock(ticker: str) -> threading.Lock:
+    with _sync_lock:
+        lock = _sync_locks.get(ticker)
+        if lock is None:
+            lock = _sync_locks[ticker] = threading.Lock()
+        return lock
+
+def _ring_arrays(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    # o buffer guarda ns UTC; a resolução do índice varia com a origem (pandas >= 2 aceita us/ms)
+    ts = pd.DatetimeIndex(pd.to_datetime(df["ts"], utc=True)).as_unit("ns").asi8
+    values = np.column_stack([pd.to_numeric(df[c], errors="coerce").to_numpy(dtype="float64", na_value=np.nan) for c in _BAR_COLUMNS])
+    return ts, values
+
+def push_bars(df: pd.DataFrame) -> None:
+    """Acrescenta barras recém-gravadas aos buffers já carregados do banco (os demais carregam na 1ª leitura)."""
+    store = get_ring_store()
+    for tk, g in df.sort_values("ts").groupby("ticker", sort=False):
+        ring = store.get(tk) if tk in _synced else None
+        if ring is not None:
+            ring.extend(*_ring_arrays(g))
+
+def _load_bars(session: Session, ticker: str, since: Optional[dt.datetime], limit: int) -> pd.DataFrame:
+    """Últimas `limit` barras do ticker no banco (a partir de `since`, inclusive), em ordem cronológica."""
+    lower = since or dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=settings.intraday.retention_days + 1)
+    rows = session.execute(
+        select(asset_intraday.c.ts, *[asset_intraday.c[c] for c in _BAR_COLUMNS])
+        .select_from(asset_intraday.join(asset, asset.c.id == asset_intraday.c.asset))
+        .where(asset.c.ticker == ticker, asset_intraday.c.ts >= lower)
+        .order_by(asset_intraday.c.ts.desc())
+        .limit(limit)
+    ).fetchall()
+    return pd.DataFrame(list(reversed(rows)), columns=["ts"] + _BAR_COLUMNS)
+
+def recent_bars(ticker: str, n: int) -> Optional[dict]:
+    """
+    Últimas `n` barras do ticker servidas do buffer em memória. O buffer é carregado do banco
+    na primeira leitura e ressincronizado (só as barras a partir da última) quando passa um
+    intervalo desde a última sincronização, o que cobre réplicas que não fazem o fetch.
+    None se o ticker não está em intraday.tickers.
+    """
+    cfg = settings.intraday
+    tk = base_ticker(ticker)
+    if tk not in cfg.tickers:
+        return None
+    store = get_ring_store()
+    with _ticker_lock(tk):
+        synced = _synced.get(tk)
+        now = time.monotonic()
+        if synced is None or now - synced >= interval_seconds(cfg.interval):
+            ring = store.get(tk, create=True)
+            latest = ring.latest_ts if synced is not None else None
+            since = None if latest is None else pd.Timestamp(latest, tz="UTC").to_pydatetime()
+            with get_session() as s:
+                df = _load_bars(s, tk, since, ring.capacity)
+            if synced is None:
+                ring.clear()
+            if len(df):
+                ring.extend(*_ring_arrays(df))
+            _synced[tk] = now
+    ts, values = store.get(tk).last(n)
+    bars = []
+    for t, row in zip(ts, values):
+        bar = {"ts": pd.Timestamp(int(t), tz="UTC").isoformat()}
+        for c, v in zip(("open", "high", "low", "close", "volume"), row):
+            bar[c] = None if np.isnan(v) else (int(v) if c == "volume" else float(v))
+        bars.append(bar)
+    return {"ticker": tk, "interval": cfg.interval, "bars": bars}
+
+# ----------------- Ingestão -----------------
+
+def _normalize_stage(job: ChunkJob) -> ChunkJob:
+    if not job.frames:
+        return job
+    try:
+        parts = []
+        while job.frames:
+            tickers, df = job.frames.pop(0)
+            parts.append(_normalize_intraday(df, tickers))
+            del df
+        job.df_long = parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+    except Exception as e:
+        log.exception(f"Falha ao normalizar chunk intradiário {job.tickers}: {e}")
+        job.df_long = None
+        for tk in job.tickers:
+            job.failed.setdefault(tk, str(e))
+    finally:
+        job.frames = []
+    return job
+
+def _make_persist_stage(session: Session, id_by_ticker: Dict[str, uuid.UUID], stats: RunStats, progress: RunProgress):
+    """
+    Grava o chunk em asset_intraday (update_if_changed: a barra corrente é revisada a cada
+    execução), criando antes as partições diárias que faltarem, e alimenta os buffers em memória.
+    """
+
+    def persist(job: ChunkJob) -> None:
+        progress.check_cancelled()
+        try:
+            for tk, msg in job.failed.items():
+                progress.add_error(f"{tk}: {msg}")
+            if job.df_long is None:
+                return None
+            df = job.df_long
+            job.df_long = None
+            df["asset"] = df["ticker"].map(id_by_ticker)
+            df = df.dropna(subset=["asset", "ts", "close_price"])
+            stats.processed += len(df)
+            progress.add(rows_processed=len(df))
+            if not len(df):
+                return None
+            days = df["ts"].dt.date
+            ensure_partitions(asset_intraday, days.min(), days.max())
+            load = bulk_load(
+                session, asset_intraday, df,
+                key_columns=("asset", "ts"),
+                mode=settings.persist.mode,
+                batch_size=settings.persist.insert_batch_size,
+                on_conflict=CONFLICT_UPDATE_IF_CHANGED,
+            )
+            session.commit()
+            push_bars(df)
+            stats.inserted += load.inserted
+            stats.updated += load.updated
+            stats.unchanged += load.unchanged
+            progress.add(rows_inserted=load.inserted, rows_updated=load.updated)
+        except Exception as e:
+            log.exception(f"Falha ao gravar chunk intradiário {job.tickers}: {e}")
+            session.rollback()
+            progress.add_error(f"{job.tickers}: {e}")
+        finally:
+            progress.add(chunks_done=1)
+        return None
+
+    return persist
+
+def fetch_intraday(session: Session, progress: Optional[RunProgress] = None) -> RunStats:
+    """
+    Ingestão intradiária (intraday.interval) dos tickers em intraday.tickers:
+      1) última barra gravada por ativo (só nas partições dentro de intraday.lookback_days);
+      2) tickers com o mesmo dia de retomada são baixados juntos, do dia da última barra
+         (para revisar a barra parcial) ou do início da janela de lookback;
+      3) download -> normalize -> persist em pipeline, como o fetch diário; asset_history,
+         marcas d'água e asset_log não são tocados.
+    """
+    t0 = time.perf_counter()
+    cfg = settings.intraday
+    progress = progress or RunProgress()
+    progress.set(stage="planning")
+    stats = RunStats()
+    if not cfg.tickers:
+        log.warning("Modo intradiário sem tickers (intraday.tickers vazio).")
+        return stats
+
+    rows = session.execute(select(asset.c.id, asset.c.ticker).where(asset.c.ticker.in_(cfg.tickers))).fetchall()
+    id_by_ticker = {t.strip().upper(): a_id for a_id, t in rows if t}
+    unknown = [tk for tk in cfg.tickers if tk not in id_by_ticker]
+    if unknown:
+        log.warning(f"Tickers intradiários sem cadastro em asset: {unknown}")
+
+    cal = get_calendar()
+    today = cal.today()
+    floor = today - dt.timedelta(days=cfg.lookback_days)
+    ensure_partitions(asset_intraday, floor, today + dt.timedelta(days=cfg.partitions_ahead_days))
+    lower = dt.datetime.combine(floor, dt.time(), tzinfo=dt.timezone.utc)
+    last = dict(session.execute(
+        select(asset_intraday.c.asset, func.max(asset_intraday.c.ts))
+        .where(asset_intraday.c.asset.in_(list(id_by_ticker.values())), asset_intraday.c.ts >= lower)
+        .group_by(asset_intraday.c.asset)
+    ).fetchall())
+    session.commit()
+
+    grouped: DefaultDict[dt.date, List[str]] = defaultdict(list)
+    for tk, a_id in id_by_ticker.items():
+        ts = last.get(a_id)
+        grouped[max(floor, ts.astimezone(cal.tz).date()) if ts is not None else floor].append(tk)
+
+    chunk_size = settings.app.chunk_size
+
+    def jobs() -> Iterator[ChunkJob]:
+        progress.add(groups_total=len(grouped), chunks_total=sum(-(-len(t) // chunk_size) for t in grouped.values()))
+        for start, tickers in sorted(grouped.items()):
+            for tick_chunk in chunked(tickers, chunk_size):
+                progress.check_cancelled()
+                yield ChunkJob(tickers=tick_chunk, start=start, end=None, period=None, interval=cfg.interval)
+            progress.add(groups_done=1)
+
+    engine = get_fetch_engine()
+    engine_before = engine.snapshot()
+    pipeline = Pipeline(
+        [
+            Stage("download", download_stage, workers=engine.max_concurrency),
+            Stage("normalize", _normalize_stage),
+            Stage("persist", _make_persist_stage(session, id_by_ticker, stats, progress)),
+        ],
+        depth=settings.pipeline.queue_depth,
+        name="intraday",
+    )
+    progress.set(stage="fetching")
+    stats.stages = pipeline.run(jobs())
+    stats.fetch = engine.snapshot().since(engine_before)
+    stats.elapsed_seconds = time.perf_counter() - t0
+    log.info(
+        f"Intradiário ({cfg.interval}): {stats.inserted} barras novas, {stats.updated} revisadas, "
+        f"{len(id_by_ticker)} ticker(s) em {stats.elapsed_seconds:.1f}s."
+    )
+    return stats
+
+# ----------------- Retenção -----------------
+
+# agrega uma partição diária em barras de :secs segundos (alinhadas à época UTC)
+_ROLLUP_SQL = """
+INSERT INTO {rollup} (asset, ts, open_price, high_price, low_price, close_price, volume)
+SELECT asset,
+       to_timestamp(floor(extract(epoch FROM ts) / :secs) * :secs) AS bucket,
+       (array_agg(open_price ORDER BY ts))[1],
+       max(high_price),
+       min(low_price),
+       (array_agg(close_price ORDER BY ts DESC))[1],
+       sum(volume)
+FROM {part}
+GROUP BY asset, bucket
+ON CONFLICT (asset, ts) DO UPDATE SET
+    open_price = EXCLUDED.open_price,
+    high_price = EXCLUDED.high_price,
+    low_price = EXCLUDED.low_price,
+    close_price = EXCLUDED.close_price,
+    volume = EXCLUDED.volume
+"""
+
+@dataclass
+class MaintenanceResult:
+    created: int = 0
+    downsampled: int = 0
+    rows_rolled: int = 0
+    dropped: int = 0
+
+def maintain_intraday() -> MaintenanceResult:
+    """
+    Retenção de asset_intraday:
+      - cria as partições diárias dos próximos intraday.partitions_ahead_days;
+      - partições mais antigas que intraday.retention_days são agregadas em
+        intraday.downsample_interval (asset_intraday_rollup) e descartadas com DROP;
+      - partições mensais do rollup além de intraday.downsample_retention_days são descartadas.
+    Cada partição é processada na própria transação.
+    """
+    cfg = settings.intraday
+    res = MaintenanceResult()
+    today = get_calendar().today()
+    res.created += ensure_partitions(asset_intraday, today, today + dt.timedelta(days=cfg.partitions_ahead_days))
+    rollup_secs = interval_seconds(cfg.downsample_interval) if cfg.downsample_interval else None
+
+    engine = get_engine()
+    with engine.connect() as conn:
+        raw = _list_partitions(conn, asset_intraday)
+        rolled = _list_partitions(conn, asset_intraday_rollup)
+
+    cutoff = today - dt.timedelta(days=cfg.retention_days)
+    for name, start in sorted(raw.items(), key=lambda kv: kv[1]):
+        if start >= cutoff:
+            continue
+        if rollup_secs:
+            res.created += ensure_partitions(asset_intraday_rollup, start, start)
+        with engine.begin() as conn:
+            if rollup_secs:
+                r = conn.execute(
+                    text(_ROLLUP_SQL.format(rollup=asset_intraday_rollup.name, part=name)), {"secs": rollup_secs}
+                )
+                res.rows_rolled += max(0, r.rowcount or 0)
+                res.downsampled += 1
+            _drop_partition(conn, name)
+        res.dropped += 1
+
+    rollup_cutoff = today - dt.timedelta(days=cfg.downsample_retention_days)
+    for name, start in rolled.items():
+        _, _, end = _partition_for(asset_intraday_rollup, start)
+        if end <= rollup_cutoff:
+            with engine.begin() as conn:
+                _drop_partition(conn, name)
+            res.dropped += 1
+
+    log.info(
+        f"Retenção intradiária: {res.created} partição(ões) criada(s), {res.downsampled} agregada(s) "
+        f"({res.rows_rolled} barras), {res.dropped} descartada(s)."
+    )
+    return res
+
+# ----------------- Runners (job_service) -----------------
+
+def _run_exclusive(job_name: str, fn, cycle: str):
+    if settings.coordination.mode == MODE_NONE:
+        return fn()
+    with leader_lock(job_name) as leader:
+        if not leader:
+            log.info(f"Outra réplica está executando {job_name}; ciclo {cycle} ignorado.")
+            return None
+        return fn()
+
+def run_intraday(cycle: str, progress: Optional[RunProgress] = None) -> RunStats:
+    """Runner do job de ingestão intradiária (uma réplica por vez)."""
+    if not settings.intraday.enabled:
+        return RunStats()
+
+    def run() -> RunStats:
+        with get_session() as s:
+            return fetch_intraday(s, progress=progress)
+
+    return _run_exclusive(INTRADAY_JOB_NAME, run, cycle) or RunStats()
+
+def run_intraday_maintenance(cycle: str, progress: Optional[RunProgress] = None) -> RunStats:
+    """Runner do job de retenção/agregação intradiária (DDL de partições: uma réplica por vez)."""
+    stats = RunStats()
+    if not settings.intraday.enabled:
+        return stats
+    t0 = time.perf_counter()
+    if progress is not None:
+        progress.set(stage="intraday_maintenance")
+    result = _run_exclusive(INTRADAY_MAINTENANCE_JOB_NAME, maintain_intraday, cycle)
+    if result is not None:
+        stats.processed = result.rows_rolled
+    stats.elapsed_seconds = time.perf_counter() - t0
+    return stats
@@ -0,0 +1,169 @@
+from __future__ import annotations
+import logging
+import threading
+import uuid
+import datetime as dt
+from dataclasses import dataclass
+from typing import Dict, Iterable, Set, Tuple
+
+from sqlalchemy import select, update, bindparam, tuple_, not_
+from sqlalchemy.orm import Session
+
+from src.constants.common import SERVICE_NAME_ASSET_FETCHER, LOG_LEVEL_ERROR
+from src.models.tables import asset_log, asset_log_state
+
+log = logging.getLogger(__name__)
+
+@dataclass
+class _Issue:
+    message: str
+    level: str
+    count: int
+    first_seen: dt.datetime
+    last_seen: dt.datetime
+
+@dataclass
+class FlushResult:
+    inserted: int = 0
+    updated: int = 0
+    resolved: int = 0
+
+class IssueBuffer:
+    """
+    Acumula os problemas de uma execução e os grava de uma vez em asset_log.
+
+    Repetições de (ticker, title) viram uma única linha aberta, com created_at (primeira
+    ocorrência) e updated_at (última) em asset_log e o total de ocorrências em
+    asset_log_state. Se já houver linha aberta de execuções anteriores, ela é atualizada em
+    vez de gerar outra. Tickers processados sem problema nesta execução têm suas linhas
+    abertas marcadas como resolvidas (asset_log_state.resolved_at).
+    """
+
+    def __init__(self, service: str = SERVICE_NAME_ASSET_FETCHER):
+        self.service = service
+        self._issues: Dict[Tuple[str, str], _Issue] = {}
+        self._ok: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def add(self, ticker: str, title: str, message: str, level: str = LOG_LEVEL_ERROR) -> None:
+        now = dt.datetime.now()
+        msg = (message or "")[:10000]
+        with self._lock:
+            issue = self._issues.get((ticker, title))
+            if issue is None:
+                self._issues[(ticker, title)] = _Issue(msg, level, 1, now, now)
+            else:
+                issue.message, issue.level = msg, level
+                issue.count += 1
+                issue.last_seen = now
+
+    def mark_ok(self, tickers: Iterable[str]) -> None:
+        """Registra tickers processados com sucesso (candidatos a auto-resolução)."""
+        with self._lock:
+            self._ok.update(tickers)
+
+    def __len__(self) -> int:
+        return len(self._issues)
+
+    def flush(self, session: Session) -> FlushResult:
+        """
+        Grava o buffer (1 SELECT + 2 UPDATEs em lote + 2 INSERTs em lote + UPDATEs de resolução,
+        estes só em asset_log_state). Não faz commit.
+        """
+        with self._lock:
+            issues, self._issues = self._issues, {}
+            ok, self._ok = self._ok - {t for t, _ in issues}, set()
+        result = FlushResult()
+        st = asset_log_state
+
+        if issues:
+            tickers = list({t for t, _ in issues})
+            open_rows = session.execute(
+                select(st.c.asset_log, st.c.ticker, st.c.title)
+                .select_from(st.join(asset_log, asset_log.c.id == st.c.asset_log))
+                .where(st.c.service == self.service, st.c.resolved_at.is_(None), st.c.ticker.in_(tickers))
+                .order_by(asset_log.c.updated_at.desc().nullslast())
+            ).fetchall()
+            open_ids: Dict[Tuple[str, str], uuid.UUID] = {}
+            for row_id, ticker, title in open_rows:
+                open_ids.setdefault((ticker, title), row_id)
+
+            updates, inserts, states = [], [], []
+            for key, issue in issues.items():
+                row_id = open_ids.get(key)
+                if row_id is not None:
+                    updates.append({
+                        "b_id": row_id,
+                        "b_n": issue.count,
+                        "b_message": issue.message,
+                        "b_level": issue.level,
+                        "b_last_seen": issue.last_seen,
+                    })
+                else:
+                    row_id = uuid.uuid4()
+                    inserts.append({
+                        "id": row_id,
+                        "ticker": key[0],
+                        "title": key[1],
+                        "message": issue.message,
+                        "service": self.service,
+                        "level": issue.level,
+                        "created_at": issue.first_seen,
+                        "updated_at": issue.last_seen,
+                    })
+                    states.append({
+                        "asset_log": row_id,
+                        "service": self.service,
+                        "ticker": key[0],
+                        "title": key[1],
+                        "occurrences": issue.count,
+                    })
+
+            if updates:
+                conn = session.connection()
+                conn.execute(
+                    update(asset_log)
+                    .where(asset_log.c.id == bindparam("b_id"))
+                    .values(message=bindparam("b_message"), level=bindparam("b_level"), updated_at=bindparam("b_last_seen")),
+                    updates,
+                )
+                conn.execute(
+                    update(st)
+                    .where(st.c.asset_log == bindparam("b_id"))
+                    .values(occurrences=st.c.occurrences + bindparam("b_n")),
+                    updates,
+                )
+                result.updated = len(updates)
+            if inserts:
+                session.execute(asset_log.insert(), inserts)
+                session.execute(st.insert(), states)
+                result.inserted = len(inserts)
+
+        if ok:
+            res = session.execute(
+                update(st)
+                .where(st.c.service == self.service, st.c.resolved_at.is_(None), st.c.ticker.in_(list(ok)))
+                .values(resolved_at=dt.datetime.now())
+            )
+            result.resolved = res.rowcount or 0
+
+        # tickers com problema nesta execução: resolve os títulos que deixaram de ocorrer
+        if issues:
+            res = session.execute(
+                update(st)
+                .where(
+                    st.c.service == self.service,
+                    st.c.resolved_at.is_(None),
+                    st.c.ticker.in_(list({t for t, _ in issues})),
+                    not_(tuple_(st.c.ticker, st.c.title).in_(list(issues.keys()))),
+                )
+                .values(resolved_at=dt.datetime.now())
+            )
+            result.resolved += res.rowcount or 0
+
+        if issues or ok:
+            log.info(
+                f"asset_log: {result.inserted} novas ocorrências, {result.updated} atualizadas, "
+                f"{result.resolved} resolvidas."
+            )
+        return result
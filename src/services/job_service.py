@@ -0,0 +1,242 @@
+from __future__ import annotations
+import logging
+import queue
+import threading
+import uuid
+import datetime as dt
+import itertools
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.infra.config import get_settings
+from src.infra.instrumentation import counter, histogram
+from src.infra.profiler import ProfileReport, SamplingProfiler
+from src.services.run_state import RunCancelled, RunProgress, RunStats
+
+log = logging.getLogger(__name__)
+settings = get_settings()
+
+_JOB_SECONDS = histogram(
+    "yf_job_seconds", "Duração das execuções por tipo e status final.", ("kind", "status"),
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600),
+)
+_JOB_QUEUE_SECONDS = histogram(
+    "yf_job_queue_seconds", "Tempo entre o enfileiramento e o início da execução.", ("kind",),
+    buckets=(0.01, 0.1, 1, 5, 15, 60, 300, 900, 3600),
+)
+_JOBS = counter("yf_jobs_total", "Execuções finalizadas por tipo e status.", ("kind", "status"))
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+
+KIND_FETCH = "fetch"
+KIND_BACKFILL = "backfill"
+KIND_SNAPSHOT = "snapshot"
+KIND_INTRADAY = "intraday"
+KIND_INTRADAY_MAINTENANCE = "intraday_maintenance"
+# menor = executa antes (dentro da mesma fila); reparo e manutenção do snapshot só rodam com a fila de fetch vazia
+PRIORITIES = {
+    KIND_FETCH: 0,
+    KIND_INTRADAY: 5,
+    KIND_BACKFILL: 10,
+    KIND_SNAPSHOT: 20,
+    KIND_INTRADAY_MAINTENANCE: 20,
+}
+# filas independentes, cada uma com seu worker: o intradiário (minutos) não espera atrás de um
+# fetch diário ou reparo que pode levar horas; a manutenção intradiária fica na mesma fila dele
+LANE_BATCH = "batch"
+LANE_INTRADAY = "intraday"
+LANES = {
+    KIND_INTRADAY: LANE_INTRADAY,
+    KIND_INTRADAY_MAINTENANCE: LANE_INTRADAY,
+}
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    source: str
+    cycle: str
+    status: str = STATUS_PENDING
+    requests: int = 1  # pedidos coalescidos neste job
+    created_at: dt.datetime = field(default_factory=dt.datetime.now)
+    started_at: Optional[dt.datetime] = None
+    finished_at: Optional[dt.datetime] = None
+    progress: RunProgress = field(default_factory=RunProgress)
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    profile: bool = False  # amostrar pilhas durante a execução (SamplingProfiler)
+    profile_report: Optional[ProfileReport] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "source": self.source,
+            "cycle": self.cycle,
+            "status": self.status,
+            "requests": self.requests,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "progress": self.progress.as_dict(),
+            "result": self.result,
+            "error": self.error,
+            "profile": self.profile_report.as_dict() if self.profile_report else self.profile,
+        }
+
+class JobManager:
+    """
+    Filas de execuções por prioridade de tipo (fetch antes de backfill), uma por lane (LANES),
+    cada uma com um único worker: jobs da mesma lane rodam em série, lanes diferentes em
+    paralelo. Um novo pedido enquanto já existe job do mesmo tipo pendente ou rodando é
+    coalescido nele (mesmo id) em vez de abrir uma execução paralela. Mantém os últimos
+    `history` jobs.
+    """
+
+    def __init__(self, runners: Dict[str, Callable[[str, RunProgress], RunStats]], history: int = 100):
+        self._runners = runners
+        self._history = history
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queues: "Dict[str, queue.PriorityQueue[Tuple[int, int, Optional[Job]]]]" = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._workers: Dict[str, threading.Thread] = {}
+
+    def _ensure_worker(self, lane: str) -> "queue.PriorityQueue[Tuple[int, int, Optional[Job]]]":
+        q = self._queues.setdefault(lane, queue.PriorityQueue())
+        worker = self._workers.get(lane)
+        if worker is None or not worker.is_alive():
+            worker = threading.Thread(target=self._loop, args=(q,), name=f"jobs-{lane}", daemon=True)
+            self._workers[lane] = worker
+            worker.start()
+        return q
+
+    def submit(self, cycle: str, source: str = "api", kind: str = KIND_FETCH, profile: bool = False) -> Tuple[Job, bool]:
+        """
+        Enfileira um job `kind` para o ciclo `cycle` (ou coalesce no ativo). Retorna (job, coalescido).
+        `profile=True` liga o profiler por amostragem só nessa execução (num job já iniciado não tem efeito).
+        """
+        if kind not in self._runners:
+            raise ValueError(f"Tipo de job desconhecido: {kind!r}")
+        with self._lock:
+            # job com cancelamento pedido ainda aparece como ativo até o runner desenrolar: não coalescer nele
+            active = next(
+                (
+                    j for j in self._jobs.values()
+                    if j.kind == kind and j.status in ACTIVE_STATUSES and not j.progress.cancel_event.is_set()
+                ),
+                None,
+            )
+            if active is not None:
+                active.requests += 1
+                if profile and active.status == STATUS_PENDING:
+                    active.profile = True
+                log.info(f"Pedido de execução ({source}) coalescido no job {active.id} ({active.status}).")
+                return active, True
+            job = Job(id=uuid.uuid4().hex, kind=kind, source=source, cycle=cycle, profile=profile)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self._history:
+                self._jobs.popitem(last=False)
+            q = self._ensure_worker(LANES.get(kind, LANE_BATCH))
+        q.put((PRIORITIES.get(kind, 0), next(self._seq), job))
+        return job, False
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status == STATUS_PENDING:
+                job.status = STATUS_CANCELLED
+                job.finished_at = dt.datetime.now()
+            job.progress.cancel_event.set()
+            return job
+
+    def shutdown(self) -> None:
+        with self._lock:
+            for job in self._jobs.values():
+                if job.status in ACTIVE_STATUSES:
+                    job.progress.cancel_event.set()
+            queues = list(self._queues.values())
+        for q in queues:
+            q.put((-1, next(self._seq), None))
+
+    def _loop(self, q: "queue.PriorityQueue[Tuple[int, int, Optional[Job]]]") -> None:
+        while True:
+            _, _, job = q.get()
+            if job is None:
+                return
+            with self._lock:
+                if job.status != STATUS_PENDING:
+                    continue
+                job.status = STATUS_RUNNING
+                job.started_at = dt.datetime.now()
+            _JOB_QUEUE_SECONDS.observe((job.started_at - job.created_at).total_seconds(), kind=job.kind)
+            t0 = time.perf_counter()
+            profiler = None
+            if job.profile:
+                cfg = settings.observability
+                profiler = SamplingProfiler(cfg.profile_interval_ms / 1000.0, max_stacks=cfg.profile_max_stacks).start()
+            try:
+                stats = self._runners[job.kind](job.cycle, job.progress)
+                job.result = stats.as_dict()
+                job.status = STATUS_SUCCEEDED
+                log.info(
+                    f"Job {job.id} finalizado. processados={stats.processed} inseridos={stats.inserted} "
+                    f"atualizados={stats.updated} inalterados={stats.unchanged} tempo={stats.elapsed_seconds:.1f}s"
+                )
+            except RunCancelled:
+                job.status = STATUS_CANCELLED
+                log.info(f"Job {job.id} cancelado.")
+            except Exception as e:
+                job.status = STATUS_FAILED
+                job.error = str(e)
+                log.exception(f"Job {job.id} falhou: {e}")
+            finally:
+                if profiler is not None:
+                    job.profile_report = profiler.stop()
+                job.progress.set(stage="done")
+                job.finished_at = dt.datetime.now()
+                _JOB_SECONDS.observe(time.perf_counter() - t0, kind=job.kind, status=job.status)
+                _JOBS.inc(kind=job.kind, status=job.status)
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+def get_job_manager() -> JobManager:
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            from src.services.coordination_service import run_backfill, run_coordinated
+            from src.services.snapshot_service import run_maintenance
+            from src.services.intraday_service import run_intraday, run_intraday_maintenance
+            _manager = JobManager({
+                KIND_FETCH: run_coordinated,
+                KIND_BACKFILL: run_backfill,
+                KIND_SNAPSHOT: run_maintenance,
+                KIND_INTRADAY: run_intraday,
+                KIND_INTRADAY_MAINTENANCE: run_intraday_maintenance,
+            })
+        return _manager
+
+def shutdown_job_manager() -> None:
+    """Para o JobManager se ele já foi criado (não cria um só para desligá-lo)."""
+    with _manager_lock:
+        manager = _manager
+    if manager is not None:
+        manager.shutdown()
@@ -0,0 +1,262 @@
+from __future__ import annotations
+import logging
+import math
+import uuid
+import datetime as dt
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Date, select, delete, func, and_, true, values, column, union_all
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Session
+
+from src.infra.bulk_loader import CONFLICT_UPDATE, bulk_load
+from src.infra.config import get_settings
+from src.infra.db import get_session
+from src.models.tables import asset, asset_history, asset_metrics
+
+log = logging.getLogger(__name__)
+settings = get_settings()
+
+SMA_SHORT = 20
+SMA_LONG = 50
+VOL_WINDOW = 20
+TRADING_DAYS_PER_YEAR = 252
+# barras anteriores necessárias para recalcular a partir de uma data (maior janela)
+LOOKBACK_BARS = max(SMA_LONG, VOL_WINDOW + 1)
+
+METRIC_COLUMNS = ["ret_1d", "log_ret_1d", "sma_20", "sma_50", "vol_20", "tr_index"]
+
+@dataclass
+class MetricsWork:
+    """Ativos a recalcular: a partir de uma data (incremental) ou None (histórico inteiro)."""
+    since: Dict[uuid.UUID, Optional[dt.date]] = field(default_factory=dict)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, full: bool = False) -> "MetricsWork":
+        first = df.groupby("asset", sort=False)["price_date"].min()
+        return cls({a_id: (None if full else d) for a_id, d in first.items()})
+
+# ----------------- Cálculo vetorizado -----------------
+
+def _group_starts(codes: np.ndarray) -> np.ndarray:
+    """Para cada linha, o índice da primeira linha do seu grupo (linhas ordenadas por grupo)."""
+    first = np.ones(len(codes), dtype=bool)
+    first[1:] = codes[1:] != codes[:-1]
+    return np.maximum.accumulate(np.where(first, np.arange(len(codes)), 0))
+
+def _rolling_sum(x: np.ndarray, gs: np.ndarray, window: int, min_start: np.ndarray) -> np.ndarray:
+    """Soma móvel por grupo; NaN onde a janela sai do grupo ou começa antes de `min_start`."""
+    c = np.concatenate(([0.0], np.cumsum(x)))
+    i = np.arange(len(x))
+    lo = i - window + 1
+    ok = lo >= np.maximum(gs, min_start)
+    out = np.full(len(x), np.nan)
+    out[ok] = c[i[ok] + 1] - c[lo[ok]]
+    return out
+
+def _group_cumsum(x: np.ndarray, gs: np.ndarray) -> np.ndarray:
+    c = np.cumsum(x)
+    base = np.concatenate(([0.0], c))[gs]
+    return c - base
+
+def compute_metrics(
+    codes: np.ndarray,
+    close: np.ndarray,
+    dividends: np.ndarray,
+    write_from: np.ndarray,
+    tr_seed: np.ndarray,
+    include_dividends: bool,
+) -> Dict[str, np.ndarray]:
+    """
+    Calcula as métricas para várias séries concatenadas (ordenadas por ativo e data).
+
+    `codes` identifica o ativo de cada linha; `write_from[i]` é True a partir da primeira
+    linha a gravar do ativo (as anteriores são só lookback); `tr_seed[i]` é o índice de retorno
+    total da barra imediatamente anterior à primeira linha a gravar (1.0 sem histórico anterior).
+    Com auto_adjust o close já incorpora os dividendos; sem ele, `include_dividends` os soma.
+    """
+    n = len(close)
+    gs = _group_starts(codes)
+    idx = np.arange(n)
+
+    prev_close = np.empty(n)
+    prev_close[0:1] = np.nan
+    prev_close[1:] = close[:-1]
+    prev_close[idx == gs] = np.nan
+    numer = close + dividends if include_dividends else close
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gross = numer / prev_close
+    gross[~np.isfinite(gross) | (gross <= 0)] = np.nan
+    ret = gross - 1.0
+    log_ret = np.log(gross)
+
+    no_start = np.zeros(n, dtype=np.int64)
+    sma_short = _rolling_sum(np.nan_to_num(close), gs, SMA_SHORT, no_start) / SMA_SHORT
+    sma_long = _rolling_sum(np.nan_to_num(close), gs, SMA_LONG, no_start) / SMA_LONG
+
+    # log-retorno só existe a partir da 2ª linha do grupo
+    lr = np.nan_to_num(log_ret)
+    s1 = _rolling_sum(lr, gs, VOL_WINDOW, gs + 1)
+    s2 = _rolling_sum(lr * lr, gs, VOL_WINDOW, gs + 1)
+    var = np.maximum(0.0, (s2 - s1 * s1 / VOL_WINDOW) / (VOL_WINDOW - 1))
+    vol = np.sqrt(var) * math.sqrt(TRADING_DAYS_PER_YEAR)
+
+    # retorno total: encadeia a partir da semente só nas linhas gravadas
+    # (a primeira barra do histórico não tem retorno, então o índice começa na semente)
+    step = np.where(write_from, lr, 0.0)
+    tr = tr_seed * np.exp(_group_cumsum(step, gs))
+
+    return {
+        "ret_1d": ret,
+        "log_ret_1d": log_ret,
+        "sma_20": sma_short,
+        "sma_50": sma_long,
+        "vol_20": vol,
+        "tr_index": tr,
+    }
+
+# ----------------- Banco -----------------
+
+def _since_values(pairs: List[tuple]):
+    return values(
+        column("asset", UUID(as_uuid=True)), column("since", Date), name="v"
+    ).data(pairs)
+
+def _check_seeds(session: Session, since: Dict[uuid.UUID, dt.date]) -> Dict[uuid.UUID, Optional[float]]:
+    """
+    Para cada ativo, o tr_index gravado na barra imediatamente anterior a `since`.
+    1.0 se `since` é a primeira barra do ativo; None se a métrica anterior está faltando
+    (o ativo precisa ser recalculado por inteiro).
+    """
+    v = _since_values(list(since.items()))
+    prev = (
+        select(func.max(asset_history.c.price_date).label("prev_date"))
+        .where(asset_history.c.asset == v.c.asset, asset_history.c.price_date < v.c.since)
+        .lateral("p")
+    )
+    rows = session.execute(
+        select(v.c.asset, prev.c.prev_date, asset_metrics.c.tr_index)
+        .select_from(
+            v.join(prev, true()).outerjoin(
+                asset_metrics,
+                and_(asset_metrics.c.asset == v.c.asset, asset_metrics.c.price_date == prev.c.prev_date),
+            )
+        )
+    ).fetchall()
+    out: Dict[uuid.UUID, Optional[float]] = {}
+    for a_id, prev_date, tr in rows:
+        out[a_id] = 1.0 if prev_date is None else (float(tr) if tr is not None else None)
+    return out
+
+def _load_closes(session: Session, since: Dict[uuid.UUID, dt.date], lookback: int = LOOKBACK_BARS) -> pd.DataFrame:
+    """
+    Barras de cada ativo a partir de `since` mais as `lookback` imediatamente anteriores
+    (LATERAL ... ORDER BY price_date DESC LIMIT), independentemente de feriados ou buracos.
+    """
+    v = _since_values(list(since.items()))
+    cols = (asset_history.c.asset, asset_history.c.price_date, asset_history.c.close_price, asset_history.c.dividends)
+    new = select(*cols).select_from(
+        asset_history.join(v, and_(asset_history.c.asset == v.c.asset, asset_history.c.price_date >= v.c.since))
+    )
+    prev = (
+        select(*cols)
+        .where(asset_history.c.asset == v.c.asset, asset_history.c.price_date < v.c.since)
+        .order_by(asset_history.c.price_date.desc())
+        .limit(lookback)
+        .lateral("p")
+    )
+    both = union_all(new, select(*prev.c).select_from(v.join(prev, true()))).subquery("b")
+    rows = session.execute(select(both).order_by(both.c.asset, both.c.price_date)).fetchall()
+    df = pd.DataFrame(rows, columns=["asset", "price_date", "close_price", "dividends"])
+    df["close_price"] = pd.to_numeric(df["close_price"], errors="coerce").astype("float64")
+    df["dividends"] = pd.to_numeric(df["dividends"], errors="coerce").fillna(0.0).astype("float64")
+    return df
+
+def update_metrics(session: Session, work: MetricsWork) -> int:
+    """
+    Recalcula asset_metrics dos ativos de `work`: a partir da data indicada (lendo só as
+    barras novas + LOOKBACK_BARS anteriores) ou do histórico inteiro. Um ativo cuja métrica
+    da barra anterior está faltando é recalculado por inteiro. Não faz commit. Retorna linhas gravadas.
+    """
+    since = {a: d for a, d in work.since.items() if a is not None}
+    if not since:
+        return 0
+    incremental = {a: d for a, d in since.items() if d is not None}
+    seeds = _check_seeds(session, incremental) if incremental else {}
+    full = {a for a, d in since.items() if d is None or seeds.get(a) is None}
+
+    if full:
+        session.execute(delete(asset_metrics).where(asset_metrics.c.asset.in_(list(full))))
+    df = _load_closes(session, {a: (dt.date.min if a in full else d) for a, d in since.items()})
+    if not len(df):
+        return 0
+
+    codes = pd.factorize(df["asset"])[0]
+    write_start = np.array([dt.date.min if a in full else since[a] for a in df["asset"]], dtype=object)
+    write_from = (df["price_date"].to_numpy(dtype=object) >= write_start).astype(bool)
+    tr_seed = np.array([1.0 if a in full else seeds[a] for a in df["asset"]], dtype="float64")
+    m = compute_metrics(
+        codes,
+        df["close_price"].to_numpy(),
+        df["dividends"].to_numpy(),
+        write_from,
+        tr_seed,
+        include_dividends=not settings.app.auto_adjust,
+    )
+    out = df.loc[write_from, ["asset", "price_date"]].copy()
+    for c in METRIC_COLUMNS:
+        out[c] = m[c][write_from]
+    load = bulk_load(
+        session, asset_metrics, out,
+        key_columns=("asset", "price_date"),
+        mode=settings.persist.mode,
+        batch_size=settings.persist.insert_batch_size,
+        on_conflict=CONFLICT_UPDATE,
+    )
+    if full:
+        log.info(f"asset_metrics recalculado por inteiro para {len(full)} ativo(s).")
+    return load.inserted + load.updated
+
+def read_metrics(
+    session: Session, asset_id: uuid.UUID, start: Optional[dt.date] = None, end: Optional[dt.date] = None, limit: int = 5000,
+) -> List[dict]:
+    """Métricas do ativo em ordem de data (as `limit` mais recentes do intervalo)."""
+    stmt = select(asset_metrics.c.price_date, *[asset_metrics.c[c] for c in METRIC_COLUMNS]).where(
+        asset_metrics.c.asset == asset_id
+    )
+    if start is not None:
+        stmt = stmt.where(asset_metrics.c.price_date >= start)
+    if end is not None:
+        stmt = stmt.where(asset_metrics.c.price_date <= end)
+    rows = session.execute(stmt.order_by(asset_metrics.c.price_date.desc()).limit(limit)).fetchall()
+    return [
+        {"date": r[0].isoformat(), **{c: (None if v is None or (isinstance(v, float) and math.isnan(v)) else float(v))
+                                       for c, v in zip(METRIC_COLUMNS, r[1:])}}
+        for r in reversed(rows)
+    ]
+
+# ----------------- API -----------------
+
+def _asset_id(session: Session, ticker: str) -> Optional[uuid.UUID]:
+    return session.execute(select(asset.c.id).where(asset.c.ticker == ticker.strip().upper())).scalar()
+
+def metrics_for_ticker(ticker: str, start: Optional[dt.date] = None, end: Optional[dt.date] = None) -> Optional[List[dict]]:
+    """Séries derivadas do ticker; None se o ticker não existe."""
+    with get_session() as s:
+        a_id = _asset_id(s, ticker)
+        if a_id is None:
+            return None
+        return read_metrics(s, a_id, start, end)
+
+def rebuild_metrics(ticker: str) -> Optional[int]:
+    """Recalcula do zero as séries derivadas do ticker. Retorna as linhas gravadas (None se o ticker não existe)."""
+    with get_session() as s:
+        a_id = _asset_id(s, ticker)
+        if a_id is None:
+            return None
+        rows = update_metrics(s, MetricsWork({a_id: None}))
+        s.commit()
+        return rows
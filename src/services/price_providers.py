@@ -0,0 +1,272 @@
+from __future__ import annotations
+import logging
+import random
+import threading
+import time
+import zlib
+import datetime as dt
+from typing import List, Optional, Protocol
+
+import numpy as np
+import pandas as pd
+
+from src.infra.resilience import ThrottledError
+
+log = logging.getLogger(__name__)
+
+_FIELDS = ["Open", "High", "Low", "Close", "Volume", "Dividends", "Stock Splits"]
+
+_THROTTLE_MARKERS = ("rate limit", "too many requests", "429")
+
+def is_throttle_error(e: BaseException) -> bool:
+    if isinstance(e, ThrottledError) or "RateLimit" in type(e).__name__:
+        return True
+    msg = str(e).lower()
+    return any(m in msg for m in _THROTTLE_MARKERS)
+
+_TRANSIENT_NAMES = ("Timeout", "ConnectionError", "ProxyError", "ChunkedEncodingError")
+_TRANSIENT_MARKERS = (
+    "timed out", "timeout", "connection reset", "connection refused", "connection aborted",
+    "temporarily unavailable", "bad gateway", "service unavailable", "gateway timeout", "internal server error",
+)
+
+def is_transient_error(e: BaseException) -> bool:
+    """
+    Falha do provedor (rede, HTTP 5xx, throttling), que passa com o tempo: vale repetir e conta
+    para o circuit breaker. Os demais erros são do pedido (símbolo inválido ou deslistado,
+    resposta malformada) e se repetem igual a cada tentativa.
+    """
+    if is_throttle_error(e) or isinstance(e, (ConnectionError, TimeoutError)):
+        return True
+    if any(n in type(e).__name__ for n in _TRANSIENT_NAMES):
+        return True
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status >= 500
+    msg = str(e).lower()
+    return any(m in msg for m in _TRANSIENT_MARKERS)
+
+class PriceProvider(Protocol):
+    """
+    Fonte de preços. `download` devolve um DataFrame no formato do `yf.download(group_by="column")`:
+    índice de datas e colunas MultiIndex (campo, símbolo).
+    """
+
+    def download(
+        self,
+        symbols: List[str],
+        *,
+        start=None,
+        end=None,
+        period: Optional[str] = None,
+        interval: str = "1d",
+        auto_adjust: bool = True,
+        actions: bool = True,
+    ) -> pd.DataFrame: ...
+
+class YahooProvider:
+    """
+    Provedor real (yfinance). O `yf.download` guarda estado em variáveis globais do módulo
+    (`yf.shared`), então chamadas concorrentes se corrompem: serializamos com um lock e
+    deixamos o paralelismo por ticker para o próprio yfinance (`threads=True`).
+    """
+
+    _lock = threading.Lock()
+
+    def download(self, symbols, *, start=None, end=None, period=None, interval="1d", auto_adjust=True, actions=True):
+        # yfinance (e suas dependências de rede/parsing) só é carregado na primeira chamada
+        import yfinance as yf
+
+        with self._lock:
+            df = yf.download(
+                symbols,
+                period=period,
+                interval=interval,
+                start=start,
+                end=end,
+                auto_adjust=auto_adjust,
+                actions=actions,
+                group_by="column",
+                threads=True,
+                progress=False,
+            )
+            errors = dict(getattr(getattr(yf, "shared", None), "_ERRORS", {}) or {})
+        # yf.download não lança exceção: erros por ticker ficam em yf.shared._ERRORS
+        throttled = [s for s, msg in errors.items() if is_throttle_error(Exception(str(msg)))]
+        if throttled:
+            raise ThrottledError(f"Yahoo limitou requisições para {len(throttled)} de {len(symbols)} símbolos.")
+        # demais erros são por símbolo (ex.: deslistado): seguem junto do frame
+        df.attrs["errors"] = {s: str(msg) for s, msg in errors.items() if s in symbols}
+        return df
+
+class FakeProvider:
+    """
+    Provedor local para testes: gera barras de passeio aleatório e injeta latência,
+    erros e throttling com as taxas configuradas. Sem rede.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        seed: Optional[int] = None,
+        bad_symbols: Optional[List[str]] = None,
+        latency_per_symbol_ms: float = 0.0,
+    ):
+        # latência de cada chamada: fixa + por símbolo (o yfinance faz uma requisição por ticker)
+        self.latency_ms = float(latency_ms)
+        self.latency_per_symbol_ms = float(latency_per_symbol_ms)
+        self.error_rate = float(error_rate)
+        self.throttle_rate = float(throttle_rate)
+        # símbolos "quebrados": qualquer download que os contenha falha (para testar a bisseção)
+        self.bad_symbols = set(bad_symbols or [])
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _dates(self, start, end, period, interval: str = "1d") -> pd.DatetimeIndex:
+        end_d = pd.Timestamp(end) if end is not None else pd.Timestamp(dt.date.today())
+        if start is not None:
+            start_d = pd.Timestamp(start)
+        else:
+            years = 20 if period in (None, "max") else 1
+            start_d = end_d - pd.DateOffset(years=years)
+        days = pd.bdate_range(start_d, end_d, name="Date")
+        if interval[-1:] not in ("m", "h"):
+            return days
+        # intradiário: barras de 10:00 a 18:00 (horário de Brasília) em cada dia útil, como o yfinance
+        step = pd.Timedelta(int(interval[:-1]), unit="min" if interval.endswith("m") else "h")
+        offsets = pd.timedelta_range(pd.Timedelta(hours=10), pd.Timedelta(hours=18) - step, freq=step)
+        stamps = (days.values[:, None] + offsets.values[None, :]).ravel()
+        return pd.DatetimeIndex(stamps, name="Datetime").tz_localize("America/Sao_Paulo")
+
+    def download(self, symbols, *, start=None, end=None, period=None, interval="1d", auto_adjust=True, actions=True):
+        symbols = list(symbols)
+        with self._lock:
+            self.calls += 1
+            roll = self._rng.random()
+            seed = self._rng.randrange(2**31)
+        latency = self.latency_ms + self.latency_per_symbol_ms * len(symbols)
+        if latency:
+            time.sleep(latency / 1000.0)
+        if roll < self.throttle_rate:
+            raise ThrottledError("429 Too Many Requests (simulado)")
+        if roll < self.throttle_rate + self.error_rate:
+            raise ConnectionError("Falha transitória simulada")
+        bad = self.bad_symbols.intersection(symbols)
+        if bad:
+            raise KeyError(f"Símbolo(s) inválido(s) simulado(s): {sorted(bad)}")
+
+        return self._frame(symbols, self._dates(start, end, period, interval), seed, auto_adjust)
+
+    def _frame(self, symbols: List[str], idx: pd.DatetimeIndex, seed: int, auto_adjust: bool) -> pd.DataFrame:
+        rng = np.random.default_rng(seed)
+        n, m = len(idx), len(symbols)
+        close = 20.0 * np.exp(np.cumsum(rng.normal(0, 0.02, size=(n, m)), axis=0))
+        data = {
+            "Open": close * (1 + rng.normal(0, 0.005, size=(n, m))),
+            "High": close * 1.01,
+            "Low": close * 0.99,
+            "Close": close,
+            "Volume": rng.integers(0, 10_000_000, size=(n, m)).astype("float64"),
+            "Dividends": np.zeros((n, m)),
+            "Stock Splits": np.zeros((n, m)),
+        }
+        frames = {f: pd.DataFrame(data[f], index=idx, columns=symbols) for f in _FIELDS}
+        return pd.concat(frames, axis=1)
+
+class SyntheticProvider(FakeProvider):
+    """
+    Provedor sintético determinístico (benchmarks): a série diária de cada símbolo depende só de
+    (`seed`, símbolo) e é gerada desde `epoch`, então qualquer janela pedida devolve as mesmas
+    barras e um ciclo incremental encaixa no backfill anterior, como no Yahoo.
+
+    Cada símbolo tem data de listagem, preço inicial e volatilidade próprios; uma fração paga
+    dividendos trimestrais e outra tem desdobramentos raros. Com `auto_adjust` os preços (e os
+    dividendos) anteriores a cada evento até o fim da janela são ajustados como no Yahoo, de modo
+    que um evento novo muda o histórico e exercita o reajuste. Barras intradiárias usam o passeio
+    aleatório do FakeProvider. Latência, erros e throttling como no FakeProvider.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        seed: Optional[int] = None,
+        bad_symbols: Optional[List[str]] = None,
+        latency_per_symbol_ms: float = 0.0,
+        epoch: dt.date = dt.date(2005, 1, 3),
+        dividend_share: float = 0.5,
+        split_share: float = 0.1,
+    ):
+        super().__init__(latency_ms, error_rate, throttle_rate, seed, bad_symbols, latency_per_symbol_ms)
+        self.seed = 0 if seed is None else int(seed)
+        self.epoch = pd.Timestamp(epoch)
+        self.dividend_share = float(dividend_share)
+        self.split_share = float(split_share)
+
+    def _series(self, symbol: str, n: int, auto_adjust: bool) -> np.ndarray:
+        """
+        Barras do símbolo nos `n` primeiros dias úteis desde `epoch`, matriz (n, len(_FIELDS)).
+        Cada componente vem de um gerador próprio: os primeiros `n` valores não mudam quando
+        `n` cresce, então a série de ontem é prefixo da de hoje.
+        """
+        key = zlib.crc32(symbol.encode())
+        streams = [np.random.default_rng([self.seed, key, k]) for k in range(5)]
+        params = streams[0]
+        listed = int(params.integers(0, 750))  # parte dos ativos estreia até ~3 anos depois de `epoch`
+        base = params.uniform(5.0, 150.0)
+        sigma = params.uniform(0.01, 0.035)
+        pays = params.random() < self.dividend_share
+        div_yield = params.uniform(0.005, 0.02)
+        div_phase = int(params.integers(0, 63))
+        splits_ok = params.random() < self.split_share
+
+        ret = streams[1].normal(0.0002, sigma, n)
+        noise = streams[2].normal(0.0, 1.0, (n, 3))
+        volume = np.floor(streams[3].lognormal(13.0, 1.0, n))
+        split_roll = streams[4].random(n)
+
+        ratio = np.ones(n)
+        if splits_ok:
+            hit = split_roll < 1 / 1500
+            ratio[hit] = np.where(split_roll[hit] < 1 / 3000, 2.0, 4.0)
+        ratio[:listed + 1] = 1.0
+        close = base * np.exp(np.cumsum(ret)) / np.cumprod(ratio)
+        prev = np.concatenate(([close[0]], close[:-1]))
+        open_ = prev * (1 + 0.005 * noise[:, 0])
+        high = np.maximum(open_, close) * (1 + 0.004 * np.abs(noise[:, 1]))
+        low = np.minimum(open_, close) * (1 - 0.004 * np.abs(noise[:, 2]))
+
+        dividends = np.zeros(n)
+        if pays:
+            days = np.arange(n)
+            paid = ((days - div_phase) % 63 == 0) & (days > listed)
+            dividends[paid] = np.round(prev[paid] * div_yield, 4)
+
+        if auto_adjust:
+            # fator de cada evento (Yahoo): desdobramento 1/razão, dividendo 1 - div/fechamento anterior;
+            # o preço de cada dia é multiplicado pelos fatores dos eventos posteriores
+            factor = (1.0 - dividends / prev) / ratio
+            after = np.concatenate((np.cumprod(factor[::-1])[::-1][1:], [1.0]))
+            split_after = np.concatenate((np.cumprod((1.0 / ratio)[::-1])[::-1][1:], [1.0]))
+            open_, high, low, close = open_ * after, high * after, low * after, close * after
+            dividends = dividends * split_after
+        out = np.column_stack([open_, high, low, close, volume, dividends, np.where(ratio != 1.0, ratio, 0.0)])
+        out[:listed] = np.nan
+        return out
+
+    def _frame(self, symbols: List[str], idx: pd.DatetimeIndex, seed: int, auto_adjust: bool) -> pd.DataFrame:
+        if idx.tz is not None:
+            return super()._frame(symbols, idx, seed, auto_adjust)
+        idx = idx[idx >= self.epoch]
+        data = np.full((len(_FIELDS), len(idx), len(symbols)), np.nan)
+        if len(idx):
+            pos = pd.bdate_range(self.epoch, idx[-1]).get_indexer(idx)
+            n = int(pos[-1]) + 1
+            for j, sym in enumerate(symbols):
+                data[:, :, j] = self._series(sym, n, auto_adjust)[pos].T
+        frames = {f: pd.DataFrame(data[i], index=idx, columns=symbols) for i, f in enumerate(_FIELDS)}
+        return pd.concat(frames, axis=1)
@@ -0,0 +1,219 @@
+from __future__ import annotations
+import logging
+import math
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import select, true
+
+from src.infra.cache import CacheBackend, InMemoryBackend, RedisBackend, SingleFlight, TTLCache
+from src.infra.config import get_settings
+from src.infra.db import get_session
+from src.models.tables import asset, asset_history
+
+if TYPE_CHECKING:
+    # só anotações: a API de cotações não carrega pandas (os frames chegam do job de fetch)
+    import pandas as pd
+
+log = logging.getLogger(__name__)
+settings = get_settings()
+
+_QUOTE_FIELDS = [
+    ("open_price", "open"),
+    ("high_price", "high"),
+    ("low_price", "low"),
+    ("close_price", "close"),
+    ("volume", "volume"),
+    ("dividends", "dividends"),
+    ("splits", "splits"),
+]
+
+# ----------------- Helpers -----------------
+
+def _normalize_ticker(ticker: str) -> str:
+    t = (ticker or "").strip().upper()
+    return t[:-3] if t.endswith(".SA") else t
+
+def _key(ticker: str) -> str:
+    return f"quote:{ticker}"
+
+# marcador no cache local de ticker sem cotação no banco (evita uma consulta por polling)
+_NOT_FOUND = {}
+
+def _num(v):
+    """Converte Decimal/numpy/NaN/pd.NA para tipos JSON (float/int/None)."""
+    if v is None:
+        return None
+    if isinstance(v, int):
+        return v
+    try:
+        f = float(v)
+    except TypeError:  # pd.NA
+        return None
+    return None if math.isnan(f) else f
+
+def _to_quote(ticker: str, price_date, values: dict) -> dict:
+    q = {"ticker": ticker, "price_date": price_date.isoformat() if price_date is not None else None}
+    for col, out in _QUOTE_FIELDS:
+        v = _num(values.get(col))
+        q[out] = int(v) if out == "volume" and v is not None else v
+    return q
+
+def _load_latest_from_db(tickers: List[str]) -> Dict[str, dict]:
+    """Última linha de asset_history por ticker (LATERAL + LIMIT 1 sobre a PK (asset, price_date))."""
+    latest = (
+        select(asset_history)
+        .where(asset_history.c.asset == asset.c.id)
+        .order_by(asset_history.c.price_date.desc())
+        .limit(1)
+        .lateral("latest")
+    )
+    q = (
+        select(asset.c.ticker, latest)
+        .select_from(asset.join(latest, true()))
+        .where(asset.c.ticker.in_(tickers))
+    )
+    with get_session() as s:
+        rows = s.execute(q).mappings().all()
+    out = {}
+    for r in rows:
+        tk = _normalize_ticker(r["ticker"])
+        out[tk] = _to_quote(tk, r["price_date"], r)
+    return out
+
+def quotes_from_frame(df: pd.DataFrame) -> List[dict]:
+    """Extrai a barra mais recente de cada ticker de um frame normalizado (formato longo)."""
+    if df is None or len(df) == 0:
+        return []
+    cols = ["ticker", "price_date"] + [c for c, _ in _QUOTE_FIELDS if c in df.columns]
+    last = df[cols].sort_values("price_date").drop_duplicates("ticker", keep="last")
+    return [_to_quote(_normalize_ticker(r["ticker"]), r["price_date"], r) for r in last.to_dict("records")]
+
+# ----------------- Serviço -----------------
+
+class QuoteService:
+    """
+    Cotação atual por ticker em duas camadas: cache local (TTL + LRU) e, opcionalmente,
+    um backend compartilhado (ex.: Redis). Falhas de cache caem no banco, com coalescência
+    de consultas simultâneas para o mesmo ticker.
+    """
+
+    def __init__(
+        self,
+        local: TTLCache,
+        shared: Optional[CacheBackend],
+        shared_ttl_seconds: int,
+        loader: Callable[[List[str]], Dict[str, dict]] = _load_latest_from_db,
+        negative_ttl_seconds: float = 0.0,
+    ):
+        self.local = local
+        self.shared = shared
+        self.shared_ttl_seconds = shared_ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._loader = loader
+        self._flight = SingleFlight()
+
+    def get_many(self, tickers: Iterable[str]) -> Dict[str, dict]:
+        wanted = [t for t in dict.fromkeys(_normalize_ticker(t) for t in tickers) if t]
+        out: Dict[str, dict] = {}
+        missing: List[str] = []
+        for t in wanted:
+            q = self.local.get(_key(t))
+            if q is None:
+                missing.append(t)
+            elif q is not _NOT_FOUND:
+                out[t] = q
+
+        if missing and self.shared is not None:
+            try:
+                found = self.shared.get_many([_key(t) for t in missing])
+            except Exception as e:
+                log.warning(f"Falha ao ler cache compartilhado de cotações: {e}")
+                found = {}
+            for t in list(missing):
+                q = found.get(_key(t))
+                if q is not None:
+                    self.local.set(_key(t), q)
+                    out[t] = q
+                    missing.remove(t)
+
+        if missing:
+            loaded = self._flight.do_many(missing, self._load_and_fill)
+            out.update({t: q for t, q in loaded.items() if q is not None})
+        return out
+
+    def get(self, ticker: str) -> Optional[dict]:
+        return self.get_many([ticker]).get(_normalize_ticker(ticker))
+
+    def _load_and_fill(self, tickers: List[str]) -> Dict[str, dict]:
+        loaded = self._loader(tickers)
+        self._fill(loaded)
+        if self.negative_ttl_seconds > 0:
+            # só no cache local: o ticker pode ganhar cotação no próximo fetch (publish sobrescreve)
+            for t in tickers:
+                if t not in loaded:
+                    self.local.set(_key(t), _NOT_FOUND, ttl_seconds=self.negative_ttl_seconds)
+        return loaded
+
+    def _fill(self, quotes: Dict[str, dict]) -> None:
+        for t, q in quotes.items():
+            self.local.set(_key(t), q)
+        if quotes and self.shared is not None:
+            try:
+                self.shared.set_many({_key(t): q for t, q in quotes.items()}, self.shared_ttl_seconds)
+            except Exception as e:
+                log.warning(f"Falha ao gravar cache compartilhado de cotações: {e}")
+
+    def publish(self, quotes: Iterable[dict]) -> int:
+        """
+        Atualiza o cache com barras recém-persistidas. Não regride: uma barra mais antiga
+        que a já cacheada (ex.: reprocessamento de histórico) é ignorada.
+        """
+        fresh: Dict[str, dict] = {}
+        for q in quotes:
+            t = q["ticker"]
+            cur = self.local.get(_key(t))
+            if cur and (cur.get("price_date") or "") > (q.get("price_date") or ""):
+                continue
+            fresh[t] = q
+        self._fill(fresh)
+        return len(fresh)
+
+    def invalidate(self, tickers: Iterable[str]) -> None:
+        keys = [_key(_normalize_ticker(t)) for t in tickers]
+        for k in keys:
+            self.local.delete(k)
+        if keys and self.shared is not None:
+            try:
+                self.shared.delete_many(keys)
+            except Exception as e:
+                log.warning(f"Falha ao invalidar cache compartilhado de cotações: {e}")
+
+_service: Optional[QuoteService] = None
+
+def _build_shared_backend() -> Optional[CacheBackend]:
+    cfg = settings.quotes
+    if cfg.backend == "redis":
+        return RedisBackend(cfg.redis_url, prefix=f"{settings.app.service_name}:")
+    if cfg.backend == "memory":
+        return InMemoryBackend()
+    return None
+
+def get_quote_service() -> QuoteService:
+    global _service
+    if _service is None:
+        cfg = settings.quotes
+        _service = QuoteService(
+            local=TTLCache(max_entries=cfg.max_entries, ttl_seconds=cfg.ttl_seconds),
+            shared=_build_shared_backend(),
+            shared_ttl_seconds=cfg.shared_ttl_seconds,
+            negative_ttl_seconds=cfg.negative_ttl_seconds,
+        )
+    return _service
+
+def publish_from_frame(df: pd.DataFrame) -> None:
+    """Chamado pelo job de fetch após gravar um chunk. Erros de cache não interrompem o job."""
+    try:
+        n = get_quote_service().publish(quotes_from_frame(df))
+        log.debug(f"Cache de cotações atualizado para {n} tickers.")
+    except Exception as e:
+        log.warning(f"Falha ao atualizar cache de cotações: {e}")
@@ -0,0 +1,130 @@
+"""
+Estado e estatísticas de uma execução (fetch, backfill, intraday), compartilhados pelos jobs,
+pela API e pelo engine de download. Sem dependências pesadas: job_service e a API importam daqui
+sem carregar pandas/yfinance, que só entram no processo com o primeiro job.
+"""
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from src.infra.pipeline import StageStats
+
+@dataclass
+class EngineStats:
+    requests: int = 0
+    retries: int = 0
+    throttled: int = 0
+    failures: int = 0
+    rate_wait_seconds: float = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "failures": self.failures,
+            "rate_wait_seconds": round(self.rate_wait_seconds, 3),
+        }
+
+    def since(self, before: "EngineStats") -> "EngineStats":
+        """Diferença em relação a um snapshot anterior (estatísticas de uma execução)."""
+        return EngineStats(**{k: getattr(self, k) - getattr(before, k) for k in self.__dataclass_fields__})
+
+class RunCancelled(Exception):
+    """A execução foi cancelada (ex.: via POST /scheduler/jobs/{id}/cancel)."""
+
+@dataclass
+class RunProgress:
+    """Progresso ao vivo de uma execução; atualizado pelo pipeline e lido pela API de jobs."""
+    stage: str = "pending"
+    shard: Optional[str] = None
+    groups_total: int = 0
+    groups_done: int = 0
+    chunks_total: int = 0
+    chunks_done: int = 0
+    rows_processed: int = 0
+    rows_inserted: int = 0
+    rows_updated: int = 0
+    errors: List[str] = field(default_factory=list)
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    max_errors = 50  # mantém só os últimos erros
+
+    def set(self, **values) -> None:
+        with self._lock:
+            for k, v in values.items():
+                setattr(self, k, v)
+
+    def add(self, **deltas) -> None:
+        with self._lock:
+            for k, v in deltas.items():
+                setattr(self, k, getattr(self, k) + v)
+
+    def add_error(self, message: str) -> None:
+        with self._lock:
+            self.errors.append(message[:500])
+            del self.errors[:-self.max_errors]
+
+    def check_cancelled(self) -> None:
+        if self.cancel_event.is_set():
+            raise RunCancelled("Execução cancelada.")
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "stage": self.stage,
+                "shard": self.shard,
+                "groups_total": self.groups_total,
+                "groups_done": self.groups_done,
+                "chunks_total": self.chunks_total,
+                "chunks_done": self.chunks_done,
+                "rows_processed": self.rows_processed,
+                "rows_inserted": self.rows_inserted,
+                "rows_updated": self.rows_updated,
+                "errors": list(self.errors),
+            }
+
+@dataclass
+class RunStats:
+    processed: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    elapsed_seconds: float = 0.0
+    stages: List[StageStats] = field(default_factory=list)
+    fetch: EngineStats = field(default_factory=EngineStats)
+
+    def as_dict(self) -> dict:
+        return {
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "stages": [st.as_dict() for st in self.stages],
+            "fetch": self.fetch.as_dict(),
+        }
+
+    def merge(self, other: "RunStats") -> None:
+        """Acumula as estatísticas de outra execução (ex.: shards de um mesmo ciclo)."""
+        self.processed += other.processed
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+        self.elapsed_seconds += other.elapsed_seconds
+        by_name = {st.name: st for st in self.stages}
+        for st in other.stages:
+            mine = by_name.get(st.name)
+            if mine is None:
+                mine = StageStats(name=st.name)
+                self.stages.append(mine)
+                by_name[st.name] = mine
+            mine.items += st.items
+            mine.busy_seconds += st.busy_seconds
+            mine.idle_seconds += st.idle_seconds
+            mine.blocked_seconds += st.blocked_seconds
+        for k in self.fetch.__dataclass_fields__:
+            setattr(self.fetch, k, getattr(self.fetch, k) + getattr(other.fetch, k))
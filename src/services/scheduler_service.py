@@ -1,40 +1,178 @@
 from __future__ import annotations
 import logging
+import datetime as dt
+from typing import Optional
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.base import BaseTrigger
 from apscheduler.triggers.interval import IntervalTrigger
-from sqlalchemy.orm import Session
 
-from src.infra.config import load_settings
+from src.infra.config import get_settings
 from src.infra.db import get_session
-from src.services.fetcher_service import fetch_and_persist
+from src.infra.trading_calendar import ExchangeCalendar, get_calendar
+from src.services.coordination_service import scheduled_cycle_key, manual_cycle_key
+from src.services.job_service import (
+    KIND_BACKFILL, KIND_INTRADAY, KIND_INTRADAY_MAINTENANCE, KIND_SNAPSHOT, get_job_manager, shutdown_job_manager,
+)
 
 log = logging.getLogger(__name__)
-settings = load_settings()
+settings = get_settings()
 
 _scheduler: BackgroundScheduler | None = None
 
+class TradingSessionTrigger(BaseTrigger):
+    """
+    Dispara a cada `interval_minutes` durante o pregão (alinhado à abertura), uma vez
+    `settle_delay_minutes` após o fechamento (barra final do dia) e nunca em fins de
+    semana, feriados ou fora do horário. Disparos perdidos não são recuperados.
+    """
+
+    # dias à frente procurados (cobre Carnaval + fim de semana com folga)
+    _HORIZON_DAYS = 15
+
+    def __init__(self, calendar: ExchangeCalendar, interval_minutes: int, settle_delay_minutes: int):
+        self.calendar = calendar
+        self.interval = dt.timedelta(minutes=max(1, int(interval_minutes)))
+        self.settle_delay = dt.timedelta(minutes=max(0, int(settle_delay_minutes)))
+
+    def _fire_times(self, day: dt.date):
+        open_dt, close_dt = self.calendar.session_bounds(day)
+        t = open_dt
+        while t <= close_dt:
+            yield t
+            t += self.interval
+        yield close_dt + self.settle_delay
+
+    def get_next_fire_time(self, previous_fire_time: Optional[dt.datetime], now: dt.datetime) -> Optional[dt.datetime]:
+        threshold = now.astimezone(self.calendar.tz)
+        if previous_fire_time is not None:
+            threshold = max(threshold, previous_fire_time + dt.timedelta(microseconds=1))
+        day = threshold.date()
+        for _ in range(self._HORIZON_DAYS):
+            if self.calendar.is_session(day):
+                for t in self._fire_times(day):
+                    if t >= threshold:
+                        return t
+            day += dt.timedelta(days=1)
+        return None
+
+    def __str__(self) -> str:
+        return f"trading_session[{self.calendar.exchange}, every {self.interval}, settle +{self.settle_delay}]"
+
+def _backfill_wrapper():
+    if settings.gaps.off_hours_only and get_calendar().is_open():
+        return
+    job, coalesced = get_job_manager().submit(manual_cycle_key(), source="scheduler", kind=KIND_BACKFILL)
+    log.info(f"Reparo de buracos {'coalescido no' if coalesced else 'enfileirado como'} job {job.id}.")
+
+def _snapshot_wrapper():
+    job, coalesced = get_job_manager().submit(manual_cycle_key(), source="scheduler", kind=KIND_SNAPSHOT)
+    log.info(f"Manutenção do snapshot {'coalescida no' if coalesced else 'enfileirada como'} job {job.id}.")
+
+def _intraday_wrapper():
+    job, coalesced = get_job_manager().submit(manual_cycle_key(), source="scheduler", kind=KIND_INTRADAY)
+    log.info(f"Ingestão intradiária {'coalescida no' if coalesced else 'enfileirada como'} job {job.id}.")
+
+def _intraday_maintenance_wrapper():
+    job, coalesced = get_job_manager().submit(manual_cycle_key(), source="scheduler", kind=KIND_INTRADAY_MAINTENANCE)
+    log.info(f"Retenção intradiária {'coalescida no' if coalesced else 'enfileirada como'} job {job.id}.")
+
+def _build_trigger(minutes: Optional[int] = None) -> BaseTrigger:
+    minutes = minutes or settings.app.schedule_minutes
+    if settings.calendar.enabled:
+        return TradingSessionTrigger(get_calendar(), minutes, settings.calendar.settle_delay_minutes)
+    return IntervalTrigger(minutes=minutes)
+
 def _job_wrapper():
-    with get_session() as s:  # type: Session
-        processed, inserted = fetch_and_persist(s)
-        log.info(f"Job finalizado. processados={processed} inseridos={inserted}")
+    # enfileira na mesma fila do run-once: se já houver execução ativa, o tick é coalescido nela
+    job, coalesced = get_job_manager().submit(scheduled_cycle_key(), source="scheduler")
+    log.info(f"Ciclo agendado {'coalescido no' if coalesced else 'enfileirado como'} job {job.id}.")
 
 def start_scheduler():
+    from src.services.snapshot_service import snapshot_available
+
     global _scheduler
     if _scheduler and _scheduler.running:
         return _scheduler
     _scheduler = BackgroundScheduler(timezone=settings.app.timezone)
-    _scheduler.add_job(_job_wrapper, IntervalTrigger(minutes=settings.app.schedule_minutes), id="yf_fetch_job", replace_existing=True)
+    trigger = _build_trigger()
+    job = _scheduler.add_job(_job_wrapper, trigger, id="yf_fetch_job", replace_existing=True)
+    if settings.gaps.enabled:
+        _scheduler.add_job(
+            _backfill_wrapper, IntervalTrigger(minutes=settings.gaps.interval_minutes),
+            id="gap_backfill_job", replace_existing=True,
+        )
+    if snapshot_available():
+        _scheduler.add_job(
+            _snapshot_wrapper, IntervalTrigger(minutes=settings.snapshot.maintenance_minutes),
+            id="snapshot_maintenance_job", replace_existing=True,
+        )
+    if settings.intraday.enabled:
+        _scheduler.add_job(
+            _intraday_wrapper, _build_trigger(settings.intraday.schedule_minutes),
+            id="intraday_job", replace_existing=True,
+        )
+        _scheduler.add_job(
+            _intraday_maintenance_wrapper, IntervalTrigger(minutes=settings.intraday.maintenance_minutes),
+            id="intraday_maintenance_job", replace_existing=True,
+        )
     _scheduler.start()
-    log.info(f"Scheduler iniciado (Background). Intervalo: {settings.app.schedule_minutes} min.")
+    log.info(f"Scheduler iniciado (Background). Gatilho: {trigger}. Próxima execução: {job.next_run_time}.")
     return _scheduler
 
 def shutdown_scheduler():
-    global _scheduler
     if _scheduler and _scheduler.running:
         _scheduler.shutdown(wait=False)
         log.info("Scheduler parado.")
+    shutdown_job_manager()
+
+def run_once_now(profile: bool = False) -> dict:
+    """Enfileira uma execução imediata e retorna sem esperar por ela (`profile`: amostrar pilhas nessa execução)."""
+    job, coalesced = get_job_manager().submit(manual_cycle_key(), source="api", profile=profile)
+    return {"job_id": job.id, "status": job.status, "coalesced": coalesced}
+
+def backfill_now() -> dict:
+    """Enfileira o reparo de buracos (roda depois de qualquer fetch pendente)."""
+    job, coalesced = get_job_manager().submit(manual_cycle_key(), source="api", kind=KIND_BACKFILL)
+    return {"job_id": job.id, "status": job.status, "coalesced": coalesced}
+
+def snapshot_maintenance_now() -> dict:
+    """Enfileira a verificação/compactação do snapshot local."""
+    job, coalesced = get_job_manager().submit(manual_cycle_key(), source="api", kind=KIND_SNAPSHOT)
+    return {"job_id": job.id, "status": job.status, "coalesced": coalesced}
+
+def intraday_now() -> dict:
+    """Enfileira uma ingestão intradiária imediata."""
+    job, coalesced = get_job_manager().submit(manual_cycle_key(), source="api", kind=KIND_INTRADAY)
+    return {"job_id": job.id, "status": job.status, "coalesced": coalesced}
+
+def intraday_maintenance_now() -> dict:
+    """Enfileira a retenção/agregação das partições intradiárias."""
+    job, coalesced = get_job_manager().submit(manual_cycle_key(), source="api", kind=KIND_INTRADAY_MAINTENANCE)
+    return {"job_id": job.id, "status": job.status, "coalesced": coalesced}
+
+def get_job(job_id: str) -> dict | None:
+    job = get_job_manager().get(job_id)
+    return job.as_dict() if job else None
+
+def get_job_profile(job_id: str) -> str | None:
+    """Pilhas amostradas da execução no formato collapsed (None se o job não existe ou não foi perfilado)."""
+    job = get_job_manager().get(job_id)
+    if job is None or job.profile_report is None:
+        return None
+    return job.profile_report.collapsed()
+
+def list_jobs() -> list[dict]:
+    return [j.as_dict() for j in get_job_manager().list()]
+
+def cancel_job(job_id: str) -> dict | None:
+    job = get_job_manager().cancel(job_id)
+    return job.as_dict() if job else None
+
+def rebuild_watermarks_now() -> dict:
+    """Reconstrói asset_fetch_state a partir de asset_history (sob demanda)."""
+    from src.services.watermark_service import rebuild_watermarks
 
-def run_once_now() -> dict:
-    with get_session() as s:  # type: Session
-        processed, inserted = fetch_and_persist(s)
-        return {"processed": processed, "inserted": inserted}
\ No newline at end of file
+    with get_session() as s:
+        updated = rebuild_watermarks(s)
+        s.commit()
+        return {"assets": updated}
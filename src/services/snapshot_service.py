@@ -0,0 +1,437 @@
+from __future__ import annotations
+import datetime as dt
+import importlib.util
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.infra.config import get_settings
+from src.infra.db import get_session
+from src.models.tables import asset, asset_fetch_state, asset_history
+
+log = logging.getLogger(__name__)
+settings = get_settings()
+
+VALUE_COLUMNS = ["open_price", "high_price", "low_price", "close_price", "volume", "dividends", "splits"]
+_MANIFEST = "_manifest.json"
+_SUFFIX = ".arrow"
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema(
+        [("price_date", pa.date32())]
+        + [(c, pa.int64() if c == "volume" else pa.float64()) for c in VALUE_COLUMNS]
+    )
+
+@dataclass
+class MaintenanceResult:
+    checked: int = 0
+    rebuilt: int = 0
+    caught_up: int = 0
+    compacted: int = 0
+    rows_written: int = 0
+
+class SnapshotStore:
+    """
+    Cópia colunar local de asset_history em Arrow IPC (formato de arquivo, sem compressão,
+    para que a leitura via memory-map não copie os buffers):
+
+        <root>/<asset_id>/_manifest.json          ticker, last_date, adjustment_version
+        <root>/<asset_id>/<ano>/<ns>-<tipo>.arrow  arquivos imutáveis, na ordem do nome
+
+    Cada append grava arquivos novos; a leitura concatena os arquivos do ano e, se houver
+    datas repetidas (barra do dia regravada), fica com a última versão. A compactação
+    funde os arquivos de cada ano em um só. Escritas são atômicas (arquivo temporário +
+    os.replace), então leitores concorrentes nunca veem arquivo parcial.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self._lock = threading.RLock()
+        self._tickers: Optional[Dict[str, uuid.UUID]] = None
+        os.makedirs(self.root, exist_ok=True)
+
+    # ----------------- Layout -----------------
+
+    def _asset_dir(self, asset_id: uuid.UUID) -> str:
+        return os.path.join(self.root, str(asset_id))
+
+    def _files(self, asset_id: uuid.UUID, year: Optional[int] = None) -> Dict[int, List[str]]:
+        base = self._asset_dir(asset_id)
+        years = [str(year)] if year is not None else sorted(d for d in _listdir(base) if d.isdigit())
+        out: Dict[int, List[str]] = {}
+        for y in years:
+            names = sorted(n for n in _listdir(os.path.join(base, y)) if n.endswith(_SUFFIX))
+            if names:
+                out[int(y)] = [os.path.join(base, y, n) for n in names]
+        return out
+
+    def read_manifest(self, asset_id: uuid.UUID) -> Optional[dict]:
+        try:
+            with open(os.path.join(self._asset_dir(asset_id), _MANIFEST), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_manifest(self, asset_dir: str, manifest: dict) -> None:
+        manifest = {**manifest, "updated_at": dt.datetime.now().isoformat()}
+        _atomic_write(os.path.join(asset_dir, _MANIFEST), json.dumps(manifest).encode())
+
+    def assets(self) -> List[uuid.UUID]:
+        out = []
+        for name in _listdir(self.root):
+            try:
+                out.append(uuid.UUID(name))
+            except ValueError:
+                continue
+        return out
+
+    def ticker_index(self) -> Dict[str, uuid.UUID]:
+        """ticker -> asset id a partir dos manifestos (sem consultar o banco)."""
+        with self._lock:
+            if self._tickers is None:
+                index = {}
+                for a_id in self.assets():
+                    m = self.read_manifest(a_id)
+                    if m and m.get("ticker"):
+                        index[m["ticker"]] = a_id
+                self._tickers = index
+            return dict(self._tickers)
+
+    # ----------------- Escrita -----------------
+
+    def _write_table(self, asset_dir: str, year: int, table, kind: str) -> None:
+        import pyarrow as pa
+
+        year_dir = os.path.join(asset_dir, str(year))
+        os.makedirs(year_dir, exist_ok=True)
+        path = os.path.join(year_dir, f"{time.time_ns():020d}-{kind}{_SUFFIX}")
+        tmp = f"{path}.tmp"
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, path)
+
+    def _frame_to_tables(self, df: pd.DataFrame) -> Dict[int, object]:
+        import pyarrow as pa
+
+        years = np.fromiter((d.year for d in df["price_date"]), dtype=np.int32, count=len(df))
+        out = {}
+        for y in np.unique(years):
+            part = df.loc[years == y, ["price_date", *VALUE_COLUMNS]].sort_values("price_date")
+            out[int(y)] = pa.Table.from_pandas(part, schema=_schema(), preserve_index=False)
+        return out
+
+    def append(self, df_long: pd.DataFrame) -> int:
+        """
+        Acrescenta as linhas gravadas (colunas asset, price_date e valores) aos ativos que
+        já têm snapshot. Ativos sem snapshot são ignorados: a manutenção os constrói do banco.
+        Retorna o número de linhas escritas.
+        """
+        written = 0
+        with self._lock:
+            for a_id, part in df_long.groupby("asset", sort=False):
+                manifest = self.read_manifest(a_id)
+                if manifest is None:
+                    continue
+                asset_dir = self._asset_dir(a_id)
+                for year, table in self._frame_to_tables(part).items():
+                    self._write_table(asset_dir, year, table, "part")
+                    written += table.num_rows
+                last = max(part["price_date"])
+                if manifest.get("last_date") is None or last.isoformat() > manifest["last_date"]:
+                    manifest["last_date"] = last.isoformat()
+                self._write_manifest(asset_dir, manifest)
+        return written
+
+    def replace_asset(
+        self,
+        asset_id: uuid.UUID,
+        ticker: str,
+        batches: Iterator[pd.DataFrame],
+        adjustment_version: int,
+    ) -> int:
+        """Reconstrói o snapshot do ativo a partir de `batches` (ordenados por data) e troca o diretório."""
+        final = self._asset_dir(asset_id)
+        tmp_dir = f"{final}.tmp-{uuid.uuid4().hex[:8]}"
+        os.makedirs(tmp_dir)
+        rows, last_date = 0, None
+        try:
+            pending: Dict[int, List[pd.DataFrame]] = {}
+            for df in batches:
+                if not len(df):
+                    continue
+                for year, table in self._frame_to_tables(df).items():
+                    pending.setdefault(year, []).append(table)
+                last_date = max(df["price_date"])
+                # um arquivo por ano: grava os anos já completos (batches chegam em ordem de data)
+                for year in [y for y in pending if y < last_date.year]:
+                    rows += self._flush_year(tmp_dir, year, pending.pop(year))
+            for year, tables in pending.items():
+                rows += self._flush_year(tmp_dir, year, tables)
+            self._write_manifest(tmp_dir, {
+                "asset": str(asset_id),
+                "ticker": ticker,
+                "last_date": last_date.isoformat() if last_date else None,
+                "adjustment_version": adjustment_version,
+            })
+            trash = f"{final}.old-{uuid.uuid4().hex[:8]}"
+            with self._lock:
+                if os.path.exists(final):
+                    os.replace(final, trash)
+                os.replace(tmp_dir, final)
+                if self._tickers is not None:
+                    self._tickers[ticker] = asset_id
+            shutil.rmtree(trash, ignore_errors=True)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return rows
+
+    def _flush_year(self, asset_dir: str, year: int, tables: list) -> int:
+        import pyarrow as pa
+
+        table = tables[0] if len(tables) == 1 else pa.concat_tables(tables)
+        self._write_table(asset_dir, year, table, "base")
+        return table.num_rows
+
+    def invalidate(self, asset_ids: Sequence[uuid.UUID]) -> None:
+        """
+        Descarta o manifesto: o snapshot deixa de receber appends e de ser lido (ex.: histórico
+        reajustado por evento corporativo) e é reconstruído na manutenção.
+        """
+        with self._lock:
+            dropped = set(asset_ids)
+            for a_id in dropped:
+                try:
+                    os.remove(os.path.join(self._asset_dir(a_id), _MANIFEST))
+                except FileNotFoundError:
+                    pass
+            if self._tickers is not None:
+                self._tickers = {tk: a_id for tk, a_id in self._tickers.items() if a_id not in dropped}
+
+    def compact(self, asset_id: uuid.UUID, min_parts: int) -> int:
+        """Funde os anos com pelo menos `min_parts` arquivos em um único arquivo. Retorna os anos compactados."""
+        compacted = 0
+        with self._lock:
+            asset_dir = self._asset_dir(asset_id)
+            for year, paths in self._files(asset_id).items():
+                if len(paths) < min_parts:
+                    continue
+                table = _dedup_last(_read_files(paths))
+                self._write_table(asset_dir, year, table, "base")
+                for p in paths:
+                    os.remove(p)
+                compacted += 1
+        return compacted
+
+    # ----------------- Leitura -----------------
+
+    def read(self, asset_id: uuid.UUID, start: Optional[dt.date] = None, end: Optional[dt.date] = None):
+        """
+        Histórico do ativo como pyarrow.Table, lido via memory-map. Com os anos compactados
+        (um arquivo por ano) e sem sobreposição, os buffers apontam direto para os arquivos
+        mapeados (sem cópia); o recorte por data é um slice. Listagem e abertura dos arquivos
+        acontecem sob o lock, para não correr com compact/replace_asset; depois de mapeado, o
+        arquivo pode ser removido sem afetar a leitura. Ativo sem manifesto (invalidado, à
+        espera de reconstrução) é lido como vazio.
+        """
+        import pyarrow as pa
+
+        tables = []
+        with self._lock:
+            if self.read_manifest(asset_id) is None:
+                return _schema().empty_table()
+            for year, paths in self._files(asset_id).items():
+                if (start is not None and year < start.year) or (end is not None and year > end.year):
+                    continue
+                table = _read_files(paths)
+                if len(paths) > 1:
+                    table = _dedup_last(table)
+                tables.append(_slice_dates(table, start, end))
+        if not tables:
+            return _schema().empty_table()
+        return tables[0] if len(tables) == 1 else pa.concat_tables(tables)
+
+# ----------------- Helpers -----------------
+
+def _listdir(path: str) -> List[str]:
+    try:
+        return os.listdir(path)
+    except FileNotFoundError:
+        return []
+
+def _atomic_write(path: str, data: bytes) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _read_files(paths: List[str]):
+    import pyarrow as pa
+
+    tables = []
+    for p in paths:
+        with pa.memory_map(p, "r") as source:
+            tables.append(pa.ipc.open_file(source).read_all())
+    return tables[0] if len(tables) == 1 else pa.concat_tables(tables)
+
+def _dedup_last(table):
+    """Ordena por data mantendo, para datas repetidas, a linha do arquivo mais recente."""
+    dates = table.column("price_date").to_numpy().astype("int64")
+    pos = np.arange(len(dates))
+    order = np.lexsort((pos, dates))
+    d = dates[order]
+    keep = np.ones(len(d), dtype=bool)
+    keep[:-1] = d[1:] != d[:-1]
+    return table.take(order[keep])
+
+def _slice_dates(table, start: Optional[dt.date], end: Optional[dt.date]):
+    if start is None and end is None:
+        return table
+    dates = table.column("price_date").to_numpy()
+    lo = 0 if start is None else int(np.searchsorted(dates, np.datetime64(start, "D"), side="left"))
+    hi = len(dates) if end is None else int(np.searchsorted(dates, np.datetime64(end, "D"), side="right"))
+    return table.slice(lo, max(0, hi - lo))
+
+# ----------------- Integração com o banco -----------------
+
+def _iter_asset_history(
+    session: Session, asset_id: uuid.UUID, since: Optional[dt.date] = None, batch_rows: int = 50_000
+) -> Iterator[pd.DataFrame]:
+    """Histórico do ativo (a partir de `since`, inclusive) em lotes ordenados por data, via cursor do servidor."""
+    cols = [asset_history.c.price_date, *[asset_history.c[c] for c in VALUE_COLUMNS]]
+    stmt = select(*cols).where(asset_history.c.asset == asset_id)
+    if since is not None:
+        stmt = stmt.where(asset_history.c.price_date >= since)
+    stmt = stmt.order_by(asset_history.c.price_date).execution_options(stream_results=True, yield_per=batch_rows)
+    for part in session.execute(stmt).partitions():
+        df = pd.DataFrame(part, columns=["price_date", *VALUE_COLUMNS])
+        for c in VALUE_COLUMNS:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+        df["volume"] = df["volume"].astype("Int64")
+        yield df
+    session.commit()
+
+def maintain(session: Session, store: "SnapshotStore", progress=None) -> MaintenanceResult:
+    """
+    Verificação de consistência contra asset_fetch_state + compactação:
+      - sem manifesto ou adjustment_version diferente  -> reconstrói o ativo a partir do banco
+      - last_date do snapshot atrás da marca d'água     -> acrescenta as linhas a partir dela
+        (inclusive, para pegar a barra do dia regravada)
+      - last_date à frente da marca d'água              -> reconstrói
+    e compacta os anos com muitos arquivos incrementais.
+    """
+    result = MaintenanceResult()
+    rows = session.execute(
+        select(asset.c.id, asset.c.ticker, asset_fetch_state.c.last_date, asset_fetch_state.c.adjustment_version)
+        .select_from(asset.join(asset_fetch_state, asset_fetch_state.c.asset == asset.c.id))
+        .where(asset.c.ticker.isnot(None), asset_fetch_state.c.last_date.isnot(None))
+    ).fetchall()
+    session.commit()
+    cfg = settings.snapshot
+    for a_id, ticker, last_date, version in rows:
+        if progress is not None:
+            progress.check_cancelled()
+        result.checked += 1
+        tk = ticker.strip().upper()
+        m = store.read_manifest(a_id)
+        snap_last = dt.date.fromisoformat(m["last_date"]) if m and m.get("last_date") else None
+        if m is None or m.get("adjustment_version") != version or snap_last is None or snap_last > last_date:
+            if result.rebuilt >= cfg.max_rebuilds_per_run:
+                continue
+            result.rows_written += store.replace_asset(a_id, tk, _iter_asset_history(session, a_id), version)
+            result.rebuilt += 1
+        elif snap_last < last_date:
+            for df in _iter_asset_history(session, a_id, since=snap_last):
+                df["asset"] = a_id
+                result.rows_written += store.append(df)
+            result.caught_up += 1
+        result.compacted += store.compact(a_id, cfg.compact_min_parts)
+    log.info(
+        f"Snapshot: {result.checked} ativo(s) verificados, {result.rebuilt} reconstruído(s), "
+        f"{result.caught_up} atualizado(s), {result.compacted} ano(s) compactado(s), {result.rows_written} linha(s)."
+    )
+    return result
+
+_store: Optional[SnapshotStore] = None
+_store_lock = threading.Lock()
+
+def snapshot_available() -> bool:
+    return settings.snapshot.enabled and importlib.util.find_spec("pyarrow") is not None
+
+def get_snapshot_store() -> Optional[SnapshotStore]:
+    """Store configurado, ou None se desabilitado/pyarrow ausente."""
+    global _store
+    if not snapshot_available():
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = SnapshotStore(settings.snapshot.root)
+        return _store
+
+def append_from_frame(df_long: pd.DataFrame) -> None:
+    """Chamado após o commit de cada chunk; falhas aqui não afetam o fetch (o ativo é invalidado)."""
+    store = get_snapshot_store()
+    if store is None or df_long is None or not len(df_long):
+        return
+    try:
+        store.append(df_long)
+    except Exception as e:
+        log.warning(f"Falha ao acrescentar ao snapshot ({e}); ativos invalidados para reconstrução.")
+        store.invalidate(list(df_long["asset"].unique()))
+
+def invalidate_assets(asset_ids: Sequence[uuid.UUID]) -> None:
+    store = get_snapshot_store()
+    if store is not None:
+        store.invalidate(asset_ids)
+
+def read_history(tickers: Sequence[str], start: Optional[dt.date] = None, end: Optional[dt.date] = None):
+    """
+    Histórico de vários tickers como uma pyarrow.Table (colunas ticker, price_date, valores),
+    lida do snapshot local. Tickers sem snapshot ficam de fora (ver `missing` no controller).
+    """
+    import pyarrow as pa
+
+    store = get_snapshot_store()
+    if store is None:
+        raise RuntimeError("Snapshot desabilitado ou pyarrow não instalado.")
+    index = store.ticker_index()
+    tables = []
+    for tk in tickers:
+        a_id = index.get(tk)
+        if a_id is None:
+            continue
+        t = store.read(a_id, start, end)
+        if t.num_rows:
+            tables.append(t.add_column(0, "ticker", pa.repeat(pa.scalar(tk), t.num_rows)))
+    if not tables:
+        return None
+    return pa.concat_tables(tables)
+
+def run_maintenance(cycle: str, progress=None):
+    """Runner do job de manutenção (cada réplica mantém seu próprio snapshot local)."""
+    from src.services.run_state import RunStats
+
+    stats = RunStats()
+    store = get_snapshot_store()
+    if store is None:
+        return stats
+    t0 = time.perf_counter()
+    if progress is not None:
+        progress.set(stage="snapshot")
+    with get_session() as s:
+        result = maintain(s, store, progress)
+    stats.processed = result.rows_written
+    stats.elapsed_seconds = time.perf_counter() - t0
+    return stats
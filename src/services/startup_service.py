@@ -0,0 +1,75 @@
+from __future__ import annotations
+import logging
+import threading
+import time
+from typing import Optional
+
+from src.infra.config import get_settings
+from src.infra.db import ensure_schema, init_engine
+
+log = logging.getLogger(__name__)
+settings = get_settings()
+
+# referência para ready_seconds: a importação acontece junto com a da aplicação
+_t0 = time.monotonic()
+_ready = threading.Event()
+_stop = threading.Event()
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+_state = {"stage": "starting", "attempts": 0, "error": None, "ready_seconds": None}
+
+def _set(**values) -> None:
+    with _lock:
+        _state.update(values)
+
+def initialize() -> None:
+    """
+    Prepara o que a aplicação precisa para atender de fato: engine do banco, schema das
+    tabelas do serviço e scheduler. Idempotente (pode ser repetido após uma falha).
+    """
+    from src.services.scheduler_service import start_scheduler
+
+    with _lock:
+        _state["attempts"] += 1
+    _set(stage="database")
+    engine = init_engine(settings.db_url, logging_sql=settings.logging_sql)
+    ensure_schema(engine)
+    _set(stage="scheduler")
+    start_scheduler()
+    elapsed = time.monotonic() - _t0
+    _set(stage="ready", error=None, ready_seconds=round(elapsed, 3))
+    _ready.set()
+    log.info(f"Aplicação pronta em {elapsed:.2f}s.")
+
+def _initialize_until_ready() -> None:
+    while not _stop.is_set():
+        try:
+            initialize()
+            return
+        except Exception as e:
+            _set(error=str(e))
+            log.warning(
+                f"Inicialização falhou ({type(e).__name__}: {e}); "
+                f"nova tentativa em {settings.startup.retry_seconds:.0f}s."
+            )
+            _stop.wait(settings.startup.retry_seconds)
+
+def start_background() -> None:
+    """Inicializa em segundo plano, repetindo até conseguir (ex.: banco ainda subindo)."""
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_initialize_until_ready, name="startup", daemon=True)
+    _thread.start()
+
+def stop() -> None:
+    """Interrompe as novas tentativas (desligamento antes de ficar pronto)."""
+    _stop.set()
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+def readiness() -> dict:
+    with _lock:
+        return {"ready": _ready.is_set(), **_state}
@@ -0,0 +1,169 @@
+from __future__ import annotations
+import logging
+import uuid
+import datetime as dt
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import select, func, exists, case, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from src.models.tables import asset, asset_history, asset_fetch_state
+
+log = logging.getLogger(__name__)
+
+# ----------------- Leitura -----------------
+
+def load_watermarks(session: Session) -> List[Tuple[uuid.UUID, str, Optional[dt.date], Optional[int], Optional[dt.datetime]]]:
+    """
+    Retorna (asset.id, asset.ticker, last_date, consecutive_failures, quarantined_until)
+    para todos os ativos com ticker.
+    Custa O(#ativos): lê apenas asset + asset_fetch_state, sem varrer asset_history.
+    """
+    q = (
+        select(
+            asset.c.id,
+            asset.c.ticker,
+            asset_fetch_state.c.last_date,
+            asset_fetch_state.c.consecutive_failures,
+            asset_fetch_state.c.quarantined_until,
+        )
+        .select_from(asset.outerjoin(asset_fetch_state, asset_fetch_state.c.asset == asset.c.id))
+        .where(asset.c.ticker.isnot(None))
+    )
+    return session.execute(q).fetchall()
+
+def ensure_watermarks(session: Session) -> None:
+    """
+    Na primeira execução (tabela de estado vazia mas com histórico já gravado),
+    reconstrói as marcas a partir de asset_history para não rebaixar tudo.
+    """
+    has_state = session.execute(select(exists().select_from(asset_fetch_state))).scalar()
+    if has_state:
+        return
+    has_history = session.execute(select(exists().select_from(asset_history))).scalar()
+    if has_history:
+        log.info("asset_fetch_state vazia; reconstruindo marcas d'água a partir de asset_history.")
+        rebuild_watermarks(session)
+        session.commit()
+
+# ----------------- Escrita -----------------
+
+def rebuild_watermarks(session: Session, asset_ids: Optional[Iterable[uuid.UUID]] = None) -> int:
+    """
+    Recalcula last_date = MAX(price_date) a partir de asset_history (todos os ativos ou só `asset_ids`).
+    Operação cara, pensada para uso sob demanda. Não faz commit.
+    """
+    src = select(
+        asset_history.c.asset,
+        func.max(asset_history.c.price_date),
+        func.now(),
+    ).group_by(asset_history.c.asset)
+    if asset_ids is not None:
+        src = src.where(asset_history.c.asset.in_(list(asset_ids)))
+
+    stmt = pg_insert(asset_fetch_state).from_select(["asset", "last_date", "updated_at"], src)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["asset"],
+        set_={"last_date": stmt.excluded.last_date, "updated_at": func.now()},
+    )
+    result = session.execute(stmt)
+    return result.rowcount if result.rowcount is not None else 0
+
+def advance_watermarks(session: Session, df: pd.DataFrame) -> Dict[uuid.UUID, dt.date]:
+    """
+    Avança last_date com o MAX(price_date) por ativo do lote gravado e marca o sucesso.
+    Deve rodar na mesma transação do insert em asset_history. Não faz commit.
+    """
+    if df is None or len(df) == 0:
+        return {}
+    last_by_asset = df.groupby("asset", sort=False)["price_date"].max().to_dict()
+    rows = [
+        {"asset": a, "last_date": d, "last_success_at": func.now(), "updated_at": func.now()}
+        for a, d in last_by_asset.items()
+    ]
+
+    stmt = pg_insert(asset_fetch_state).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["asset"],
+        set_={
+            "last_date": func.greatest(asset_fetch_state.c.last_date, stmt.excluded.last_date),
+            "last_success_at": func.now(),
+            "last_error": None,
+            "last_error_at": None,
+            "consecutive_failures": 0,
+            "quarantined_until": None,
+            "updated_at": func.now(),
+        },
+    )
+    session.execute(stmt)
+    return last_by_asset
+
+def bump_data_version(session: Session, asset_ids: Iterable[uuid.UUID]) -> None:
+    """
+    Incrementa data_version dos ativos cujas barras em asset_history mudaram (inseridas ou
+    atualizadas). Deve rodar na mesma transação da escrita. Não faz commit.
+    """
+    rows = [{"asset": a, "data_version": 1, "updated_at": func.now()} for a in dict.fromkeys(asset_ids) if a is not None]
+    if not rows:
+        return
+    stmt = pg_insert(asset_fetch_state).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["asset"],
+        set_={"data_version": asset_fetch_state.c.data_version + 1, "updated_at": func.now()},
+    )
+    session.execute(stmt)
+
+def _quarantine_until(failures, threshold: int, base_seconds: float, max_seconds: float):
+    """now() + base * 2^(falhas - threshold), limitado a max; NULL abaixo do threshold."""
+    delay = func.least(max_seconds, base_seconds * func.power(2, failures - threshold))
+    return case(
+        (failures >= threshold, func.now() + func.make_interval(0, 0, 0, 0, 0, 0, delay)),
+        else_=None,
+    )
+
+def record_fetch_errors(
+    session: Session,
+    asset_ids: Iterable[uuid.UUID],
+    message: str,
+    quarantine_threshold: int = 3,
+    quarantine_base_seconds: float = 900.0,
+    quarantine_max_seconds: float = 604800.0,
+) -> None:
+    """
+    Registra o último erro de busca dos ativos, sem alterar last_date, e incrementa as
+    falhas consecutivas. A partir de `quarantine_threshold` falhas o ativo entra em
+    quarentena com intervalo de re-teste exponencial. Não faz commit.
+    """
+    msg = (message or "")[:10000]
+    rows = [
+        {
+            "asset": a,
+            "last_error": msg,
+            "last_error_at": func.now(),
+            "updated_at": func.now(),
+            "consecutive_failures": 1,
+            "quarantined_until": _quarantine_until(
+                literal(1), quarantine_threshold, quarantine_base_seconds, quarantine_max_seconds
+            ),
+        }
+        for a in dict.fromkeys(asset_ids) if a is not None
+    ]
+    if not rows:
+        return
+    failures = asset_fetch_state.c.consecutive_failures + 1
+    stmt = pg_insert(asset_fetch_state).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["asset"],
+        set_={
+            "last_error": msg,
+            "last_error_at": func.now(),
+            "updated_at": func.now(),
+            "consecutive_failures": failures,
+            "quarantined_until": _quarantine_until(
+                failures, quarantine_threshold, quarantine_base_seconds, quarantine_max_seconds
+            ),
+        },
+    )
+    session.execute(stmt)
@@ -0,0 +1,123 @@
+"""
+Fixtures compartilhadas. Os testes com banco precisam de um PostgreSQL descartável (COPY,
+ON CONFLICT e LATERAL não existem no SQLite): BENCH_DB_URL aponta para um banco vazio, cujas
+tabelas são criadas e esvaziadas a cada teste; sem ela, sobe um servidor temporário com
+testing.postgresql. Sem nenhum dos dois, esses testes são pulados.
+"""
+import datetime as dt
+import os
+import tempfile
+import uuid
+
+import pytest
+
+# snapshot colunar descartável; precisa vir antes dos imports de src (configurações carregadas uma vez)
+os.environ.setdefault("SNAPSHOT_ROOT", tempfile.mkdtemp(prefix="tests_snapshots_"))
+
+
+@pytest.fixture(scope="session")
+def db_engine():
+    server = None
+    url = os.getenv("BENCH_DB_URL")
+    if not url:
+        testing_postgresql = pytest.importorskip(
+            "testing.postgresql", reason="defina BENCH_DB_URL ou instale testing.postgresql"
+        )
+        server = testing_postgresql.Postgresql()
+        url = server.url()
+
+    from src.infra.db import ensure_schema, init_engine
+    from src.models.tables import asset, asset_history, asset_log, metadata
+
+    engine = init_engine(url)
+    # tabelas do sistema principal que este serviço só lê/estende
+    metadata.create_all(engine, tables=[asset, asset_history, asset_log], checkfirst=True)
+    ensure_schema(engine)
+    yield engine
+    engine.dispose()
+    if server is not None:
+        server.stop()
+
+
+@pytest.fixture
+def db(db_engine):
+    """Banco vazio a cada teste; devolve o engine."""
+    from sqlalchemy import text
+
+    from src.models.tables import asset, asset_history, asset_log, service_tables
+
+    names = ", ".join(t.name for t in [*service_tables, asset_history, asset_log, asset])
+    with db_engine.begin() as conn:
+        conn.execute(text(f"TRUNCATE {names} CASCADE"))
+    return db_engine
+
+
+@pytest.fixture
+def session(db):
+    from src.infra.db import get_session
+
+    with get_session() as s:
+        yield s
+
+
+@pytest.fixture
+def make_assets(db):
+    """Cria `n` ativos (tickers T0000, T0001, ...) e devolve {ticker: id}."""
+    from src.models.tables import asset
+
+    def make(n: int) -> dict:
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "ticker": f"T{i:04d}",
+                "name": f"Ativo {i}",
+                "type": "stock",
+                "currency": "BRL",
+                "exchange": "B3",
+                "created_at": dt.datetime.now(),
+            }
+            for i in range(n)
+        ]
+        with db.begin() as conn:
+            conn.execute(asset.insert(), rows)
+        return {r["ticker"]: r["id"] for r in rows}
+
+    return make
+
+
+@pytest.fixture
+def synthetic_engine():
+    """FetchEngine com o SyntheticProvider (sem rede), 5 anos de histórico desde hoje."""
+    from src.services.fetch_engine import FetchEngine, set_fetch_engine
+    from src.services.price_providers import SyntheticProvider
+
+    provider = SyntheticProvider(seed=7, epoch=dt.date.today() - dt.timedelta(days=5 * 365))
+    engine = FetchEngine(provider=provider)
+    set_fetch_engine(engine)
+    yield engine
+    set_fetch_engine(None)
+
+
+@pytest.fixture
+def override_settings(monkeypatch):
+    """
+    Troca campos de uma seção das configurações durante o teste, em todos os módulos de src
+    que guardaram `settings`: override_settings("corporate_actions", enabled=True).
+    """
+    import dataclasses
+    import sys
+
+    from src.infra.config import Settings, get_settings
+
+    current = [get_settings()]
+
+    def override(section: str, **values):
+        s = current[0]
+        s = dataclasses.replace(s, **{section: dataclasses.replace(getattr(s, section), **values)})
+        current[0] = s
+        for name, module in list(sys.modules.items()):
+            if name.startswith("src.") and isinstance(getattr(module, "settings", None), Settings):
+                monkeypatch.setattr(module, "settings", s)
+        return s
+
+    return override
@@ -0,0 +1,80 @@
+import datetime as dt
+
+import pandas as pd
+import pytest
+from sqlalchemy import func, select
+
+from src.infra.bulk_loader import (
+    CONFLICT_IGNORE,
+    CONFLICT_UPDATE,
+    CONFLICT_UPDATE_IF_CHANGED,
+    PERSIST_MODES,
+    bulk_load,
+)
+from src.models.tables import asset_history
+
+KEYS = ("asset", "price_date")
+
+
+def _frame(asset_id, days: int, close: float = 10.0, start: dt.date = dt.date(2024, 1, 1)) -> pd.DataFrame:
+    return pd.DataFrame({
+        "asset": [asset_id] * days,
+        "price_date": [start + dt.timedelta(days=i) for i in range(days)],
+        "close_price": [close + i for i in range(days)],
+        "open_price": [close] * days,
+        "volume": [1000] * days,
+    })
+
+
+def _load(session, df, mode, on_conflict):
+    return bulk_load(session, asset_history, df, key_columns=KEYS, mode=mode, batch_size=7, on_conflict=on_conflict)
+
+
+def test_empty_frame_is_noop(session):
+    res = bulk_load(session, asset_history, pd.DataFrame(), key_columns=KEYS)
+    assert (res.staged, res.inserted, res.updated, res.unchanged) == (0, 0, 0, 0)
+
+
+def test_invalid_policy_and_mode(session, make_assets):
+    a = make_assets(1)["T0000"]
+    with pytest.raises(ValueError):
+        bulk_load(session, asset_history, _frame(a, 1), key_columns=KEYS, on_conflict="merge")
+    with pytest.raises(ValueError):
+        bulk_load(session, asset_history, _frame(a, 1), key_columns=KEYS, mode="parquet")
+
+
+@pytest.mark.parametrize("mode", PERSIST_MODES)
+def test_counts_per_conflict_policy(session, make_assets, mode):
+    a = make_assets(1)["T0000"]
+    first = _load(session, _frame(a, 20), mode, CONFLICT_IGNORE)
+    assert (first.staged, first.inserted, first.updated) == (20, 20, 0)
+
+    # 20 existentes (5 com valor novo) + 10 novas
+    df = _frame(a, 30)
+    df.loc[:4, "close_price"] += 1
+    ignore = _load(session, df, mode, CONFLICT_IGNORE)
+    assert (ignore.staged, ignore.inserted, ignore.updated, ignore.unchanged) == (30, 10, 0, 20)
+
+    df.loc[:4, "close_price"] += 1
+    changed = _load(session, df, mode, CONFLICT_UPDATE_IF_CHANGED)
+    assert (changed.inserted, changed.updated, changed.unchanged) == (0, 5, 25)
+
+    update = _load(session, df, mode, CONFLICT_UPDATE)
+    assert (update.inserted, update.updated, update.unchanged) == (0, 30, 0)
+
+    total = session.execute(select(func.count()).select_from(asset_history)).scalar()
+    assert total == 30
+    first_close = session.execute(
+        select(asset_history.c.close_price).where(asset_history.c.price_date == dt.date(2024, 1, 1))
+    ).scalar()
+    assert float(first_close) == 12.0
+
+
+@pytest.mark.parametrize("mode", PERSIST_MODES)
+def test_duplicate_keys_keep_last_on_update(session, make_assets, mode):
+    a = make_assets(1)["T0000"]
+    df = pd.concat([_frame(a, 3, close=10.0), _frame(a, 3, close=50.0)], ignore_index=True)
+    res = _load(session, df, mode, CONFLICT_UPDATE)
+    assert (res.staged, res.inserted) == (3, 3)
+    closes = session.execute(select(asset_history.c.close_price).order_by(asset_history.c.price_date)).scalars().all()
+    assert [float(c) for c in closes] == [50.0, 51.0, 52.0]
@@ -0,0 +1,64 @@
+import dataclasses
+
+import pytest
+
+from src.infra.config import _validate, load_settings
+
+
+def _with_coordination(**values):
+    s = load_settings()
+    return dataclasses.replace(s, coordination=dataclasses.replace(s.coordination, **values))
+
+
+def test_coordination_is_validated():
+    assert _validate(_with_coordination(mode="sharded", shards=4, lease_seconds=300))
+    assert _validate(_with_coordination(mode="none", lease_seconds=1))
+    with pytest.raises(ValueError, match="coordination.mode"):
+        _validate(_with_coordination(mode="cluster"))
+    with pytest.raises(ValueError, match="lease_seconds"):
+        _validate(_with_coordination(mode="sharded", lease_seconds=10))
+    with pytest.raises(ValueError, match="shards"):
+        _validate(_with_coordination(mode="sharded", shards=0))
+
+
+@pytest.fixture
+def yaml_config(monkeypatch):
+    """Permite trocar o config.yml lido por reload_settings; restaura as configurações no fim."""
+    from src.infra import config
+
+    original = config._load_yaml_config()
+    current = {"data": original}
+    monkeypatch.setattr(config, "_load_yaml_config", lambda: current["data"])
+    yield current
+    current["data"] = original
+    config.reload_settings()
+
+
+def test_get_settings_is_cached():
+    from src.infra.config import get_settings
+
+    assert get_settings() is get_settings()
+
+
+def test_reload_updates_the_shared_object_in_place(yaml_config):
+    from src.infra.config import get_settings, reload_settings
+    from src.services import fetcher_service
+
+    shared = get_settings()
+    assert fetcher_service.settings is shared
+    yaml_config["data"] = {**yaml_config["data"], "app": {**yaml_config["data"]["app"], "chunk_size": 7}}
+    assert reload_settings() is shared
+    # módulos que guardaram `settings` na importação veem o valor novo
+    assert fetcher_service.settings.app.chunk_size == 7
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        shared.app = None
+
+
+def test_invalid_reload_keeps_current_settings(yaml_config):
+    from src.infra.config import get_settings, reload_settings
+
+    before = get_settings().coordination
+    yaml_config["data"] = {**yaml_config["data"], "coordination": {"mode": "cluster"}}
+    with pytest.raises(ValueError):
+        reload_settings()
+    assert get_settings().coordination is before
@@ -0,0 +1,130 @@
+import time
+import uuid
+
+import pytest
+
+from src.infra.config import get_settings
+from src.services.coordination_service import (
+    LeaseCoordinator,
+    LeaseKeeper,
+    LeaseLostError,
+    manual_cycle_key,
+    scheduled_cycle_key,
+    shard_of,
+)
+
+PERIOD = max(1, get_settings().app.schedule_minutes) * 60
+
+
+def test_scheduled_cycle_key_is_stable_within_a_window():
+    start = 1_700_000_000 // PERIOD * PERIOD
+    assert scheduled_cycle_key(start) == scheduled_cycle_key(start + PERIOD - 0.001)
+    assert scheduled_cycle_key(start) != scheduled_cycle_key(start + PERIOD)
+    assert scheduled_cycle_key(start) == f"tick-{start // PERIOD}"
+
+
+def test_scheduled_cycle_key_defaults_to_current_time(monkeypatch):
+    import src.services.coordination_service as coordination
+
+    monkeypatch.setattr(coordination.time, "time", lambda: PERIOD * 42 + 1)
+    assert scheduled_cycle_key() == "tick-42"
+
+
+def test_manual_cycle_keys_are_unique():
+    keys = {manual_cycle_key() for _ in range(100)}
+    assert len(keys) == 100
+    assert all(k.startswith("manual-") for k in keys)
+
+
+def test_shard_of_is_deterministic_and_in_range():
+    ids = [uuid.uuid4() for _ in range(200)]
+    assert all(0 <= shard_of(a, 4) < 4 for a in ids)
+    assert [shard_of(a, 4) for a in ids] == [shard_of(a, 4) for a in ids]
+    assert len({shard_of(a, 4) for a in ids}) == 4
+
+
+def test_leases_are_claimed_once_per_cycle(session):
+    a = LeaseCoordinator("test_job", shards=2, lease_seconds=60, owner="a")
+    b = LeaseCoordinator("test_job", shards=2, lease_seconds=60, owner="b")
+    a.ensure_shards(session)
+
+    assert a.claim_next(session, "tick-1") == 0
+    assert b.claim_next(session, "tick-1") == 1
+    assert a.claim_next(session, "tick-1") is None
+    with pytest.raises(LeaseLostError):
+        b.renew(session, 0, force=True)
+
+    a.complete(session, 0, "tick-1")
+    b.release(session, 1)
+    # concluído não volta no mesmo ciclo; devolvido sim
+    assert a.claim_next(session, "tick-1") == 1
+    assert b.claim_next(session, "tick-1") is None
+    assert b.claim_next(session, "tick-2") == 0
+
+
+def _expires_at(session, job, shard):
+    from sqlalchemy import select
+
+    from src.models.tables import job_lease
+
+    value = session.execute(
+        select(job_lease.c.expires_at).where(job_lease.c.job == job, job_lease.c.shard == shard)
+    ).scalar()
+    session.commit()
+    return value
+
+
+def test_keeper_renews_while_the_work_is_blocked(session):
+    coord = LeaseCoordinator("test_job", shards=1, lease_seconds=60, owner="a")
+    coord.ensure_shards(session)
+    assert coord.claim_next(session, "tick-1") == 0
+    before = _expires_at(session, "test_job", 0)
+    keeper = LeaseKeeper(coord, 0)
+    keeper.interval = 0.05
+    with keeper:
+        # o trabalho não chama heartbeat algum (ex.: download esperando o circuit breaker)
+        deadline = time.monotonic() + 5
+        while _expires_at(session, "test_job", 0) == before and time.monotonic() < deadline:
+            time.sleep(0.02)
+        keeper.check()
+    assert _expires_at(session, "test_job", 0) > before
+
+
+def test_keeper_reports_a_lost_lease(session):
+    from sqlalchemy import update
+
+    from src.models.tables import job_lease
+
+    coord = LeaseCoordinator("test_job", shards=1, lease_seconds=60, owner="a")
+    coord.ensure_shards(session)
+    coord.claim_next(session, "tick-1")
+    session.execute(update(job_lease).where(job_lease.c.job == "test_job").values(owner="b"))
+    session.commit()
+    keeper = LeaseKeeper(coord, 0)
+    keeper.interval = 0.05
+    with keeper:
+        deadline = time.monotonic() + 5
+        while keeper._thread.is_alive() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        with pytest.raises(LeaseLostError):
+            keeper.check()
+
+
+def test_sharded_run_covers_every_asset_once(session, make_assets, synthetic_engine, override_settings):
+    from sqlalchemy import func, select
+
+    from src.models.tables import asset_fetch_state, job_lease
+    from src.services.coordination_service import JOB_NAME, run_coordinated
+
+    override_settings("coordination", mode="sharded", shards=3, lease_seconds=60)
+    make_assets(9)
+    stats = run_coordinated("tick-1")
+    assert stats.inserted > 0
+    assert session.execute(
+        select(func.count()).select_from(asset_fetch_state).where(asset_fetch_state.c.last_date.isnot(None))
+    ).scalar() == 9
+    leases = session.execute(select(job_lease).where(job_lease.c.job == JOB_NAME)).mappings().all()
+    assert sorted(r["shard"] for r in leases) == [0, 1, 2]
+    assert all(r["completed_cycle"] == "tick-1" and r["owner"] is None for r in leases)
+    # mesmo ciclo em outra réplica: nada a fazer
+    assert run_coordinated("tick-1").processed == 0
@@ -0,0 +1,68 @@
+from sqlalchemy import and_, delete, select, update
+
+from src.models.tables import asset_corporate_action, asset_fetch_state, asset_history
+from src.services.fetcher_service import fetch_and_persist
+from src.services.watermark_service import rebuild_watermarks
+
+
+def _closes(session, asset_id, before):
+    return session.execute(
+        select(asset_history.c.price_date, asset_history.c.close_price)
+        .where(asset_history.c.asset == asset_id, asset_history.c.price_date < before)
+        .order_by(asset_history.c.price_date)
+    ).all()
+
+
+def _versions(session):
+    return dict(session.execute(select(asset_fetch_state.c.asset, asset_fetch_state.c.adjustment_version)).all())
+
+
+def test_new_action_readjusts_history_and_bumps_version(session, make_assets, synthetic_engine, override_settings):
+    override_settings("corporate_actions", enabled=True)
+    override_settings("app", auto_adjust=True)
+    make_assets(8)
+    fetch_and_persist(session)
+
+    # download completo já vem ajustado: eventos gravados como aplicados
+    actions = session.execute(select(asset_corporate_action)).mappings().all()
+    assert actions and all(a["applied_at"] is not None for a in actions)
+    latest = max(actions, key=lambda a: a["action_date"])
+    a, event = latest["asset"], latest["action_date"]
+    adjusted = _closes(session, a, event)
+    versions = _versions(session)
+
+    # estado de antes do evento: histórico até a véspera, ainda sem o ajuste (preços "brutos")
+    session.execute(delete(asset_history).where(and_(asset_history.c.asset == a, asset_history.c.price_date >= event)))
+    session.execute(delete(asset_corporate_action).where(
+        and_(asset_corporate_action.c.asset == a, asset_corporate_action.c.action_date >= event)
+    ))
+    session.execute(
+        update(asset_history).where(asset_history.c.asset == a)
+        .values(close_price=asset_history.c.close_price * 1.05)
+    )
+    rebuild_watermarks(session)
+    session.commit()
+
+    stats = fetch_and_persist(session)
+
+    # o incremental trouxe o evento; o reajuste rebaixou o histórico completo e reescreveu o que mudou
+    assert stats.updated >= len(adjusted)
+    readjusted = _closes(session, a, event)
+    assert [d for d, _ in readjusted] == [d for d, _ in adjusted]
+    assert all(abs(float(x) - float(y)) < 1e-6 for (_, x), (_, y) in zip(readjusted, adjusted))
+    applied = session.execute(
+        select(asset_corporate_action.c.applied_at)
+        .where(asset_corporate_action.c.asset == a, asset_corporate_action.c.action_date == event)
+    ).scalar()
+    assert applied is not None
+    after = _versions(session)
+    assert after[a] == versions[a] + 1
+    assert all(after[k] == v for k, v in versions.items() if k != a)
+
+
+def test_disabled_corporate_actions_do_not_record_or_readjust(session, make_assets, synthetic_engine, override_settings):
+    override_settings("corporate_actions", enabled=False)
+    make_assets(4)
+    fetch_and_persist(session)
+    assert session.execute(select(asset_corporate_action)).first() is None
+    assert set(_versions(session).values()) == {0}
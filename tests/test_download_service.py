@@ -0,0 +1,72 @@
+import pytest
+
+from src.infra.resilience import CircuitBreaker, RetryPolicy
+from src.services.download_service import ChunkJob, base_ticker, chunked, download_stage, yahoo_symbol
+from src.services.fetch_engine import FetchEngine, set_fetch_engine
+from src.services.price_providers import FakeProvider
+
+
+@pytest.fixture
+def use_engine():
+    def install(provider, threshold=2, retries=1):
+        engine = FetchEngine(
+            provider,
+            breaker=CircuitBreaker(failure_threshold=threshold, cooldown_seconds=60),
+            retry=RetryPolicy(max_retries=retries, base_seconds=0, max_seconds=0),
+            breaker_wait_seconds=0,
+        )
+        set_fetch_engine(engine)
+        return engine
+
+    yield install
+    set_fetch_engine(None)
+
+
+def _job(tickers):
+    return ChunkJob(tickers=tickers, start=None, end=None, period="1mo")
+
+
+def test_symbol_helpers():
+    assert yahoo_symbol(" petr4 ") == "PETR4.SA"
+    assert yahoo_symbol("VALE3.SA") == "VALE3.SA"
+    assert base_ticker("petr4.sa") == "PETR4"
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_bisection_isolates_bad_tickers_without_tripping_breaker(use_engine):
+    engine = use_engine(FakeProvider(seed=1, bad_symbols=["T1.SA", "T6.SA"]), threshold=2)
+    tickers = [f"T{i}" for i in range(9)]
+    job = download_stage(_job(tickers))
+
+    assert sorted(job.failed) == ["T1", "T6"]
+    ok = sorted(tk for names, _ in job.frames for tk in names)
+    assert ok == sorted(set(tickers) - {"T1", "T6"})
+    # várias falhas de sub-chunks, mas só a do chunk original conta no circuit breaker
+    assert engine.snapshot().failures > engine.breaker.failure_threshold
+    assert engine.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_transient_failure_is_not_bisected(use_engine):
+    provider = FakeProvider(seed=1, error_rate=1.0)
+    use_engine(provider, threshold=10, retries=1)
+    job = download_stage(_job(["A", "B", "C", "D"]))
+    assert sorted(job.failed) == ["A", "B", "C", "D"]
+    assert provider.calls == 2  # 1 tentativa + 1 retry, sem dividir o chunk
+
+
+def test_probe_without_data_counts_as_failure(use_engine):
+    class Empty:
+        def download(self, symbols, **kwargs):
+            return None
+
+    use_engine(Empty())
+    job = _job(["A"])
+    job.probe = True
+    assert "A" in download_stage(job).failed
+
+
+def test_bisect_mode_does_not_record_failures(use_engine):
+    engine = use_engine(FakeProvider(error_rate=1.0), threshold=1, retries=1)
+    with pytest.raises(ConnectionError):
+        engine.download(["A.SA"], record_failures=False)
+    assert engine.breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,78 @@
+import pytest
+
+from src.infra.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, ThrottledError
+from src.services.fetch_engine import FetchEngine
+from src.services.price_providers import FakeProvider, is_transient_error
+
+
+class ScriptedProvider:
+    """Levanta os erros de `errors` em sequência e depois devolve `result`."""
+
+    def __init__(self, errors, result="ok"):
+        self.errors = list(errors)
+        self.result = result
+        self.calls = 0
+
+    def download(self, symbols, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+
+def _engine(provider, threshold=3, retries=2):
+    return FetchEngine(
+        provider,
+        breaker=CircuitBreaker(failure_threshold=threshold, cooldown_seconds=60),
+        retry=RetryPolicy(max_retries=retries, base_seconds=0, max_seconds=0),
+        breaker_wait_seconds=0,
+    )
+
+
+class HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.response = type("Response", (), {"status_code": status})()
+
+
+@pytest.mark.parametrize("error, transient", [
+    (ThrottledError("429"), True),
+    (ConnectionError("reset"), True),
+    (TimeoutError(), True),
+    (HTTPError(503), True),
+    (HTTPError(404), False),
+    (Exception("Read timed out."), True),
+    (KeyError("símbolo inválido"), False),
+    (ValueError("No data found, symbol may be delisted"), False),
+])
+def test_is_transient_error(error, transient):
+    assert is_transient_error(error) is transient
+
+
+def test_transient_errors_are_retried():
+    provider = ScriptedProvider([ConnectionError("a"), ConnectionError("b")], result=None)
+    engine = _engine(provider)
+    assert engine.download(["A"]) is None
+    stats = engine.snapshot()
+    assert (provider.calls, stats.requests, stats.retries, stats.failures) == (3, 3, 2, 0)
+    assert engine.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_exhausted_retries_raise_and_open_breaker():
+    engine = _engine(ScriptedProvider([ConnectionError()] * 3), threshold=3, retries=2)
+    with pytest.raises(ConnectionError):
+        engine.download(["A"])
+    assert engine.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        engine.download(["A"])
+
+
+def test_non_transient_error_fails_fast_without_tripping_breaker():
+    engine = _engine(FakeProvider(bad_symbols=["X"]), threshold=1)
+    for _ in range(5):
+        with pytest.raises(KeyError):
+            engine.download(["A", "X"])
+    stats = engine.snapshot()
+    assert (stats.requests, stats.retries, stats.failures) == (5, 0, 5)
+    assert engine.breaker.state == CircuitBreaker.CLOSED
+
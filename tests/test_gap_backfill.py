@@ -0,0 +1,52 @@
+from sqlalchemy import and_, delete, func, select
+
+from src.infra.trading_calendar import get_calendar
+from src.models.tables import asset_fetch_state, asset_history, asset_history_gap
+from src.services.fetcher_service import backfill_gaps, fetch_and_persist
+from src.services.history_service import HistoryQuery, compute_etag
+
+
+def _count(session, asset_id):
+    return session.execute(
+        select(func.count()).select_from(asset_history).where(asset_history.c.asset == asset_id)
+    ).scalar()
+
+
+def test_backfill_repairs_hole_and_bumps_data_version(session, make_assets, synthetic_engine):
+    ids = make_assets(2)
+    a = ids["T0000"]
+    fetch_and_persist(session)
+    full = _count(session, a)
+
+    # buraco no meio do histórico: last_date não muda
+    dates = session.execute(
+        select(asset_history.c.price_date).where(asset_history.c.asset == a).order_by(asset_history.c.price_date)
+    ).scalars().all()
+    # o provedor sintético usa dias úteis; o índice de buracos, os pregões da B3
+    cal = get_calendar()
+    i = len(dates) // 2
+    while not all(cal.is_session(d) for d in dates[i - 1:i + 6]):
+        i += 1
+    lo, hi = dates[i], dates[i + 4]
+    session.execute(delete(asset_history).where(
+        and_(asset_history.c.asset == a, asset_history.c.price_date.between(lo, hi))
+    ))
+    session.commit()
+    q = HistoryQuery(tickers=["T0000"])
+    before_etag = compute_etag(session, q)
+    before_version = session.execute(
+        select(asset_fetch_state.c.data_version).where(asset_fetch_state.c.asset == a)
+    ).scalar()
+
+    stats = backfill_gaps(session)
+
+    assert stats.inserted == 5
+    assert _count(session, a) == full
+    assert session.execute(
+        select(func.count()).select_from(asset_history_gap).where(asset_history_gap.c.asset == a)
+    ).scalar() == 0
+    after_version = session.execute(
+        select(asset_fetch_state.c.data_version).where(asset_fetch_state.c.asset == a)
+    ).scalar()
+    assert after_version == before_version + 1
+    assert compute_etag(session, q) != before_etag
@@ -0,0 +1,45 @@
+from sqlalchemy import delete, func, select
+
+from src.models.tables import asset_fetch_state, asset_history
+from src.services.fetcher_service import fetch_and_persist
+from src.services.history_service import HistoryQuery, compute_etag
+from src.services.watermark_service import bump_data_version, rebuild_watermarks
+
+
+def test_etag_is_none_for_unknown_tickers(session):
+    assert compute_etag(session, HistoryQuery(tickers=["NAOEXISTE"])) is None
+
+
+def test_etag_depends_on_query_parameters(session, make_assets):
+    make_assets(1)
+    a = compute_etag(session, HistoryQuery(tickers=["T0000"]))
+    b = compute_etag(session, HistoryQuery(tickers=["T0000"], columns=("close",)))
+    assert a.startswith('W/"') and a != b
+
+
+def test_etag_changes_only_when_rows_change(session, make_assets, synthetic_engine):
+    ids = make_assets(3)
+    q = HistoryQuery(tickers=sorted(ids))
+    fetch_and_persist(session)
+    first = compute_etag(session, q)
+
+    # execução sem barra nova nem alterada: mesmo ETag (last_success_at não entra)
+    fetch_and_persist(session)
+    assert compute_etag(session, q) == first
+
+    # versão dos dados muda sem mexer em last_date (ex.: barra reescrita)
+    bump_data_version(session, [ids["T0001"]])
+    session.commit()
+    second = compute_etag(session, q)
+    assert second != first
+
+    # barras novas
+    last = session.execute(select(func.max(asset_history.c.price_date))).scalar()
+    session.execute(delete(asset_history).where(asset_history.c.price_date == last))
+    rebuild_watermarks(session)
+    session.commit()
+    stats = fetch_and_persist(session)
+    assert stats.inserted > 0
+    assert compute_etag(session, q) not in (first, second)
+    versions = session.execute(select(asset_fetch_state.c.data_version)).scalars().all()
+    assert all(v >= 2 for v in versions)
@@ -0,0 +1,148 @@
+import threading
+import time
+
+import pytest
+
+from src.infra.instrumentation import Counter, Gauge, Histogram, Registry, _fmt_value
+from src.infra.profiler import SamplingProfiler
+
+
+@pytest.mark.parametrize("value, text", [(3, "3"), (3.0, "3"), (0.25, "0.25"), (float("inf"), "+Inf"), (-2.0, "-2")])
+def test_fmt_value(value, text):
+    assert _fmt_value(value) == text
+
+
+def test_counter_exposition_and_label_escaping():
+    c = Counter("yf_test_total", "Teste.", ("kind",))
+    c.inc(kind="b")
+    c.inc(2, kind="a")
+    c.inc(0.5, kind='x"\\\ny')
+    assert c.render().splitlines() == [
+        "# HELP yf_test_total Teste.",
+        "# TYPE yf_test_total counter",
+        'yf_test_total{kind="a"} 2',
+        'yf_test_total{kind="b"} 1',
+        'yf_test_total{kind="x\\"\\\\\\ny"} 0.5',
+    ]
+
+
+def test_labels_must_match():
+    c = Counter("yf_test_total", "Teste.", ("kind",))
+    with pytest.raises(ValueError):
+        c.inc(outro="x")
+    with pytest.raises(ValueError):
+        c.inc()
+
+
+def test_gauge_values_and_callback():
+    g = Gauge("yf_test_gauge", "Teste.")
+    g.set(1.5)
+    g.set(2)
+    assert g.render().splitlines()[-1] == "yf_test_gauge 2"
+    assert Gauge("yf_cb", "Teste.", fn=lambda: 7).render().splitlines()[-1] == "yf_cb 7"
+
+    def broken():
+        raise RuntimeError("sem valor")
+
+    # falha na coleta omite a amostra em vez de derrubar o /metrics
+    assert Gauge("yf_broken", "Teste.", fn=broken).render().splitlines() == [
+        "# HELP yf_broken Teste.", "# TYPE yf_broken gauge",
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram("yf_test_seconds", "Teste.", ("stage",), buckets=(1, 0.1))
+    for v in (0.05, 0.1, 0.5, 3.0):
+        h.observe(v, stage="persist")
+    assert h.render().splitlines()[2:] == [
+        'yf_test_seconds_bucket{stage="persist",le="0.1"} 2',  # limite inclusivo (le)
+        'yf_test_seconds_bucket{stage="persist",le="1"} 3',
+        'yf_test_seconds_bucket{stage="persist",le="+Inf"} 4',
+        'yf_test_seconds_sum{stage="persist"} 3.65',
+        'yf_test_seconds_count{stage="persist"} 4',
+    ]
+
+
+def test_histogram_time_context_manager():
+    h = Histogram("yf_test_seconds", "Teste.", buckets=(10,))
+    with h.time():
+        pass
+    with pytest.raises(RuntimeError):
+        with h.time():
+            raise RuntimeError
+    assert h.render().splitlines()[-1] == "yf_test_seconds_count 2"
+
+
+def test_registry_returns_existing_metric_and_renders_all():
+    r = Registry()
+    c = r.register(Counter("yf_a_total", "A."))
+    assert r.register(Counter("yf_a_total", "A.")) is c
+    with pytest.raises(ValueError):
+        r.register(Gauge("yf_a_total", "A."))
+    r.register(Gauge("yf_b", "B.")).set(1)
+    c.inc()
+    text = r.render()
+    assert text.endswith("\n")
+    assert "yf_a_total 1\n" in text and "yf_b 1\n" in text
+
+
+def test_concurrent_increments_are_not_lost():
+    c = Counter("yf_test_total", "Teste.")
+
+    def work():
+        for _ in range(10_000):
+            c.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert c.render().splitlines()[-1] == "yf_test_total 40000"
+
+
+# ----------------- SamplingProfiler -----------------
+
+def _busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profiler_samples_threads_started_after_it():
+    stop = threading.Event()
+    before = threading.Thread(target=_busy_loop, args=(stop,), name="preexistente")
+    before.start()
+    try:
+        profiler = SamplingProfiler(interval_seconds=0.002).start()
+        worker = threading.Thread(target=_busy_loop, args=(stop,), name="fetch-download-3")
+        worker.start()
+        time.sleep(0.2)
+        report = profiler.stop()
+    finally:
+        stop.set()
+        before.join()
+    worker.join()
+    assert report.samples > 0 and report.duration_seconds > 0
+    threads = {stack.split(";", 1)[0] for stack in report.stacks}
+    assert "fetch-download" in threads
+    assert "preexistente" not in threads
+    assert any(stack.startswith("fetch-download;") and stack.endswith("_busy_loop") for stack in report.stacks)
+    line = report.collapsed(limit=1)
+    assert line.endswith("\n") and line.rsplit(" ", 1)[1].strip().isdigit()
+    assert report.as_dict(top=1)["top"][0]["samples"] >= 1
+
+
+def test_profiler_caps_distinct_stacks():
+    stop = threading.Event()
+    waiter = threading.Thread(target=stop.wait, name="waiter")
+    waiter.start()
+    try:
+        profiler = SamplingProfiler(max_stacks=1)
+        profiler.report.stacks["a"] = 1
+        profiler._sample()
+    finally:
+        stop.set()
+        waiter.join()
+    assert profiler.report.stacks["a"] == 1
+    assert profiler.report.stacks["(outras)"] >= 1
+    assert set(profiler.report.stacks) == {"a", "(outras)"}
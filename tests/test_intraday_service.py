@@ -0,0 +1,197 @@
+import contextlib
+import datetime as dt
+import threading
+import time
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import func, select, text
+
+from src.infra.trading_calendar import get_calendar
+from src.models.tables import asset_intraday, asset_intraday_rollup
+from src.services import intraday_service
+from src.services.intraday_service import _normalize_intraday, interval_seconds
+
+
+@pytest.fixture
+def fresh_state(monkeypatch):
+    """Buffers, sincronizações e partições conhecidas zerados (estado de módulo do intraday_service)."""
+    monkeypatch.setattr(intraday_service, "_store", None)
+    monkeypatch.setattr(intraday_service, "_synced", {})
+    monkeypatch.setattr(intraday_service, "_sync_locks", {})
+    monkeypatch.setattr(intraday_service, "_known_partitions", set())
+
+
+# ----------------- interval_seconds -----------------
+
+@pytest.mark.parametrize("interval, seconds", [("1m", 60), ("5m", 300), ("60m", 3600), ("1h", 3600), ("4h", 14400)])
+def test_interval_seconds(interval, seconds):
+    assert interval_seconds(interval) == seconds
+
+
+@pytest.mark.parametrize("interval", ["1d", "m", "0m", "-5m", "5", "", "5min"])
+def test_interval_seconds_rejects_invalid(interval):
+    with pytest.raises(ValueError):
+        interval_seconds(interval)
+
+
+# ----------------- _normalize_intraday -----------------
+
+def _wide(symbols, index, close):
+    fields = ["Open", "High", "Low", "Close", "Volume"]
+    cols = pd.MultiIndex.from_product([fields, symbols])
+    data = np.column_stack([np.asarray(close[s], dtype="float64") for _ in fields for s in symbols])
+    return pd.DataFrame(data, index=index, columns=cols)
+
+
+def test_normalize_multiindex_to_long_utc():
+    idx = pd.DatetimeIndex(["2024-03-01 10:00", "2024-03-01 10:05"]).tz_localize("America/Sao_Paulo")
+    df = _wide(["PETR4.SA", "VALE3.SA"], idx, {"PETR4.SA": [10.0, np.nan], "VALE3.SA": [60.0, 61.0]})
+    out = _normalize_intraday(df, ["PETR4", "VALE3"])
+    assert list(out.columns) == ["ts", "ticker", "open_price", "high_price", "low_price", "close_price", "volume"]
+    # barra sem fechamento fica de fora
+    assert out["ticker"].tolist() == ["PETR4", "VALE3", "VALE3"]
+    assert out["close_price"].tolist() == [10.0, 60.0, 61.0]
+    assert str(out["ts"].dt.tz) == "UTC"
+    assert out["ts"].iloc[0] == pd.Timestamp("2024-03-01 13:00", tz="UTC")
+    assert out["volume"].dtype == np.int64
+
+
+def test_normalize_naive_index_uses_calendar_timezone_and_keeps_missing_volume():
+    idx = pd.DatetimeIndex(["2024-03-01 10:00", "2024-03-01 10:05"])
+    df = pd.DataFrame({
+        "Open": [1.0, 2.0], "High": [1.0, 2.0], "Low": [1.0, 2.0], "Close": [1.0, 2.0], "Volume": [100.0, np.nan],
+    }, index=idx)
+    out = _normalize_intraday(df, ["PETR4"])
+    assert out["ticker"].tolist() == ["PETR4", "PETR4"]
+    expected = pd.Timestamp("2024-03-01 10:00", tz=get_calendar().tz).tz_convert("UTC")
+    assert out["ts"].iloc[0] == expected
+    assert out["volume"].iloc[0] == 100 and pd.isna(out["volume"].iloc[1])
+
+
+def test_normalize_empty_frame():
+    out = _normalize_intraday(pd.DataFrame(), ["PETR4"])
+    assert len(out) == 0 and "ts" in out.columns
+
+
+# ----------------- recent_bars -----------------
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def _bars(start, n, close=10.0):
+    ts = pd.date_range(start, periods=n, freq="5min", tz="UTC")
+    return pd.DataFrame({
+        "ts": ts, "open_price": close, "high_price": close, "low_price": close, "close_price": close, "volume": 100,
+    })
+
+
+def test_recent_bars_syncs_per_ticker_without_blocking_others(monkeypatch, fresh_state, override_settings):
+    override_settings("intraday", tickers=("PETR4", "VALE3"), interval="5m", ring_size=10)
+    blocked, release = threading.Event(), threading.Event()
+
+    def load(session, ticker, since, limit):
+        if ticker == "PETR4":
+            blocked.set()
+            release.wait(5)
+        return _bars("2024-03-01 13:00", 3)
+
+    monkeypatch.setattr(intraday_service, "_load_bars", load)
+    monkeypatch.setattr(intraday_service, "get_session", lambda: contextlib.nullcontext(None))
+    slow = threading.Thread(target=intraday_service.recent_bars, args=("PETR4", 5))
+    slow.start()
+    try:
+        assert blocked.wait(5)
+        # outra ação responde enquanto a sincronização da PETR4 espera o banco
+        t0 = time.monotonic()
+        out = intraday_service.recent_bars("VALE3", 2)
+        assert time.monotonic() - t0 < 1
+        assert [b["close"] for b in out["bars"]] == [10.0, 10.0]
+    finally:
+        release.set()
+        slow.join(5)
+    assert intraday_service.recent_bars("XXXX3", 2) is None
+
+
+def test_recent_bars_resyncs_only_after_an_interval(monkeypatch, fresh_state, override_settings):
+    override_settings("intraday", tickers=("PETR4",), interval="5m", ring_size=10)
+    clock = FakeClock()
+    monkeypatch.setattr(intraday_service, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(intraday_service, "get_session", lambda: contextlib.nullcontext(None))
+    db = _bars("2024-03-01 13:00", 3)
+    calls = []
+
+    def load(session, ticker, since, limit):
+        calls.append(since)
+        return db[db["ts"] >= pd.Timestamp(since)] if since is not None else db
+
+    monkeypatch.setattr(intraday_service, "_load_bars", load)
+    assert len(intraday_service.recent_bars("PETR4", 10)["bars"]) == 3
+    db = pd.concat([db, _bars("2024-03-01 13:15", 1, close=11.0)], ignore_index=True)
+    assert len(intraday_service.recent_bars("PETR4", 10)["bars"]) == 3
+    clock.now += 300
+    bars = intraday_service.recent_bars("PETR4", 10)["bars"]
+    assert [b["close"] for b in bars] == [10.0, 10.0, 10.0, 11.0]
+    # primeira carga completa; a ressincronização parte da última barra do buffer
+    assert calls[0] is None
+    assert calls[1] == dt.datetime(2024, 3, 1, 13, 10, tzinfo=dt.timezone.utc)
+
+
+# ----------------- Retenção (banco) -----------------
+
+def test_maintenance_rolls_up_and_drops_old_partitions(db, make_assets, fresh_state, override_settings):
+    override_settings(
+        "intraday", retention_days=5, downsample_interval="60m", downsample_retention_days=60, partitions_ahead_days=1,
+    )
+    a = make_assets(1)["T0000"]
+    today = get_calendar().today()
+    old = today - dt.timedelta(days=10)
+    recent = today - dt.timedelta(days=1)
+    intraday_service.ensure_partitions(asset_intraday, old, recent)
+    base = dt.datetime.combine(old, dt.time(13, 0), tzinfo=dt.timezone.utc)
+    rows = [
+        {
+            "asset": a, "ts": base + dt.timedelta(minutes=5 * i),
+            "open_price": 10.0 + i, "high_price": 20.0 + i, "low_price": 5.0 + i, "close_price": 11.0 + i, "volume": 100,
+        }
+        for i in range(24)  # 13:00..14:55 -> duas barras de 60m
+    ]
+    rows.append({**rows[0], "ts": dt.datetime.combine(recent, dt.time(13, 0), tzinfo=dt.timezone.utc)})
+    # rollup antigo além de downsample_retention_days
+    ancient = today.replace(day=1) - dt.timedelta(days=120)
+    intraday_service.ensure_partitions(asset_intraday_rollup, ancient, ancient)
+    with db.begin() as conn:
+        conn.execute(asset_intraday.insert(), rows)
+        conn.execute(asset_intraday_rollup.insert(), [{**rows[0], "ts": dt.datetime.combine(ancient, dt.time(), tzinfo=dt.timezone.utc)}])
+
+    res = intraday_service.maintain_intraday()
+
+    with db.connect() as conn:
+        raw = intraday_service._list_partitions(conn, asset_intraday)
+        rolled = intraday_service._list_partitions(conn, asset_intraday_rollup)
+        bars = conn.execute(
+            select(asset_intraday_rollup).order_by(asset_intraday_rollup.c.ts)
+        ).mappings().all()
+        remaining = conn.execute(select(func.count()).select_from(asset_intraday)).scalar()
+        # limpeza: partições criadas pelo teste não ficam para os próximos
+        for name in [*raw, *rolled]:
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        conn.commit()
+
+    assert all(start >= today - dt.timedelta(days=5) for start in raw.values())
+    assert f"asset_intraday_p{old:%Y%m%d}" not in raw
+    assert f"asset_intraday_rollup_p{ancient:%Y%m}" not in rolled
+    assert remaining == 1
+    assert res.downsampled >= 1 and res.rows_rolled == 2 and res.dropped >= 2
+    first, second = bars
+    assert first["ts"] == base and second["ts"] == base + dt.timedelta(hours=1)
+    assert (first["open_price"], first["close_price"]) == (10.0, 22.0)
+    assert (first["high_price"], first["low_price"], first["volume"]) == (31.0, 5.0, 1200)
+    assert (second["open_price"], second["close_price"], second["volume"]) == (22.0, 34.0, 1200)
@@ -0,0 +1,80 @@
+from sqlalchemy import select
+
+from src.constants.common import LOG_LEVEL_WARNING
+from src.models.tables import asset_log, asset_log_state
+from src.services.issue_service import IssueBuffer
+
+
+def _rows(session):
+    return session.execute(
+        select(asset_log.c.ticker, asset_log.c.title, asset_log.c.message, asset_log_state.c.occurrences,
+               asset_log_state.c.resolved_at.isnot(None))
+        .select_from(asset_log.join(asset_log_state, asset_log_state.c.asset_log == asset_log.c.id))
+        .order_by(asset_log.c.ticker, asset_log.c.title)
+    ).fetchall()
+
+
+def test_buffer_dedups_within_a_run_in_memory():
+    buf = IssueBuffer()
+    for i in range(3):
+        buf.add("PETR4", "Erro no Download", f"falha {i}")
+    buf.add("VALE3", "Sem Dados", "vazio", level=LOG_LEVEL_WARNING)
+    assert len(buf) == 2
+
+
+def test_flush_inserts_one_row_per_ticker_and_title(session):
+    buf = IssueBuffer()
+    for i in range(3):
+        buf.add("PETR4", "Erro no Download", f"falha {i}")
+    buf.add("VALE3", "Sem Dados", "vazio", level=LOG_LEVEL_WARNING)
+    res = buf.flush(session)
+    session.commit()
+    assert (res.inserted, res.updated, res.resolved) == (2, 0, 0)
+    assert _rows(session) == [
+        ("PETR4", "Erro no Download", "falha 2", 3, False),
+        ("VALE3", "Sem Dados", "vazio", 1, False),
+    ]
+    assert len(buf) == 0
+
+
+def test_later_runs_update_open_rows_and_resolve_recovered_tickers(session):
+    first = IssueBuffer()
+    first.add("PETR4", "Erro no Download", "a")
+    first.add("VALE3", "Sem Dados", "b")
+    first.flush(session)
+    session.commit()
+
+    second = IssueBuffer()
+    second.add("PETR4", "Erro no Download", "c")
+    second.add("PETR4", "Erro no Download", "d")
+    second.mark_ok(["VALE3", "PETR4"])  # PETR4 teve problema nesta execução: não é resolvido
+    res = second.flush(session)
+    session.commit()
+    assert (res.inserted, res.updated, res.resolved) == (0, 1, 1)
+    assert _rows(session) == [
+        ("PETR4", "Erro no Download", "d", 3, False),
+        ("VALE3", "Sem Dados", "b", 1, True),
+    ]
+
+    # título que deixou de ocorrer para um ticker ainda com problema é resolvido; o novo abre linha
+    third = IssueBuffer()
+    third.add("PETR4", "Sem Dados", "e")
+    third.add("VALE3", "Sem Dados", "f")
+    res = third.flush(session)
+    session.commit()
+    assert (res.inserted, res.resolved) == (2, 1)
+    assert _rows(session) == [
+        ("PETR4", "Erro no Download", "d", 3, True),
+        ("PETR4", "Sem Dados", "e", 1, False),
+        ("VALE3", "Sem Dados", "b", 1, True),
+        ("VALE3", "Sem Dados", "f", 1, False),
+    ]
+
+
+def test_other_services_rows_are_untouched(session):
+    other = IssueBuffer(service="outro")
+    other.add("PETR4", "Erro no Download", "x")
+    other.flush(session)
+    mine = IssueBuffer()
+    mine.mark_ok(["PETR4"])
+    assert mine.flush(session).resolved == 0
@@ -0,0 +1,150 @@
+import threading
+import time
+
+import pytest
+
+from src.services.job_service import (
+    KIND_BACKFILL,
+    KIND_FETCH,
+    KIND_INTRADAY,
+    STATUS_CANCELLED,
+    STATUS_FAILED,
+    STATUS_SUCCEEDED,
+    JobManager,
+)
+from src.services.run_state import RunStats
+
+
+def _wait(job, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while job.status != status and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert job.status == status
+
+
+class Gate:
+    """Runner que bloqueia até `release()`; registra a ordem de execução."""
+
+    def __init__(self, order, name):
+        self.order, self.name = order, name
+        self.started = threading.Event()
+        self._go = threading.Event()
+
+    def release(self):
+        self._go.set()
+
+    def __call__(self, cycle, progress):
+        self.order.append(self.name)
+        self.started.set()
+        while not self._go.wait(0.01):
+            progress.check_cancelled()
+        return RunStats(processed=1)
+
+
+@pytest.fixture
+def manager():
+    managers = []
+
+    def make(runners):
+        m = JobManager(runners)
+        managers.append(m)
+        return m
+
+    yield make
+    for m in managers:
+        m.shutdown()
+
+
+def test_requests_for_an_active_kind_are_coalesced(manager):
+    order = []
+    fetch = Gate(order, "fetch")
+    m = manager({KIND_FETCH: fetch})
+    job, coalesced = m.submit("c1")
+    again, coalesced_again = m.submit("c2", source="scheduler")
+    assert not coalesced and coalesced_again
+    assert again is job and job.requests == 2
+    fetch.release()
+    _wait(job, STATUS_SUCCEEDED)
+    assert job.result["processed"] == 1
+    assert m.submit("c3")[0] is not job
+
+
+def test_batch_lane_runs_by_priority(manager):
+    order = []
+    blocker, fetch, backfill = Gate(order, "blocker"), Gate(order, "fetch"), Gate(order, "backfill")
+    m = manager({"blocker": blocker, KIND_FETCH: fetch, KIND_BACKFILL: backfill})
+    m.submit("c", kind="blocker")
+    blocker.started.wait(5)
+    b, _ = m.submit("c", kind=KIND_BACKFILL)
+    f, _ = m.submit("c", kind=KIND_FETCH)
+    for gate in (blocker, fetch, backfill):
+        gate.release()
+    _wait(b, STATUS_SUCCEEDED)
+    assert order == ["blocker", "fetch", "backfill"]
+
+
+def test_intraday_lane_does_not_wait_for_batch_jobs(manager):
+    order = []
+    fetch, intraday = Gate(order, "fetch"), Gate(order, "intraday")
+    m = manager({KIND_FETCH: fetch, KIND_INTRADAY: intraday})
+    f, _ = m.submit("c", kind=KIND_FETCH)
+    fetch.started.wait(5)
+    i, _ = m.submit("c", kind=KIND_INTRADAY)
+    intraday.release()
+    _wait(i, STATUS_SUCCEEDED)
+    assert f.status == "running"
+    fetch.release()
+    _wait(f, STATUS_SUCCEEDED)
+
+
+def test_cancel_pending_and_running_jobs(manager):
+    order = []
+    fetch, backfill = Gate(order, "fetch"), Gate(order, "backfill")
+    m = manager({KIND_FETCH: fetch, KIND_BACKFILL: backfill})
+    running, _ = m.submit("c", kind=KIND_FETCH)
+    fetch.started.wait(5)
+    pending, _ = m.submit("c", kind=KIND_BACKFILL)
+    assert m.cancel(pending.id).status == STATUS_CANCELLED
+    m.cancel(running.id)
+    _wait(running, STATUS_CANCELLED)
+    assert order == ["fetch"]
+    assert m.cancel("nao-existe") is None
+
+
+def test_resubmit_after_cancel_opens_a_new_job(manager):
+    order = []
+    go = threading.Event()
+
+    def slow_to_unwind(cycle, progress):
+        order.append(cycle)
+        if cycle == "c1":
+            go.wait(5)
+            progress.check_cancelled()
+        return RunStats(processed=1)
+
+    m = manager({KIND_FETCH: slow_to_unwind})
+    first, _ = m.submit("c1")
+    while not order:
+        time.sleep(0.005)
+    m.cancel(first.id)
+    second, coalesced = m.submit("c2")
+    assert not coalesced and second is not first
+    go.set()
+    _wait(first, STATUS_CANCELLED)
+    _wait(second, STATUS_SUCCEEDED)
+    assert order == ["c1", "c2"]
+
+
+def test_failures_are_recorded(manager):
+    def boom(cycle, progress):
+        raise RuntimeError("falhou")
+
+    m = manager({KIND_FETCH: boom})
+    job, _ = m.submit("c")
+    _wait(job, STATUS_FAILED)
+    assert job.error == "falhou"
+
+
+def test_unknown_kind(manager):
+    with pytest.raises(ValueError):
+        manager({KIND_FETCH: lambda c, p: RunStats()}).submit("c", kind="outro")
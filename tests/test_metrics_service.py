@@ -0,0 +1,132 @@
+import datetime as dt
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import delete, select
+
+from src.models.tables import asset_history, asset_metrics
+from src.services.metrics_service import (
+    LOOKBACK_BARS,
+    METRIC_COLUMNS,
+    SMA_LONG,
+    SMA_SHORT,
+    TRADING_DAYS_PER_YEAR,
+    VOL_WINDOW,
+    MetricsWork,
+    compute_metrics,
+    update_metrics,
+)
+
+
+def _series(n: int, seed: int) -> tuple:
+    rng = np.random.default_rng(seed)
+    close = 20.0 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    dividends = np.where(rng.random(n) < 0.03, 0.1, 0.0)
+    return close, dividends
+
+
+def _full(codes, close, dividends, include_dividends=True):
+    n = len(close)
+    return compute_metrics(codes, close, dividends, np.ones(n, bool), np.ones(n), include_dividends)
+
+
+def test_matches_pandas_reference_for_one_series():
+    close, div = _series(300, 1)
+    m = _full(np.zeros(300, int), close, div)
+    s = pd.Series(close)
+    gross = (s + div) / s.shift()
+    lr = np.log(gross)
+    np.testing.assert_allclose(m["ret_1d"], gross - 1, equal_nan=True)
+    np.testing.assert_allclose(m["sma_20"], s.rolling(SMA_SHORT).mean(), equal_nan=True)
+    np.testing.assert_allclose(m["sma_50"], s.rolling(SMA_LONG).mean(), equal_nan=True)
+    np.testing.assert_allclose(
+        m["vol_20"], lr.rolling(VOL_WINDOW).std() * math.sqrt(TRADING_DAYS_PER_YEAR), equal_nan=True, rtol=1e-9,
+    )
+    np.testing.assert_allclose(m["tr_index"], np.exp(np.nan_to_num(lr).cumsum()), rtol=1e-12)
+
+
+def test_windows_do_not_cross_assets():
+    a, da = _series(60, 2)
+    b, db = _series(60, 3)
+    codes = np.repeat([0, 1], 60)
+    m = _full(codes, np.concatenate([a, b]), np.concatenate([da, db]))
+    alone = _full(np.zeros(60, int), b, db)
+    for c in METRIC_COLUMNS:
+        np.testing.assert_allclose(m[c][60:], alone[c], equal_nan=True)
+
+
+@pytest.mark.parametrize("since", [1, 30, LOOKBACK_BARS, 200, 299])
+def test_incremental_equals_full(since):
+    close, div = _series(300, 4)
+    full = _full(np.zeros(300, int), close, div)
+    lo = max(0, since - LOOKBACK_BARS)
+    n = 300 - lo
+    write_from = np.arange(lo, 300) >= since
+    seed = full["tr_index"][since - 1]
+    inc = compute_metrics(np.zeros(n, int), close[lo:], div[lo:], write_from, np.full(n, seed), True)
+    for c in METRIC_COLUMNS:
+        np.testing.assert_allclose(inc[c][write_from], full[c][since:], equal_nan=True, rtol=1e-9, err_msg=c)
+
+
+# ----------------- Banco -----------------
+
+def _insert_history(session, asset_id, dates, close):
+    session.execute(asset_history.insert(), [
+        {"asset": asset_id, "price_date": d, "close_price": round(float(c), 6), "dividends": 0}
+        for d, c in zip(dates, close)
+    ])
+
+
+def _metrics(session, asset_id) -> pd.DataFrame:
+    rows = session.execute(
+        select(asset_metrics.c.price_date, *[asset_metrics.c[c] for c in METRIC_COLUMNS])
+        .where(asset_metrics.c.asset == asset_id)
+        .order_by(asset_metrics.c.price_date)
+    ).fetchall()
+    return pd.DataFrame(rows, columns=["price_date", *METRIC_COLUMNS]).astype({c: "float64" for c in METRIC_COLUMNS})
+
+
+def test_update_metrics_incremental_equals_full_across_long_gap(session, make_assets):
+    a = make_assets(1)["T0000"]
+    # buraco de 120 dias corridos logo antes do trecho novo: a janela de lookback tem de ir além dele
+    dates = list(pd.bdate_range("2023-01-02", periods=200).date)
+    gap_end = dates[-1] + dt.timedelta(days=120)
+    dates += list(pd.bdate_range(gap_end, periods=40).date)
+    close, _ = _series(len(dates), 5)
+    _insert_history(session, a, dates, close)
+    update_metrics(session, MetricsWork({a: None}))
+    session.commit()
+    full = _metrics(session, a)
+
+    since = dates[200]
+    session.execute(delete(asset_metrics).where(asset_metrics.c.price_date >= since))
+    written = update_metrics(session, MetricsWork({a: since}))
+    session.commit()
+    assert written == 40
+    pd.testing.assert_frame_equal(_metrics(session, a), full, rtol=1e-6)
+
+
+def test_update_metrics_falls_back_to_full_when_previous_bar_is_missing(session, make_assets):
+    a = make_assets(1)["T0000"]
+    dates = list(pd.bdate_range("2023-01-02", periods=80).date)
+    close, _ = _series(80, 6)
+    _insert_history(session, a, dates, close)
+    # sem métrica anterior gravada: o ativo é recalculado por inteiro
+    assert update_metrics(session, MetricsWork({a: dates[50]})) == 80
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_fetch_cycle_computes_metrics_only_when_enabled(session, make_assets, synthetic_engine, override_settings, enabled):
+    from sqlalchemy import func
+
+    from src.services.fetcher_service import fetch_and_persist
+
+    override_settings("metrics", enabled=enabled)
+    make_assets(2)
+    fetch_and_persist(session)
+    bars = session.execute(select(func.count()).select_from(asset_history)).scalar()
+    metrics = session.execute(select(func.count()).select_from(asset_metrics)).scalar()
+    assert bars > 0
+    assert metrics == (bars if enabled else 0)
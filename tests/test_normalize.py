@@ -0,0 +1,70 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+from benchmarks.bench_normalize import _legacy_normalize_prices, _wide_frame
+from src.services.download_service import base_ticker
+from src.services.fetcher_service import _LONG_COLUMNS, _iter_normalized, _normalize_prices
+
+
+def _tickers(df):
+    return [base_ticker(c) for c in dict.fromkeys(df.columns.get_level_values(1))]
+
+
+def _canonical(df: pd.DataFrame) -> pd.DataFrame:
+    # o persist descarta linhas sem fechamento; a implementação antiga ainda as gerava
+    df = df.dropna(subset=["close_price"])
+    df = df[_LONG_COLUMNS].sort_values(["ticker", "price_date"]).reset_index(drop=True)
+    df["volume"] = df["volume"].astype("Int64")
+    for c in ["open_price", "high_price", "low_price", "close_price", "dividends", "splits"]:
+        df[c] = df[c].astype("float64")
+    return df
+
+
+def _legacy(df, tickers):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)  # stack() da implementação antiga
+        return _legacy_normalize_prices(df, tickers)
+
+
+@pytest.mark.parametrize("n_tickers, n_days", [(1, 30), (7, 250), (25, 40)])
+def test_matches_legacy_normalizer(n_tickers, n_days):
+    df = _wide_frame(n_tickers, n_days, seed=n_tickers)
+    tickers = _tickers(df)
+    pdt.assert_frame_equal(_canonical(_normalize_prices(df, tickers)), _canonical(_legacy(df, tickers)))
+
+
+def test_one_batch_per_ticker_without_suffix_or_empty_rows():
+    df = _wide_frame(5, 60, seed=3)
+    batches = list(_iter_normalized(df, _tickers(df)))
+    assert [b["ticker"].iloc[0] for b in batches] == [f"T{i:04d}" for i in range(5)]
+    for b in batches:
+        assert b["ticker"].nunique() == 1
+        assert b["close_price"].notna().all()  # datas antes da listagem ficam de fora
+        assert b["price_date"].is_monotonic_increasing
+
+
+def test_single_ticker_flat_columns():
+    df = _wide_frame(1, 20, seed=1)
+    flat = df.droplevel(1, axis=1)
+    out = _normalize_prices(flat, ["PETR4"])
+    assert set(out["ticker"]) == {"PETR4"}
+    pdt.assert_frame_equal(_canonical(out).drop(columns="ticker"), _canonical(_normalize_prices(df, ["PETR4"])).drop(columns="ticker"))
+
+
+def test_missing_volume_becomes_nullable_int_and_missing_fields_are_nan():
+    df = _wide_frame(2, 10, seed=2).drop(columns="Stock Splits", level=0)
+    df.loc[df.index[-1], ("Volume", "T0000.SA")] = np.nan
+    out = _normalize_prices(df, _tickers(df))
+    assert str(out["volume"].dtype) == "Int64"
+    assert out["volume"].isna().sum() == 1
+    assert (out["splits"] == 0.0).all()
+
+
+def test_empty_frame():
+    df = _wide_frame(2, 10).iloc[:0]
+    out = _normalize_prices(df, _tickers(df))
+    assert list(out.columns) == _LONG_COLUMNS and out.empty
@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+from src.infra.pipeline import Pipeline, Stage
+
+
+def test_items_pass_through_all_stages_in_order():
+    out = []
+    pipeline = Pipeline([Stage("double", lambda x: x * 2), Stage("collect", out.append)], depth=1)
+    stats = pipeline.run(range(10))
+    assert out == [x * 2 for x in range(10)]
+    assert [s.name for s in stats] == ["source", "double", "collect"]
+    assert [s.items for s in stats] == [10, 10, 10]
+
+
+def test_none_result_drops_item():
+    out = []
+    Pipeline([Stage("odd", lambda x: x if x % 2 else None), Stage("collect", out.append)]).run(range(6))
+    assert out == [1, 3, 5]
+
+
+def test_multiple_workers_process_every_item():
+    out, lock = [], threading.Lock()
+
+    def collect(x):
+        with lock:
+            out.append(x)
+
+    Pipeline([Stage("id", lambda x: x, workers=4), Stage("collect", collect, workers=2)], depth=2).run(range(100))
+    assert sorted(out) == list(range(100))
+
+
+def test_stats_are_exact_with_many_workers():
+    n = 5000
+    stats = Pipeline(
+        [Stage("id", lambda x: x, workers=8), Stage("drop", lambda x: None, workers=8)], depth=4,
+    ).run(range(n))
+    assert [s.items for s in stats] == [n, n, n]
+    assert all(s.busy_seconds >= 0 and s.idle_seconds >= 0 for s in stats[1:])
+
+
+def test_stage_error_is_raised_and_aborts_remaining_items():
+    seen = []
+
+    def boom(x):
+        if x == 3:
+            raise RuntimeError("falhou no 3")
+        return x
+
+    pipeline = Pipeline([Stage("boom", boom), Stage("collect", seen.append)], depth=1)
+    with pytest.raises(RuntimeError, match="falhou no 3"):
+        pipeline.run(range(1000))
+    # após a falha o produtor para e os estágios só drenam as filas
+    assert 3 not in seen
+    assert len(seen) < 1000
+
+
+def test_first_error_wins_across_workers():
+    def boom(x):
+        raise ValueError(f"erro {x}")
+
+    with pytest.raises(ValueError, match=r"erro \d+"):
+        Pipeline([Stage("boom", boom, workers=3)]).run(range(20))
+
+
+def test_source_error_is_raised_and_stages_drain():
+    out = []
+
+    def source():
+        yield 1
+        yield 2
+        raise KeyError("fonte")
+
+    with pytest.raises(KeyError):
+        Pipeline([Stage("collect", out.append)]).run(source())
+    # itens ainda na fila no momento da falha são descartados, não processados
+    assert set(out) <= {1, 2}
+
+
+def test_invalid_configuration():
+    with pytest.raises(ValueError):
+        Pipeline([])
+    with pytest.raises(ValueError):
+        Pipeline([Stage("zero", lambda x: x, workers=0)])
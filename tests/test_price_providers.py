@@ -0,0 +1,88 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.infra.resilience import ThrottledError
+from src.services.price_providers import SyntheticProvider
+
+EPOCH = dt.date(2015, 1, 2)
+SYMBOLS = [f"T{i:04d}.SA" for i in range(40)]
+
+
+def _provider(**kw):
+    return SyntheticProvider(seed=7, epoch=EPOCH, **kw)
+
+
+def _download(p, start, end, symbols=SYMBOLS, **kw):
+    return p.download(symbols, start=start, end=end, **kw)
+
+
+def test_same_seed_gives_the_same_bars():
+    a = _download(_provider(), "2018-01-01", "2019-01-01")
+    b = _download(_provider(), "2018-01-01", "2019-01-01")
+    pd.testing.assert_frame_equal(a, b)
+    other = SyntheticProvider(seed=8, epoch=EPOCH).download(SYMBOLS, start="2018-01-01", end="2019-01-01")
+    assert not np.allclose(a["Close"].fillna(0).to_numpy(), other["Close"].fillna(0).to_numpy())
+
+
+def test_raw_series_is_a_prefix_of_a_longer_one():
+    p = _provider()
+    short = _download(p, "2016-01-01", "2018-06-29", auto_adjust=False)
+    long = _download(p, "2016-01-01", "2020-12-31", auto_adjust=False)
+    # o incremental de hoje encaixa no backfill de ontem
+    pd.testing.assert_frame_equal(short, long.loc[short.index])
+
+
+def test_any_window_is_a_slice_of_the_full_series():
+    p = _provider()
+    full = _download(p, None, "2020-12-31", period="max", auto_adjust=False)
+    window = _download(p, "2019-03-01", "2019-09-30", auto_adjust=False)
+    pd.testing.assert_frame_equal(window, full.loc[window.index])
+    assert full.index[0] >= pd.Timestamp(EPOCH)
+
+
+def test_unadjusted_series_has_dividends_splits_and_late_listings():
+    df = _download(_provider(), None, "2021-12-31", period="max", auto_adjust=False)
+    assert (df["Dividends"] > 0).any().sum() > 0
+    assert (df["Stock Splits"] > 0).to_numpy().any()
+    first_bar = df["Close"].apply(pd.Series.first_valid_index)
+    assert first_bar.nunique() > 1
+    assert (df["Low"] <= df["Close"]).where(df["Close"].notna(), True).all().all()
+    assert (df["High"] >= df["Close"]).where(df["Close"].notna(), True).all().all()
+
+
+def test_auto_adjust_rescales_prices_before_each_event():
+    p = _provider()
+    raw = _download(p, None, "2021-12-31", period="max", auto_adjust=False)
+    adj = _download(p, None, "2021-12-31", period="max", auto_adjust=True)
+    # fator de ajuste do Yahoo: produto dos fatores dos eventos posteriores a cada dia
+    for sym in SYMBOLS:
+        close, div, split = raw["Close"][sym], raw["Dividends"][sym], raw["Stock Splits"][sym]
+        prev = close.shift(1)
+        factor = ((1.0 - div / prev).where(div > 0, 1.0) / split.where(split > 0, 1.0)).fillna(1.0)
+        after = factor[::-1].cumprod()[::-1].shift(-1, fill_value=1.0)
+        np.testing.assert_allclose(adj["Close"][sym].dropna(), (close * after).dropna(), rtol=1e-9)
+    # a última barra não tem evento posterior: bate com a bruta
+    np.testing.assert_allclose(adj["Close"].iloc[-1].dropna(), raw["Close"].iloc[-1].dropna())
+
+
+def test_a_new_event_changes_adjusted_history():
+    p = _provider()
+    raw = _download(p, None, "2021-12-31", period="max", auto_adjust=False)
+    sym, day = next(
+        (s, raw.index[raw["Dividends"][s] > 0][-1]) for s in SYMBOLS if (raw["Dividends"][s] > 0).any()
+    )
+    before = _download(p, "2016-01-01", day - pd.Timedelta(days=1), symbols=[sym])
+    after = _download(p, "2016-01-01", day, symbols=[sym])
+    assert not np.allclose(before["Close"][sym].dropna(), after["Close"][sym].loc[before.index].dropna())
+
+
+def test_intraday_and_fault_injection():
+    p = SyntheticProvider(seed=7, epoch=EPOCH, throttle_rate=1.0)
+    with pytest.raises(ThrottledError):
+        p.download(SYMBOLS[:1], start="2024-03-01", end="2024-03-01")
+    intraday = _provider().download(SYMBOLS[:2], start="2024-03-01", end="2024-03-01", interval="5m")
+    assert str(intraday.index.tz) == "America/Sao_Paulo"
+    assert len(intraday) == 8 * 12
@@ -0,0 +1,213 @@
+import datetime as dt
+import threading
+import time
+import types
+
+import pytest
+
+from src.infra import cache
+from src.infra.cache import InMemoryBackend, SingleFlight, TTLCache
+from src.services.quote_service import QuoteService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = FakeClock()
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(monotonic=c.monotonic))
+    return c
+
+
+def _quote(ticker, day, close=10.0):
+    return {"ticker": ticker, "price_date": dt.date(2024, 1, day).isoformat(), "close": close}
+
+
+class Loader:
+    """Substituto do banco: conta as consultas e os tickers pedidos."""
+
+    def __init__(self, quotes):
+        self.quotes = quotes
+        self.calls = []
+
+    def __call__(self, tickers):
+        self.calls.append(sorted(tickers))
+        return {t: self.quotes[t] for t in tickers if t in self.quotes}
+
+
+def _service(loader, shared=None, negative_ttl=0.0, ttl=30):
+    return QuoteService(
+        local=TTLCache(max_entries=100, ttl_seconds=ttl),
+        shared=shared,
+        shared_ttl_seconds=900,
+        loader=loader,
+        negative_ttl_seconds=negative_ttl,
+    )
+
+
+# ----------------- TTLCache -----------------
+
+def test_ttl_cache_expires_entries(clock):
+    c = TTLCache(max_entries=10, ttl_seconds=30)
+    c.set("a", 1)
+    c.set("b", 2, ttl_seconds=5)
+    clock.now += 10
+    assert c.get("a") == 1 and c.get("b") is None
+    clock.now += 21
+    assert c.get("a") is None
+    assert (c.hits, c.misses) == (1, 2)
+    assert len(c) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    c = TTLCache(max_entries=2, ttl_seconds=30)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert (c.get("a"), c.get("c")) == (1, 3)
+
+
+# ----------------- SingleFlight -----------------
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    entered, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow(keys):
+        calls.append(sorted(keys))
+        entered.set()
+        release.wait(5)
+        return {k: k.upper() for k in keys}
+
+    results = {}
+    first = threading.Thread(target=lambda: results.update(first=flight.do_many(["a", "b"], slow)))
+    first.start()
+    entered.wait(5)
+    second = threading.Thread(target=lambda: results.update(second=flight.do_many(["b", "c"], slow)))
+    second.start()
+    # "b" está em voo: a segunda chamada só consulta "c" e espera o resultado de "b"
+    deadline = time.monotonic() + 5
+    while len(calls) < 2 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    release.set()
+    first.join(5)
+    second.join(5)
+    assert calls == [["a", "b"], ["c"]]
+    assert results["first"] == {"a": "A", "b": "B"}
+    assert results["second"] == {"b": "B", "c": "C"}
+
+
+def test_single_flight_propagates_errors_and_forgets_the_key():
+    flight = SingleFlight()
+
+    def boom(keys):
+        raise RuntimeError("banco fora")
+
+    with pytest.raises(RuntimeError):
+        flight.do_many(["a"], boom)
+    assert flight.do_many(["a"], lambda keys: {"a": 1}) == {"a": 1}
+
+
+# ----------------- QuoteService -----------------
+
+def test_misses_fall_back_to_the_loader_once(clock):
+    loader = Loader({"PETR4": _quote("PETR4", 2)})
+    svc = _service(loader)
+    assert svc.get_many(["petr4.sa", "PETR4"]) == {"PETR4": _quote("PETR4", 2)}
+    assert svc.get("PETR4") == _quote("PETR4", 2)
+    assert loader.calls == [["PETR4"]]
+    clock.now += 31
+    svc.get("PETR4")
+    assert loader.calls == [["PETR4"], ["PETR4"]]
+
+
+def test_shared_tier_is_read_before_the_loader(clock):
+    shared = InMemoryBackend()
+    loader = Loader({"PETR4": _quote("PETR4", 2)})
+    _service(loader, shared=shared).get("PETR4")
+    # outra réplica: cache local vazio, compartilhado já preenchido
+    other = _service(Loader({}), shared=shared)
+    assert other.get("PETR4") == _quote("PETR4", 2)
+    assert other._loader.calls == []
+
+
+def test_shared_tier_failures_fall_back_to_the_loader(clock):
+    class Broken(InMemoryBackend):
+        def get_many(self, keys):
+            raise ConnectionError("redis fora")
+
+    loader = Loader({"PETR4": _quote("PETR4", 2)})
+    assert _service(loader, shared=Broken()).get("PETR4") == _quote("PETR4", 2)
+    assert loader.calls == [["PETR4"]]
+
+
+def test_publish_does_not_regress(clock):
+    shared = InMemoryBackend()
+    svc = _service(Loader({}), shared=shared)
+    assert svc.publish([_quote("PETR4", 3, close=11.0)]) == 1
+    # reprocessamento de histórico: barra mais antiga que a cacheada é ignorada
+    assert svc.publish([_quote("PETR4", 2, close=9.0), _quote("VALE3", 2)]) == 1
+    assert svc.get("PETR4")["close"] == 11.0
+    assert svc.publish([_quote("PETR4", 3, close=12.0)]) == 1
+    assert svc.get("PETR4")["close"] == 12.0
+    assert shared.get_many(["quote:PETR4"])["quote:PETR4"]["close"] == 12.0
+
+
+def test_invalidate_drops_both_tiers(clock):
+    shared = InMemoryBackend()
+    loader = Loader({"PETR4": _quote("PETR4", 2)})
+    svc = _service(loader, shared=shared)
+    svc.publish([_quote("PETR4", 3)])
+    svc.invalidate(["PETR4.SA"])
+    assert svc.get("PETR4") == _quote("PETR4", 2)
+    assert loader.calls == [["PETR4"]]
+
+
+def test_unknown_tickers_are_cached_negatively(clock):
+    loader = Loader({"PETR4": _quote("PETR4", 2)})
+    svc = _service(loader, negative_ttl=10)
+    assert svc.get_many(["PETR4", "XXXX3"]) == {"PETR4": _quote("PETR4", 2)}
+    assert svc.get("XXXX3") is None
+    assert loader.calls == [["PETR4", "XXXX3"]]
+    clock.now += 11
+    assert svc.get("XXXX3") is None
+    assert loader.calls == [["PETR4", "XXXX3"], ["XXXX3"]]
+    # cotação nova do fetch substitui a marca negativa
+    svc.publish([_quote("XXXX3", 3)])
+    assert svc.get("XXXX3") == _quote("XXXX3", 3)
+
+
+def test_zero_negative_ttl_disables_negative_caching(clock):
+    loader = Loader({})
+    svc = _service(loader)
+    svc.get("XXXX3")
+    svc.get("XXXX3")
+    assert loader.calls == [["XXXX3"], ["XXXX3"]]
+
+
+# ----------------- Banco -----------------
+
+def test_load_latest_from_db(db, make_assets):
+    from src.models.tables import asset_history
+    from src.services.quote_service import _load_latest_from_db
+
+    ids = make_assets(2)
+    rows = [
+        {"asset": ids["T0000"], "price_date": dt.date(2024, 1, d), "close_price": float(d), "volume": d}
+        for d in (2, 3, 4)
+    ]
+    with db.begin() as conn:
+        conn.execute(asset_history.insert(), rows)
+    out = _load_latest_from_db(["T0000", "T0001", "XXXX3"])
+    assert list(out) == ["T0000"]
+    assert out["T0000"]["price_date"] == "2024-01-04"
+    assert out["T0000"]["close"] == 4.0 and out["T0000"]["volume"] == 4
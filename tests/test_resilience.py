@@ -0,0 +1,137 @@
+import types
+
+import pytest
+
+from src.infra import resilience
+from src.infra.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+        self.slept += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = FakeClock()
+    monkeypatch.setattr(resilience, "time", types.SimpleNamespace(monotonic=c.monotonic, sleep=c.sleep))
+    return c
+
+
+# ----------------- TokenBucket -----------------
+
+def test_bucket_burst_then_waits_for_refill(clock):
+    bucket = TokenBucket(rate=2.0, capacity=4)
+    assert [bucket.acquire() for _ in range(4)] == [0.0] * 4
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert bucket.acquire(2) == pytest.approx(1.0)
+    assert clock.slept == pytest.approx(1.5)
+
+
+def test_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket(rate=1.0, capacity=2)
+    bucket.acquire(2)
+    clock.now += 60
+    assert bucket.acquire(2) == 0.0
+    assert bucket.acquire(1) == pytest.approx(1.0)
+
+
+def test_bucket_request_above_capacity_is_capped(clock):
+    bucket = TokenBucket(rate=1.0, capacity=3)
+    assert bucket.acquire(10) == 0.0
+    assert bucket.acquire(10) == pytest.approx(3.0)
+
+
+def test_bucket_rate_zero_disables_limit(clock):
+    bucket = TokenBucket(rate=0, capacity=1)
+    assert all(bucket.acquire(100) == 0.0 for _ in range(10))
+    assert clock.slept == 0.0
+
+
+# ----------------- CircuitBreaker -----------------
+
+def test_breaker_opens_after_threshold_and_half_opens_after_cooldown(clock):
+    cb = CircuitBreaker(failure_threshold=3, cooldown_seconds=10, max_cooldown_seconds=100)
+    for _ in range(2):
+        cb.record_failure()
+    assert cb.state == CircuitBreaker.CLOSED and cb.allow()
+    cb.record_failure()
+    assert cb.state == CircuitBreaker.OPEN
+    assert not cb.allow()
+    assert cb.remaining_open_seconds() == pytest.approx(10)
+
+    clock.now += 10
+    assert cb.allow()  # chamada de teste
+    assert cb.state == CircuitBreaker.HALF_OPEN
+    assert not cb.allow()  # só uma por vez
+    cb.record_success()
+    assert cb.state == CircuitBreaker.CLOSED and cb.allow()
+
+
+def test_success_resets_consecutive_failures(clock):
+    cb = CircuitBreaker(failure_threshold=2)
+    cb.record_failure()
+    cb.record_success()
+    cb.record_failure()
+    assert cb.state == CircuitBreaker.CLOSED
+
+
+def test_throttle_opens_immediately(clock):
+    cb = CircuitBreaker(failure_threshold=5)
+    cb.record_failure(throttled=True)
+    assert cb.state == CircuitBreaker.OPEN
+
+
+def test_failed_probe_reopens_with_doubled_cooldown_up_to_max(clock):
+    cb = CircuitBreaker(failure_threshold=1, cooldown_seconds=10, max_cooldown_seconds=25)
+    cb.record_failure()
+    for expected in (20, 25, 25):
+        clock.now += cb.remaining_open_seconds()
+        assert cb.allow()
+        cb.record_failure()
+        assert cb.state == CircuitBreaker.OPEN
+        assert cb.remaining_open_seconds() == pytest.approx(expected)
+    clock.now += 25
+    assert cb.allow()
+    cb.record_success()
+    cb.record_failure()
+    assert cb.remaining_open_seconds() == pytest.approx(10)  # cooldown volta ao base
+
+
+def test_release_frees_probe_without_changing_state(clock):
+    cb = CircuitBreaker(failure_threshold=1, cooldown_seconds=5)
+    cb.record_failure()
+    clock.now += 5
+    assert cb.allow()
+    assert not cb.allow()
+    cb.release()
+    assert cb.state == CircuitBreaker.HALF_OPEN
+    assert cb.allow()
+
+
+def test_wait_until_allowed_blocks_for_cooldown_or_times_out(clock):
+    cb = CircuitBreaker(failure_threshold=1, cooldown_seconds=30)
+    cb.record_failure()
+    with pytest.raises(CircuitOpenError):
+        cb.wait_until_allowed(timeout=5)
+    assert clock.slept == pytest.approx(5)
+    cb.wait_until_allowed()
+    assert clock.slept == pytest.approx(30)
+    assert cb.state == CircuitBreaker.HALF_OPEN
+
+
+# ----------------- RetryPolicy -----------------
+
+def test_backoff_is_jittered_and_capped():
+    policy = RetryPolicy(max_retries=5, base_seconds=1.0, max_seconds=8.0)
+    for attempt in range(8):
+        for _ in range(50):
+            assert 0 <= policy.backoff(attempt) <= min(8.0, 2 ** attempt)
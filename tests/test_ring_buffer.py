@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from src.infra.ring_buffer import BAR_FIELDS, BarRing, RingBufferStore
+
+
+def _bars(ts, base=0.0):
+    ts = np.asarray(ts, dtype=np.int64)
+    return ts, np.repeat((ts.astype(float) + base)[:, None], len(BAR_FIELDS), axis=1)
+
+
+def test_empty_ring():
+    ring = BarRing(4)
+    ts, values = ring.last()
+    assert len(ring) == 0 and ring.latest_ts is None
+    assert ts.shape == (0,) and values.shape == (0, len(BAR_FIELDS))
+
+
+def test_keeps_last_capacity_bars_in_order_across_wraparound():
+    ring = BarRing(5)
+    for start in range(0, 12, 3):
+        assert ring.extend(*_bars(range(start, start + 3))) == 3
+    ts, values = ring.last()
+    assert ts.tolist() == [7, 8, 9, 10, 11]
+    assert values[:, 3].tolist() == [7.0, 8.0, 9.0, 10.0, 11.0]
+    assert ring.latest_ts == 11 and len(ring) == 5
+    assert ring.last(2)[0].tolist() == [10, 11]
+    assert ring.last(0)[0].tolist() == []
+    assert ring.last(99)[0].tolist() == [7, 8, 9, 10, 11]
+
+
+def test_extend_larger_than_capacity_keeps_tail():
+    ring = BarRing(3)
+    assert ring.extend(*_bars(range(10))) == 10
+    assert ring.last()[0].tolist() == [7, 8, 9]
+
+
+def test_existing_bars_are_revised_and_old_missing_ones_ignored():
+    ring = BarRing(4)
+    ring.extend(*_bars([10, 20, 30]))
+    # 20 e 30 revisadas, 15 (antiga e ausente) ignorada, 40 nova
+    assert ring.extend(*_bars([15, 20, 30, 40], base=0.5)) == 1
+    ts, values = ring.last()
+    assert ts.tolist() == [10, 20, 30, 40]
+    assert values[:, 3].tolist() == [10.0, 20.5, 30.5, 40.5]
+
+
+def test_last_returns_copies():
+    ring = BarRing(3)
+    ring.extend(*_bars([1, 2]))
+    ts, values = ring.last()
+    values[:] = -1
+    assert ring.last()[1][0, 0] == 1.0
+
+
+def test_matches_reference_model_under_random_updates():
+    rng = np.random.default_rng(7)
+    capacity = 16
+    ring, model, latest = BarRing(capacity), {}, -1
+    for _ in range(300):
+        start = max(0, latest - int(rng.integers(0, 5)))
+        ts = np.unique(start + rng.integers(0, 8, size=int(rng.integers(1, 6))))
+        base = float(rng.random())
+        ring.extend(*_bars(ts, base))
+        for t in ts.tolist():
+            if t > latest or t in model:
+                model[t] = t + base
+        latest = max(latest, int(ts.max()))
+        model = dict(sorted(model.items())[-capacity:])
+        got_ts, got_values = ring.last()
+        assert got_ts.tolist() == list(model)
+        np.testing.assert_allclose(got_values[:, 3], list(model.values()))
+
+
+def test_clear():
+    ring = BarRing(3)
+    ring.extend(*_bars([1, 2, 3]))
+    ring.clear()
+    assert len(ring) == 0 and ring.latest_ts is None
+    ring.extend(*_bars([1]))
+    assert ring.last()[0].tolist() == [1]
+
+
+def test_store():
+    store = RingBufferStore(8)
+    assert store.get("PETR4") is None
+    ring = store.get("PETR4", create=True)
+    assert store.get("PETR4") is ring and ring.capacity == 8
+    store.get("VALE3", create=True)
+    assert sorted(store.keys()) == ["PETR4", "VALE3"]
+    assert store.nbytes() == 2 * (8 * 8 + 8 * len(BAR_FIELDS) * 8)
+    store.discard("PETR4")
+    assert store.keys() == ["VALE3"]
+
+
+@pytest.mark.parametrize("capacity", [0, -3])
+def test_capacity_is_at_least_one(capacity):
+    ring = BarRing(capacity)
+    ring.extend(*_bars([1, 2]))
+    assert ring.last()[0].tolist() == [2]
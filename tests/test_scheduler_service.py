@@ -0,0 +1,53 @@
+import datetime as dt
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from src.infra.trading_calendar import ExchangeCalendar
+from src.services.scheduler_service import TradingSessionTrigger
+
+SP = ZoneInfo("America/Sao_Paulo")
+
+
+def _at(day, hh, mm=0):
+    return dt.datetime(2024, 2, day, hh, mm, tzinfo=SP)
+
+
+@pytest.fixture
+def trigger():
+    return TradingSessionTrigger(ExchangeCalendar(session_open="10:00", session_close="18:00"), 15, 30)
+
+
+@pytest.mark.parametrize("now, expected", [
+    (_at(14, 8), _at(14, 10)),             # antes da abertura: primeira barra do dia
+    (_at(14, 10), _at(14, 10)),            # na abertura
+    (_at(14, 10, 7), _at(14, 10, 15)),     # alinhado à abertura
+    (_at(14, 17, 50), _at(14, 18)),        # o fechamento também é um tick
+    (_at(14, 18, 1), _at(14, 18, 30)),     # settle após o fechamento
+    (_at(14, 18, 31), _at(15, 10)),        # depois do settle: próximo pregão
+])
+def test_next_fire_within_and_around_the_session(trigger, now, expected):
+    assert trigger.get_next_fire_time(None, now) == expected
+
+
+def test_skips_weekend_and_carnival(trigger):
+    # sexta 09/02 após o settle -> sábado, domingo, Carnaval (12 e 13) -> quarta de Cinzas
+    assert trigger.get_next_fire_time(None, _at(9, 19)) == _at(14, 10)
+    assert trigger.get_next_fire_time(None, _at(10, 12)) == _at(14, 10)
+
+
+def test_previous_fire_time_is_not_repeated(trigger):
+    assert trigger.get_next_fire_time(_at(14, 10, 15), _at(14, 10, 15)) == _at(14, 10, 30)
+    # relógio atrasado em relação ao último disparo: segue a partir do disparo
+    assert trigger.get_next_fire_time(_at(14, 18, 30), _at(14, 18, 29)) == _at(15, 10)
+
+
+def test_other_timezones_are_converted(trigger):
+    now = dt.datetime(2024, 2, 14, 13, 7, tzinfo=dt.timezone.utc)  # 10:07 em São Paulo
+    assert trigger.get_next_fire_time(None, now) == _at(14, 10, 15)
+
+
+def test_no_session_within_the_horizon():
+    days = [(dt.date(2024, 3, 1) + dt.timedelta(days=i)).isoformat() for i in range(30)]
+    t = TradingSessionTrigger(ExchangeCalendar(extra_holidays=days), 15, 30)
+    assert t.get_next_fire_time(None, dt.datetime(2024, 3, 1, 9, tzinfo=SP)) is None
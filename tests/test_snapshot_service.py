@@ -0,0 +1,95 @@
+import datetime as dt
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from src.services.snapshot_service import VALUE_COLUMNS, SnapshotStore  # noqa: E402
+
+DATES = pd.bdate_range("2021-01-01", "2023-12-29").date
+
+
+def _frame(dates, close=1.0, asset=None):
+    df = pd.DataFrame({"price_date": dates})
+    for c in VALUE_COLUMNS:
+        df[c] = close
+    if asset is not None:
+        df["asset"] = asset
+    return df
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path))
+
+
+def test_replace_and_read_with_date_slices(store):
+    a = uuid.uuid4()
+    assert store.replace_asset(a, "PETR4", iter([_frame(DATES[:300]), _frame(DATES[300:])]), 3) == len(DATES)
+    assert store.read(a).num_rows == len(DATES)
+    part = store.read(a, dt.date(2022, 3, 1), dt.date(2022, 3, 31))
+    dates = part.column("price_date").to_pylist()
+    assert dates[0] == dt.date(2022, 3, 1) and dates[-1] == dt.date(2022, 3, 31)
+    assert store.read_manifest(a)["adjustment_version"] == 3
+    assert store.ticker_index() == {"PETR4": a}
+
+
+def test_compact_keeps_last_version_of_each_date(store):
+    a = uuid.uuid4()
+    store.replace_asset(a, "PETR4", iter([_frame(DATES)]), 0)
+    for close in (2.0, 3.0):
+        store.append(_frame(DATES[-5:], close, asset=a))
+    before = store.read(a)
+    assert store.compact(a, min_parts=2) == 1
+    after = store.read(a)
+    assert after.num_rows == len(DATES)
+    assert after.equals(before)
+    assert after.column("close_price").to_pylist()[-5:] == [3.0] * 5
+
+
+def test_reads_race_with_replace_and_compact(store):
+    a = uuid.uuid4()
+    store.replace_asset(a, "PETR4", iter([_frame(DATES)]), 0)
+    errors, stop = [], threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            try:
+                assert store.read(a).num_rows == len(DATES)
+            except Exception as e:  # noqa: BLE001
+                errors.append(e)
+                stop.set()
+
+    threads = [threading.Thread(target=reader, daemon=True) for _ in range(3)]
+    for t in threads:
+        t.start()
+    try:
+        for i in range(20):
+            store.replace_asset(a, "PETR4", iter([_frame(DATES)]), i)
+            store.append(_frame(DATES[-3:], float(i), asset=a))
+            store.compact(a, min_parts=2)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join(timeout=10)
+    assert not errors
+    assert np.isclose(store.read(a).column("close_price").to_pylist()[-1], 19.0)
+
+
+def test_invalidated_asset_is_not_served(store, monkeypatch):
+    from src.services import snapshot_service
+
+    a, b = uuid.uuid4(), uuid.uuid4()
+    store.replace_asset(a, "PETR4", iter([_frame(DATES)]), 0)
+    store.replace_asset(b, "VALE3", iter([_frame(DATES)]), 0)
+    monkeypatch.setattr(snapshot_service, "get_snapshot_store", lambda: store)
+    assert store.ticker_index() == {"PETR4": a, "VALE3": b}
+    snapshot_service.invalidate_assets([a])
+    table = snapshot_service.read_history(["PETR4", "VALE3"])
+    assert set(table.column("ticker").to_pylist()) == {"VALE3"}
+    assert store.read(a).num_rows == 0
+    assert snapshot_service.read_history(["PETR4"]) is None
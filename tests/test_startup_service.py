@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.controllers.app_controller import router
+from src.services import scheduler_service, startup_service
+
+
+@pytest.fixture
+def startup(monkeypatch, override_settings):
+    """Estado de inicialização zerado, sem banco nem scheduler de verdade."""
+    override_settings("startup", retry_seconds=0.01)
+    monkeypatch.setattr(startup_service, "_ready", threading.Event())
+    monkeypatch.setattr(startup_service, "_stop", threading.Event())
+    monkeypatch.setattr(startup_service, "_thread", None)
+    monkeypatch.setattr(startup_service, "_state", {"stage": "starting", "attempts": 0, "error": None, "ready_seconds": None})
+    monkeypatch.setattr(startup_service, "init_engine", lambda url, logging_sql=False: object())
+    monkeypatch.setattr(scheduler_service, "start_scheduler", lambda: None)
+    yield startup_service
+    startup_service.stop()
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+def test_ready_is_503_until_initialized_and_retries_failures(startup, client, monkeypatch):
+    gate = threading.Event()
+    calls = []
+
+    def ensure_schema(engine):
+        calls.append(engine)
+        if len(calls) == 1:
+            raise ConnectionError("banco subindo")
+        gate.wait(5)
+
+    monkeypatch.setattr(startup_service, "ensure_schema", ensure_schema)
+    assert client.get("/health").json() == {"status": "ok"}
+    r = client.get("/ready")
+    assert r.status_code == 503 and r.json()["stage"] == "starting"
+
+    startup.start_background()
+    deadline = time.monotonic() + 5
+    while len(calls) < 2 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    r = client.get("/ready")
+    assert r.status_code == 503
+    assert r.json()["stage"] == "database" and r.json()["error"] == "banco subindo"
+
+    gate.set()
+    startup._thread.join(5)
+    r = client.get("/ready")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["ready"] and body["stage"] == "ready" and body["attempts"] == 2 and body["error"] is None
+    assert body["ready_seconds"] is not None
+
+
+def test_stop_interrupts_retries(startup, monkeypatch):
+    def ensure_schema(engine):
+        raise ConnectionError("banco fora")
+
+    monkeypatch.setattr(startup_service, "ensure_schema", ensure_schema)
+    startup.start_background()
+    startup.stop()
+    startup._thread.join(5)
+    assert not startup._thread.is_alive()
+    assert not startup.is_ready()
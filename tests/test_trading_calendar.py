@@ -0,0 +1,73 @@
+import datetime as dt
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from src.infra.trading_calendar import ExchangeCalendar, _easter, b3_holidays
+
+SP = ZoneInfo("America/Sao_Paulo")
+D = dt.date
+
+
+@pytest.mark.parametrize("year, easter", [(2019, D(2019, 4, 21)), (2024, D(2024, 3, 31)), (2025, D(2025, 4, 20))])
+def test_easter(year, easter):
+    assert _easter(year) == easter
+
+
+def test_b3_holidays_2024():
+    h = b3_holidays(2024)
+    for d in [
+        D(2024, 1, 1), D(2024, 2, 12), D(2024, 2, 13), D(2024, 3, 29), D(2024, 5, 1), D(2024, 5, 30),
+        D(2024, 11, 20), D(2024, 12, 24), D(2024, 12, 25), D(2024, 12, 31),
+    ]:
+        assert d in h, d
+    # municipais de São Paulo deixaram de fechar a bolsa em 2022
+    assert D(2024, 1, 25) not in h and D(2024, 7, 9) not in h
+
+
+def test_b3_holidays_2025_moveable_feasts():
+    h = b3_holidays(2025)
+    assert {D(2025, 3, 3), D(2025, 3, 4), D(2025, 4, 18), D(2025, 6, 19)} <= h
+
+
+def test_sao_paulo_holidays_until_2021_and_consciencia_negra_gap():
+    assert {D(2021, 1, 25), D(2021, 7, 9), D(2021, 11, 20)} <= b3_holidays(2021)
+    assert D(2022, 11, 20) not in b3_holidays(2022)
+    assert D(2023, 11, 20) not in b3_holidays(2023)
+
+
+def test_sessions_skip_weekends_and_holidays():
+    cal = ExchangeCalendar()
+    assert not cal.is_session(D(2024, 2, 12))  # Carnaval
+    assert not cal.is_session(D(2024, 2, 10))  # sábado
+    assert cal.is_session(D(2024, 2, 14))      # Quarta-feira de Cinzas tem pregão
+    assert cal.next_session(D(2024, 2, 9)) == D(2024, 2, 14)
+    assert cal.previous_session(D(2024, 2, 14)) == D(2024, 2, 9)
+    assert cal.sessions_between(D(2024, 12, 23), D(2025, 1, 3)) == [
+        D(2024, 12, 23), D(2024, 12, 26), D(2024, 12, 27), D(2024, 12, 30), D(2025, 1, 2), D(2025, 1, 3),
+    ]
+
+
+def test_configured_adjustments():
+    cal = ExchangeCalendar(extra_holidays=["2024-03-01"], extra_sessions=["2024-12-24"])
+    assert not cal.is_session(D(2024, 3, 1))
+    assert cal.is_session(D(2024, 12, 24))
+
+
+def test_unknown_exchange():
+    with pytest.raises(ValueError):
+        ExchangeCalendar(exchange="NYSE")
+
+
+def test_open_hours_and_last_available_session():
+    cal = ExchangeCalendar(session_open="10:00", session_close="18:00")
+    wed = D(2024, 2, 14)
+    assert not cal.is_open(dt.datetime(2024, 2, 14, 9, 59, tzinfo=SP))
+    assert cal.is_open(dt.datetime(2024, 2, 14, 10, 0, tzinfo=SP))
+    assert not cal.is_open(dt.datetime(2024, 2, 14, 18, 1, tzinfo=SP))
+    assert not cal.is_open(dt.datetime(2024, 2, 13, 12, 0, tzinfo=SP))
+    # antes da abertura ainda não há barra do dia: vale o pregão anterior (antes do Carnaval)
+    assert cal.last_available_session(dt.datetime(2024, 2, 14, 9, 0, tzinfo=SP)) == D(2024, 2, 9)
+    assert cal.last_available_session(dt.datetime(2024, 2, 14, 11, 0, tzinfo=SP)) == wed
+    # horário em outro fuso é convertido para o da bolsa
+    assert cal.is_open(dt.datetime(2024, 2, 14, 13, 30, tzinfo=dt.timezone.utc))
@@ -0,0 +1,91 @@
+import datetime as dt
+
+import pandas as pd
+import pytest
+from sqlalchemy import func, select
+
+from src.models.tables import asset_fetch_state, asset_history
+from src.services.watermark_service import (
+    advance_watermarks,
+    ensure_watermarks,
+    load_watermarks,
+    rebuild_watermarks,
+    record_fetch_errors,
+)
+
+D = dt.date
+
+
+def _history(session, rows):
+    session.execute(asset_history.insert(), [{"asset": a, "price_date": d, "close_price": 1.0} for a, d in rows])
+    session.commit()
+
+
+def _state(session, asset_id):
+    return session.execute(select(asset_fetch_state).where(asset_fetch_state.c.asset == asset_id)).mappings().first()
+
+
+def test_ensure_rebuilds_only_when_the_state_table_is_empty(session, make_assets):
+    ids = make_assets(3)
+    a, b = ids["T0000"], ids["T0001"]
+    _history(session, [(a, D(2024, 1, 2)), (a, D(2024, 1, 5)), (b, D(2024, 1, 3))])
+
+    ensure_watermarks(session)
+    marks = {t: last for _, t, last, *_ in load_watermarks(session)}
+    assert marks == {"T0000": D(2024, 1, 5), "T0001": D(2024, 1, 3), "T0002": None}
+
+    # com estado já gravado, o histórico novo não é relido
+    _history(session, [(b, D(2024, 1, 9))])
+    ensure_watermarks(session)
+    assert _state(session, b)["last_date"] == D(2024, 1, 3)
+    rebuild_watermarks(session, [b])
+    session.commit()
+    assert _state(session, b)["last_date"] == D(2024, 1, 9)
+
+
+def test_advance_never_moves_back_and_clears_errors(session, make_assets):
+    a = make_assets(1)["T0000"]
+    advance_watermarks(session, pd.DataFrame({"asset": [a, a], "price_date": [D(2024, 1, 2), D(2024, 1, 4)]}))
+    session.commit()
+    record_fetch_errors(session, [a], "timeout", quarantine_threshold=1)
+    session.commit()
+    s = _state(session, a)
+    assert s["last_error"] == "timeout" and s["consecutive_failures"] == 1 and s["quarantined_until"] is not None
+    assert s["last_date"] == D(2024, 1, 4)
+
+    # lote atrasado (ex.: reparo de buraco) não regride a marca
+    assert advance_watermarks(session, pd.DataFrame({"asset": [a], "price_date": [D(2024, 1, 3)]})) == {a: D(2024, 1, 3)}
+    session.commit()
+    s = _state(session, a)
+    assert s["last_date"] == D(2024, 1, 4)
+    assert s["last_error"] is None and s["consecutive_failures"] == 0 and s["quarantined_until"] is None
+    assert s["last_success_at"] is not None
+    assert advance_watermarks(session, pd.DataFrame(columns=["asset", "price_date"])) == {}
+
+
+def _quarantine_seconds(session, asset_id):
+    return session.execute(
+        select(func.extract("epoch", asset_fetch_state.c.quarantined_until - func.localtimestamp()))
+        .where(asset_fetch_state.c.asset == asset_id)
+    ).scalar()
+
+
+def test_quarantine_backs_off_exponentially_up_to_the_cap(session, make_assets):
+    a = make_assets(1)["T0000"]
+    expected = [None, None, 60, 120, 240, 300, 300]
+    for failures, delay in enumerate(expected, start=1):
+        record_fetch_errors(
+            session, [a, a, None], f"falha {failures}",
+            quarantine_threshold=3, quarantine_base_seconds=60, quarantine_max_seconds=300,
+        )
+        session.commit()
+        s = _state(session, a)
+        assert s["consecutive_failures"] == failures and s["last_error"] == f"falha {failures}"
+        if delay is None:
+            assert s["quarantined_until"] is None
+        else:
+            assert float(_quarantine_seconds(session, a)) == pytest.approx(delay, abs=5)
+    # last_date não é tocado pelos erros
+    assert s["last_date"] is None
+    _, _, _, failures, until = next(r for r in load_watermarks(session) if r[0] == a)
+    assert failures == len(expected) and until is not None